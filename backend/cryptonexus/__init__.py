@@ -1 +1,3 @@
-# CryptoNexus Django Project 
\ No newline at end of file
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
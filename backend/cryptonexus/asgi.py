@@ -0,0 +1,18 @@
+"""
+ASGI config for cryptonexus project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through this (e.g. gunicorn -k uvicorn.workers.UvicornWorker) so open
+payment status streams wait on the event loop instead of holding a worker.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cryptonexus.settings')
+
+application = get_asgi_application()
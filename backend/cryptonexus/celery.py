@@ -0,0 +1,15 @@
+"""
+Celery application for cryptonexus background jobs.
+
+Broker and result backend come from the CELERY_* values in settings.py.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cryptonexus.settings')
+
+app = Celery('cryptonexus')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
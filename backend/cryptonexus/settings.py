@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     
@@ -201,6 +202,22 @@ CORS_ALLOW_CREDENTIALS = True
 # Redis Configuration
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://:6379')
 
+# Cache Configuration: shared through Redis when REDIS_URL is set, otherwise
+# per-process memory so local development and tests need no Redis
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -209,6 +226,58 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Periodic jobs (run with `celery -A cryptonexus beat`)
+CELERY_BEAT_SCHEDULE = {
+    'resolve-pending-btcpay-addresses': {
+        'task': 'payments.tasks.resolve_pending_btcpay_addresses',
+        'schedule': 60.0,
+    },
+    'requeue-stalled-provisioning': {
+        'task': 'payments.tasks.requeue_stalled_provisioning',
+        'schedule': 60.0,
+    },
+    'refill-address-pools': {
+        'task': 'payments.tasks.refill_address_pools',
+        'schedule': 30.0,
+    },
+    'scan-monero-transfers': {
+        'task': 'payments.tasks.scan_monero_transfers',
+        'schedule': 30.0,
+    },
+    'drain-webhook-queue': {
+        'task': 'payments.tasks.drain_webhook_queue',
+        'schedule': 15.0,
+    },
+    'auto-release-escrows': {
+        'task': 'payments.tasks.auto_release_escrows',
+        'schedule': 300.0,
+    },
+    'expire-unpaid-orders': {
+        'task': 'payments.tasks.expire_unpaid_orders',
+        'schedule': 60.0,
+    },
+    'refresh-payment-daily-stats': {
+        'task': 'payments.tasks.refresh_payment_daily_stats',
+        'schedule': 60.0,
+    },
+    'refresh-product-facets': {
+        'task': 'products.tasks.refresh_product_facets',
+        'schedule': 300.0,
+    },
+    'reconcile-btcpay-invoices': {
+        'task': 'payments.tasks.reconcile_btcpay_invoices',
+        'schedule': 900.0,
+    },
+    'track-confirmations': {
+        'task': 'payments.tasks.track_confirmations',
+        'schedule': 30.0,
+    },
+    'refresh-exchange-rates': {
+        'task': 'payments.tasks.refresh_exchange_rates',
+        'schedule': float(os.environ.get('EXCHANGE_RATE_REFRESH_INTERVAL', '60')),
+    },
+}
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -275,12 +344,31 @@ BTCPAY_SERVER_URL = os.environ.get('BTCPAY_SERVER_URL', 'http://94.130.201.44:23
 BTCPAY_STORE_ID = os.environ.get('BTCPAY_STORE_ID', 'AKwDcGXvXRfKkVD3uTD7cK2Yv3jbnidDhwihfxBGyUN3')  # Correct Store ID from BTCPay dashboard
 BTCPAY_API_KEY = os.environ.get('BTCPAY_API_KEY', '3022e72fdddc7106a5bb2c3da83bbdc9a75e68f3')    # Working Greenfield API key
 BTCPAY_WEBHOOK_SECRET = os.environ.get('BTCPAY_WEBHOOK_SECRET', 'cryptonexus_webhook_secret_2024')
+# Shared token for node block-notify hooks (POST webhooks/block/<symbol>/); empty disables the hook
+BLOCK_NOTIFY_TOKEN = os.environ.get('BLOCK_NOTIFY_TOKEN', '')
+
+# BTCPay generates invoice addresses asynchronously: poll briefly inline, then
+# leave the address pending and resolve it in the background
+BTCPAY_ADDRESS_POLL_ATTEMPTS = int(os.environ.get('BTCPAY_ADDRESS_POLL_ATTEMPTS', '3'))
+BTCPAY_ADDRESS_POLL_DELAY = float(os.environ.get('BTCPAY_ADDRESS_POLL_DELAY', '0.25'))  # seconds, doubles per attempt
+BTCPAY_ADDRESS_TIMEOUT = int(os.environ.get('BTCPAY_ADDRESS_TIMEOUT', '5'))  # seconds per payment-methods request
+BTCPAY_ADDRESS_RESOLVE_RETRIES = int(os.environ.get('BTCPAY_ADDRESS_RESOLVE_RETRIES', '8'))
+BTCPAY_RECONCILE_WINDOW_HOURS = int(os.environ.get('BTCPAY_RECONCILE_WINDOW_HOURS', '24'))  # invoices re-checked per reconciliation run
+BTCPAY_RECONCILE_PAGE_SIZE = int(os.environ.get('BTCPAY_RECONCILE_PAGE_SIZE', '200'))  # invoices per list request
+
+# Webhooks are persisted and acknowledged immediately, then processed by workers
+WEBHOOK_QUEUE_BATCH_SIZE = int(os.environ.get('WEBHOOK_QUEUE_BATCH_SIZE', '100'))
+WEBHOOK_QUEUE_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_QUEUE_MAX_ATTEMPTS', '8'))
+WEBHOOK_QUEUE_PROCESSING_TIMEOUT = int(os.environ.get('WEBHOOK_QUEUE_PROCESSING_TIMEOUT', '300'))  # seconds
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.environ.get('WEBHOOK_DEDUP_CACHE_SIZE', '10000'))  # processed delivery IDs kept per process
+WEBHOOK_DEDUP_CACHE_TTL = int(os.environ.get('WEBHOOK_DEDUP_CACHE_TTL', '3600'))  # seconds
 
 # Monero RPC (Real Monero)
 MONERO_RPC_URL = os.environ.get('MONERO_RPC_URL', 'http://localhost:18082/json_rpc')
 MONERO_RPC_USER = os.environ.get('MONERO_RPC_USER', '')
 MONERO_RPC_PASSWORD = os.environ.get('MONERO_RPC_PASSWORD', 'cryptonexus123')
 MONERO_WALLET_PASSWORD = os.environ.get('MONERO_WALLET_PASSWORD', 'cryptonexus123')
+MONERO_SCAN_REORG_MARGIN = int(os.environ.get('MONERO_SCAN_REORG_MARGIN', '10'))  # blocks rescanned below the tip
 
 # Bitcoin Core RPC (for direct Bitcoin operations)
 BITCOIN_RPC_URL = os.environ.get('BITCOIN_RPC_URL', 'http://localhost:18332')
@@ -291,9 +379,76 @@ BITCOIN_RPC_PASSWORD = os.environ.get('BITCOIN_RPC_PASSWORD', 'bitcoinpass123')
 BITCOIN_NETWORK = os.environ.get('BITCOIN_NETWORK', 'testnet')  # testnet for development
 MONERO_NETWORK = os.environ.get('MONERO_NETWORK', 'testnet')    # testnet for development
 
+# Payment status streams: 'redis' fans changes out across processes through
+# REDIS_URL pub/sub, 'local' only within one process (development). Like
+# CACHES, Redis is only the default when REDIS_URL is set
+PAYMENT_EVENTS_BACKEND = os.environ.get('PAYMENT_EVENTS_BACKEND', 'redis' if 'REDIS_URL' in os.environ else 'local')
+PAYMENT_STREAM_HEARTBEAT = int(os.environ.get('PAYMENT_STREAM_HEARTBEAT', '15'))  # seconds
+PAYMENT_STREAM_MAX_DURATION = int(os.environ.get('PAYMENT_STREAM_MAX_DURATION', '300'))  # seconds
+# Streams served under WSGI pin a worker thread each, so they close early and
+# clients reconnect; run cryptonexus.asgi to hold streams open for the full duration
+PAYMENT_STREAM_SYNC_MAX_DURATION = int(os.environ.get('PAYMENT_STREAM_SYNC_MAX_DURATION', '25'))  # seconds
+# Serialized payment status is cached per order and rewritten on every change;
+# the TTL only bounds how long a missed invalidation can linger
+PAYMENT_STATUS_CACHE_TTL = int(os.environ.get('PAYMENT_STATUS_CACHE_TTL', '300'))  # seconds
+
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 PAYMENT_EXPIRY_HOURS = int(os.environ.get('PAYMENT_EXPIRY_HOURS', '2'))
+PAYMENT_EXPIRY_BATCH_SIZE = int(os.environ.get('PAYMENT_EXPIRY_BATCH_SIZE', '500'))  # orders per sweep transaction
+PAYMENT_PROVISIONING_RETRIES = int(os.environ.get('PAYMENT_PROVISIONING_RETRIES', '6'))
+PAYMENT_PROVISIONING_STALE_AFTER = int(os.environ.get('PAYMENT_PROVISIONING_STALE_AFTER', '120'))  # seconds before a queued order is re-enqueued
+PAYMENT_STATS_REFRESH_LAG = int(os.environ.get('PAYMENT_STATS_REFRESH_LAG', '300'))  # seconds re-read before the last rollup refresh
 DEFAULT_ESCROW_FEE_PERCENTAGE = float(os.environ.get('DEFAULT_ESCROW_FEE_PERCENTAGE', '2.0'))
+ESCROW_AUTO_RELEASE_BATCH_SIZE = int(os.environ.get('ESCROW_AUTO_RELEASE_BATCH_SIZE', '1000'))  # rows per UPDATE
+
+# Exchange rates: 'coingecko', 'fixture' (EXCHANGE_RATE_FIXTURES, for offline
+# runs) or a dotted path to an ExchangeRateProvider subclass
+EXCHANGE_RATE_PROVIDER = os.environ.get('EXCHANGE_RATE_PROVIDER', 'coingecko')
+EXCHANGE_RATE_FIXTURES = {'BTC': '65000', 'XMR': '160'}  # USD prices
+EXCHANGE_RATE_SNAPSHOT_TTL = int(os.environ.get('EXCHANGE_RATE_SNAPSHOT_TTL', '30'))  # seconds before re-reading the shared snapshot
+EXCHANGE_RATE_TIMEOUT = int(os.environ.get('EXCHANGE_RATE_TIMEOUT', '10'))
+
+# Product search: full-text first, trigram matching when it finds fewer than
+# PRODUCT_SEARCH_FUZZY_FALLBACK_MIN listings (or with search_mode=fuzzy)
+PRODUCT_SEARCH_FUZZY_THRESHOLD = float(os.environ.get('PRODUCT_SEARCH_FUZZY_THRESHOLD', '0.3'))  # pg_trgm similarity, 0-1
+PRODUCT_SEARCH_FUZZY_FALLBACK_MIN = int(os.environ.get('PRODUCT_SEARCH_FUZZY_FALLBACK_MIN', '3'))
+# Upper bounds (BTC) of the price facet buckets; the last bucket is open-ended
+PRODUCT_FACET_PRICE_BUCKETS = os.environ.get('PRODUCT_FACET_PRICE_BUCKETS', '0.0005,0.001,0.005,0.01,0.05').split(',')
+PRODUCT_FACETS_CACHE_TTL = int(os.environ.get('PRODUCT_FACETS_CACHE_TTL', '600'))  # seconds; refreshed every 5 minutes
+
+# List totals: counted exactly up to LIST_COUNT_EXACT_LIMIT rows, planner
+# estimates above that; either is cached per filter set for the TTL
+LIST_COUNT_EXACT_LIMIT = int(os.environ.get('LIST_COUNT_EXACT_LIMIT', '1000'))
+LIST_COUNT_CACHE_TTL = int(os.environ.get('LIST_COUNT_CACHE_TTL', '30'))  # seconds
+
+# Mock payment providers (USE_MOCK_PAYMENTS): 'test' is instant and never
+# fails, 'dev' roughly matches the old fixed sleeps, 'load' adds tail latency,
+# errors and timeouts. All profiles draw from MOCK_PAYMENTS_SEED.
+MOCK_PAYMENTS_PROFILE = os.environ.get('MOCK_PAYMENTS_PROFILE', 'dev')
+MOCK_PAYMENTS_SEED = int(os.environ.get('MOCK_PAYMENTS_SEED', '1337'))
+MOCK_PAYMENTS_PROFILES = {
+    'test': {},
+    'dev': {'latency_p50': 0.5, 'latency_p99': 2.0, 'payment_success_rate': 0.8},
+    'load': {
+        'latency_p50': float(os.environ.get('MOCK_PAYMENTS_LATENCY_P50', '0.2')),  # seconds
+        'latency_p99': float(os.environ.get('MOCK_PAYMENTS_LATENCY_P99', '2.0')),  # seconds
+        'error_rate': float(os.environ.get('MOCK_PAYMENTS_ERROR_RATE', '0.01')),
+        'timeout_rate': float(os.environ.get('MOCK_PAYMENTS_TIMEOUT_RATE', '0.005')),
+        'timeout': float(os.environ.get('MOCK_PAYMENTS_TIMEOUT', '10')),  # seconds
+        'payment_success_rate': 0.95,
+    },
+}
+
+# Pre-generated Monero subaddress pool. Order creation claims a subaddress from
+# the pool and only calls the wallet live when the pool is empty. BTC is never
+# pooled: BTCPay invoices are created per order with the order amount.
+ADDRESS_POOL_ENABLED = os.environ.get('ADDRESS_POOL_ENABLED', 'False').lower() == 'true'
+ADDRESS_POOL = {
+    'XMR': {
+        'low_water': int(os.environ.get('XMR_POOL_LOW_WATER', '50')),
+        'target': int(os.environ.get('XMR_POOL_TARGET', '200')),
+    },
+}
 
 # Blockchain Monitoring
 BLOCK_CONFIRMATION_REQUIREMENTS = {
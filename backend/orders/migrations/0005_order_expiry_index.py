@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_order_order_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_status', 'payment_status', 'payment_expires_at'], name='marketplace_order_s_cc0129_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_provisioning',
+            field=models.CharField(choices=[('queued', 'QUEUED'), ('provisioning', 'PROVISIONING'), ('ready', 'READY'), ('failed', 'FAILED')], default='ready', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_provisioning', 'updated_at'], name='marketplace_payment_05970b_idx'),
+        ),
+    ]
@@ -21,6 +21,14 @@ class OrderStatus(Enum):
     REFUNDED = 'refunded'
 
 
+class PaymentProvisioning(Enum):
+    """Progress of the background job that creates an order's payment address"""
+    QUEUED = 'queued'
+    PROVISIONING = 'provisioning'
+    READY = 'ready'
+    FAILED = 'failed'
+
+
 class Order(BaseModel):
     """Order model for managing product orders"""
     
@@ -45,6 +53,11 @@ class Order(BaseModel):
     
     # Payment details
     payment_address = models.CharField(max_length=255, blank=True)
+    payment_provisioning = models.CharField(
+        max_length=20,
+        choices=[(state.value, state.name) for state in PaymentProvisioning],
+        default=PaymentProvisioning.READY.value  # new orders are created as queued
+    )
     payment_status = models.CharField(
         max_length=20,
         choices=[(status.value, status.name) for status in PaymentStatus],
@@ -77,6 +90,10 @@ class Order(BaseModel):
     class Meta:
         ordering = ['-created_at']
         db_table = 'marketplace_orders'
+        indexes = [
+            models.Index(fields=['order_status', 'payment_status', 'payment_expires_at']),
+            models.Index(fields=['payment_provisioning', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"Order {self.order_id} - {self.product.headline}"
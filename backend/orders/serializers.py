@@ -41,7 +41,7 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order_id', 'buyer', 'vendor', 'product', 'quantity',
             'unit_price', 'total_amount', 'crypto_currency', 'payment_address',
-            'payment_status', 'payment_status_display', 'order_status', 
+            'payment_provisioning', 'payment_status', 'payment_status_display', 'order_status', 
             'order_status_display', 'use_escrow', 'escrow_fee', 'dispute_opened',
             'dispute_reason', 'payment_expires_at', 'delivered_at', 'confirmed_at',
             'dispute_opened_at', 'product_credentials', 'is_payment_expired',
@@ -49,7 +49,7 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             'id', 'order_id', 'created_at', 'updated_at', 'is_payment_expired',
-            'can_dispute', 'dispute'
+            'can_dispute', 'dispute', 'payment_provisioning'
         ]
     
     def get_order_status_display(self, obj):
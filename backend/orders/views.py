@@ -1,16 +1,19 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
-from .models import Order, OrderDispute, OrderStatus
+from .models import Order, OrderDispute, OrderStatus, PaymentProvisioning
 from .serializers import (
     OrderSerializer, CreateOrderSerializer, UpdateOrderStatusSerializer,
     OrderDisputeSerializer
 )
 from payments.services import BTCPayServerService, MoneroRPCService
 from payments.models import PaymentStatus, PaymentAddress
+from payments.tasks import provision_payment_address
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,41 +46,31 @@ class OrderViewSet(viewsets.ModelViewSet):
         return OrderSerializer
     
     def create(self, request, *args, **kwargs):
-        """Create new order and generate payment address"""
+        """Create new order and queue generation of its payment address"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Create order
-        order = serializer.save()
+        # Create order; the payment address is provisioned in the background
+        # so slow providers don't hold up checkout
+        order = serializer.save(payment_provisioning=PaymentProvisioning.QUEUED.value)
         
-        # Generate payment address using PaymentService
-        try:
-            from payments.services import PaymentService
-            payment_service = PaymentService()
-            
-            payment_address = payment_service.create_payment_address(
-                order_id=order.order_id,
-                crypto_currency=order.crypto_currency,
-                amount=order.total_amount,
-                payment_type='wallet',
-                use_escrow=order.use_escrow
-            )
-            
-            # Update order with payment address
-            order.payment_address = payment_address.payment_address
-            order.payment_expires_at = payment_address.expires_at
-            order.save()
+        def enqueue_provisioning():
+            try:
+                provision_payment_address.delay(order.order_id)
+            except Exception as e:
+                # requeue_stalled_provisioning picks the order up
+                logger.warning(f"Failed to queue payment provisioning for order {order.order_id}: {str(e)}")
             
-            logger.info(f"Order {order.order_id} created successfully with payment address")
+        transaction.on_commit(enqueue_provisioning)
+        logger.info(f"Order {order.order_id} created, payment address provisioning queued")
             
-        except Exception as e:
-            logger.error(f"Payment address generation failed for order {order.order_id}: {str(e)}")
-            # Order is still created but without payment address
-            # This will be handled by the frontend
-        
+        status_url = request.build_absolute_uri(reverse('order-detail', args=[order.pk]))
+        response_data = OrderSerializer(order).data
+        response_data['status_url'] = status_url
         return Response(
-            OrderSerializer(order).data,
-            status=status.HTTP_201_CREATED
+            response_data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url}
         )
     
     @action(detail=True, methods=['post'])
@@ -0,0 +1,341 @@
+import functools
+import math
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+import logging
+
+from orders.models import Order
+from products.models import Product, ProductCategory
+from shared.models import CryptoCurrency
+from .models import PaymentAddress, WebhookEvent
+from .services import PaymentService, WebhookQueueService
+from .standin import StandInState, build_webhook, create_server
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StageRecorder:
+    """Latency samples per pipeline stage, shared by all buyer threads"""
+    
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+    
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.samples[stage].append(seconds)
+    
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+    
+    def wrap(self, func, stage: str):
+        """Wrap a function so every call is recorded under ``stage``"""
+        @functools.wraps(func)
+        def timed_call(*args, **kwargs):
+            with self.timed(stage):
+                return func(*args, **kwargs)
+        return timed_call
+    
+    def summary(self) -> dict:
+        """Latency percentiles per stage, in milliseconds"""
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        
+        return {
+            stage: {
+                'count': len(values),
+                **{f"p{pct}_ms": round(percentile(values, pct) * 1000, 3) for pct in PERCENTILES},
+                'mean_ms': round(sum(values) / len(values) * 1000, 3),
+                'max_ms': round(max(values) * 1000, 3),
+            }
+            for stage, values in sorted(samples.items())
+        }
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries on every connection it is installed on"""
+    
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+    
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class CheckoutBenchmark:
+    """Drives concurrent buyers through order creation, payment and webhooks.
+    
+    Each order goes through OrderViewSet.create, whose provisioning task calls
+    PaymentService.create_payment_address against the local stand-in; the
+    stand-in settles the invoice, and the signed InvoiceReceivedPayment and
+    InvoiceSettled webhooks are posted to BTCPayWebhookView. Celery tasks run
+    eagerly inside the request that queues them, so the address exists when
+    order creation returns and the order is paid when the last webhook does.
+    
+    Fixture users, products and payments are created under a per-run prefix
+    and removed afterwards unless keep_data is set.
+    """
+    
+    INSTRUMENTED = (
+        (PaymentService, 'provision_order_address', 'provisioning'),
+        (PaymentService, 'create_payment_address', 'payment_address'),
+        (PaymentService, '_update_order_status_on_payment', 'order_update'),
+        (WebhookQueueService, '_process', 'webhook_processing'),
+    )
+    
+    def __init__(self, buyers: int = 10, orders_per_buyer: int = 5, address_delay: float = 0.0,
+                 seed: int = None, keep_data: bool = False):
+        self.buyers = buyers
+        self.orders_per_buyer = orders_per_buyer
+        self.address_delay = address_delay
+        self.seed = seed
+        self.keep_data = keep_data
+        self.run_id = f"bench-{uuid.uuid4().hex[:8]}"
+        self.recorder = StageRecorder()
+        self.queries = QueryCounter()
+        self.factory = APIRequestFactory()
+        self.secret = uuid.uuid4().hex
+        self.completed = 0
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+    
+    def run(self) -> dict:
+        """Run the benchmark and return the results document"""
+        if not CryptoCurrency.objects.filter(symbol='BTC', is_active=True).exists():
+            raise ValueError("BTC must be an active CryptoCurrency to run the checkout benchmark")
+        
+        self.state = StandInState(seed=self.seed, address_delay=self.address_delay)
+        server = create_server(state=self.state)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        
+        buyers, products = self._create_fixtures()
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(override_settings(
+                    BTCPAY_SERVER_URL=base_url,
+                    BTCPAY_WEBHOOK_SECRET=self.secret,
+                    MONERO_RPC_URL=f"{base_url}/json_rpc"
+                ))
+                stack.enter_context(self._eager_celery())
+                for owner, name, stage in self.INSTRUMENTED:
+                    stack.enter_context(self._instrument(owner, name, stage))
+                
+                self.started_at = timezone.now()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=self.buyers, thread_name_prefix='buyer') as pool:
+                    list(pool.map(self._buyer, buyers, products))
+                duration = time.perf_counter() - started
+        finally:
+            server.shutdown()
+            server.server_close()
+            if not self.keep_data:
+                self._delete_fixtures()
+        
+        return self._results(duration)
+    
+    def _buyer(self, user, product):
+        view = self._order_view()
+        try:
+            for _ in range(self.orders_per_buyer):
+                try:
+                    self._checkout(view, user, product)
+                except Exception as e:
+                    logger.error(f"Benchmark checkout failed for {user.username}: {str(e)}")
+                    self._error('exception')
+        finally:
+            connection.close()
+    
+    def _checkout(self, view, user, product):
+        started = time.perf_counter()
+        
+        request = self.factory.post('/orders/', {
+            'product': product.id, 'quantity': 1, 'crypto_currency': 'BTC', 'use_escrow': False
+        }, format='json')
+        force_authenticate(request, user=user)
+        with connection.execute_wrapper(self.queries), self.recorder.timed('order_create'):
+            response = view(request)
+        if response.status_code != 202:
+            return self._error(f"order_create_{response.status_code}")
+        
+        order_id = response.data['order_id']
+        invoice_id = PaymentAddress.objects.filter(order_id=order_id).values_list('btcpay_invoice_id', flat=True).first()
+        paid = self.state.pay_invoice(invoice_id) if invoice_id else None
+        if paid is None:
+            return self._error('no_invoice')
+        
+        invoice, payment = paid
+        webhook_view = self._webhook_view()
+        for webhook_type, extra in (('InvoiceReceivedPayment', {'payment': payment}), ('InvoiceSettled', {})):
+            body, headers = build_webhook(self.secret, webhook_type, invoice, **extra)
+            request = self.factory.post(
+                '/webhooks/btcpay/', body, content_type='application/json', HTTP_BTCPAY_SIG=headers['BTCPay-Sig']
+            )
+            with connection.execute_wrapper(self.queries), self.recorder.timed('webhook'):
+                response = webhook_view(request)
+            if response.status_code != 200:
+                return self._error(f"webhook_{response.status_code}")
+        
+        self.recorder.record('end_to_end', time.perf_counter() - started)
+        if Order.objects.filter(order_id=order_id, payment_status='paid').exists():
+            with self.lock:
+                self.completed += 1
+        else:
+            self._error('not_paid')
+    
+    def _error(self, kind: str):
+        with self.lock:
+            self.errors[kind] += 1
+    
+    @staticmethod
+    def _order_view():
+        from orders.views import OrderViewSet
+        return OrderViewSet.as_view({'post': 'create'})
+    
+    @staticmethod
+    def _webhook_view():
+        from .views import BTCPayWebhookView
+        return BTCPayWebhookView.as_view()
+    
+    @contextmanager
+    def _instrument(self, owner, name: str, stage: str):
+        original = owner.__dict__[name]
+        setattr(owner, name, self.recorder.wrap(original, stage))
+        try:
+            yield
+        finally:
+            setattr(owner, name, original)
+    
+    @contextmanager
+    def _eager_celery(self):
+        from celery import current_app
+        
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        try:
+            yield
+        finally:
+            current_app.conf.task_always_eager = eager
+    
+    def _create_fixtures(self):
+        User = get_user_model()
+        vendor = User.objects.create_user(username=f"{self.run_id}-vendor", password=None, user_type='vendor')
+        category = ProductCategory.objects.create(name=self.run_id, slug=self.run_id)
+        
+        buyers = User.objects.bulk_create([
+            User(username=f"{self.run_id}-buyer-{i}", user_type='buyer') for i in range(self.buyers)
+        ])
+        products = Product.objects.bulk_create([
+            Product(
+                vendor=vendor,
+                category=category,
+                headline=f"Benchmark listing {i}",
+                website='example.com',
+                account_type='other',
+                access_type='full_ownership',
+                description='Checkout benchmark fixture',
+                price=Decimal('0.001'),
+                delivery_time='instant_auto',
+                quantity_available=self.orders_per_buyer,
+                status='approved'
+            )
+            for i in range(self.buyers)
+        ])
+        # bulk_create only returns ids on backends that support RETURNING
+        buyers = list(User.objects.filter(username__startswith=f"{self.run_id}-buyer-").order_by('username'))
+        products = list(Product.objects.filter(category=category).order_by('id'))
+        return buyers, products
+    
+    def _delete_fixtures(self):
+        User = get_user_model()
+        order_ids = list(Order.objects.filter(vendor__username=f"{self.run_id}-vendor").values_list('order_id', flat=True))
+        invoice_ids = list(self.state.invoices)
+        
+        WebhookEvent.objects.filter(external_id__in=invoice_ids).delete()
+        PaymentAddress.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(order_id__in=order_ids).delete()
+        Product.objects.filter(category__slug=self.run_id).delete()
+        ProductCategory.objects.filter(slug=self.run_id).delete()
+        User.objects.filter(username__startswith=f"{self.run_id}-").delete()
+    
+    def _results(self, duration: float) -> dict:
+        attempted = self.buyers * self.orders_per_buyer
+        return {
+            'run_id': self.run_id,
+            'commit': git_commit(),
+            'started_at': self.started_at.isoformat(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'config': {
+                'buyers': self.buyers,
+                'orders_per_buyer': self.orders_per_buyer,
+                'address_delay': self.address_delay,
+                'seed': self.seed,
+            },
+            'orders': {'attempted': attempted, 'completed': self.completed, 'errors': dict(self.errors)},
+            'duration_s': round(duration, 3),
+            'orders_per_second': round(self.completed / duration, 2) if duration else 0.0,
+            'queries_per_order': round(self.queries.count / attempted, 1) if attempted else 0.0,
+            'stages': self.recorder.summary(),
+        }
+
+
+def git_commit() -> str:
+    """Current commit of the checkout, or '' outside a git work tree"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def compare_results(baseline: dict, current: dict) -> dict:
+    """Per-stage p95 change and throughput change against a saved baseline"""
+    stages = {}
+    for stage, summary in current['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if before and before['p95_ms']:
+            stages[stage] = round((summary['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100, 1)
+    
+    before_rate = baseline.get('orders_per_second') or 0
+    return {
+        'baseline_commit': baseline.get('commit', ''),
+        'p95_change_pct': stages,
+        'orders_per_second_change_pct': (
+            round((current['orders_per_second'] - before_rate) / before_rate * 100, 1) if before_rate else None
+        ),
+        'queries_per_order_change': round(current['queries_per_order'] - baseline.get('queries_per_order', 0), 1),
+    }
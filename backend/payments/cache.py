@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class TTLCache:
+    """Small thread-safe in-process LRU cache whose entries expire after a TTL"""
+    
+    def __init__(self, max_size: int = 1000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def add(self, key, value=True):
+        """Store a key, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_MISSING = object()
+
+# Delivery IDs of webhooks that were fully processed in this process, so hot
+# redeliveries are acknowledged without touching the database
+processed_deliveries = TTLCache(
+    max_size=getattr(settings, 'WEBHOOK_DEDUP_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'WEBHOOK_DEDUP_CACHE_TTL', 3600)
+)
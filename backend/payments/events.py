@@ -0,0 +1,226 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'payment-status:'
+
+# Statuses after which a payment no longer changes, so streams can close
+FINAL_STATUSES = {'paid', 'overpaid', 'expired', 'cancelled'}
+
+
+class Subscription(queue.Queue):
+    """Status snapshots queued for one stream.
+    
+    Sync streams block on ``get``. Async streams await ``aget``, which is
+    woken on their event loop by each put, so a waiting stream holds no thread.
+    """
+    
+    def __init__(self, maxsize: int = 100):
+        super().__init__(maxsize=maxsize)
+        self._ready = None
+        self._loop = None
+    
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready.set)
+    
+    async def aget(self, timeout: float):
+        """Next snapshot, raising queue.Empty after ``timeout`` seconds"""
+        if self._loop is None:
+            self._ready = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        deadline = self._loop.time() + timeout
+        while True:
+            # Clear before checking so a put after the check still wakes us
+            self._ready.clear()
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                raise queue.Empty
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+
+
+class PaymentStatusBroker:
+    """Fans payment status changes out to the streams open in this process.
+    
+    With the redis backend every process keeps a single pattern subscription,
+    so status changes published by Celery workers reach web processes and
+    thousands of open streams share one connection. The local backend only
+    delivers within the publishing process and is meant for development.
+    """
+    
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._redis = None
+    
+    @property
+    def backend(self) -> str:
+        return getattr(settings, 'PAYMENT_EVENTS_BACKEND', 'local')
+    
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+    
+    def publish(self, order_id: str, data: dict):
+        """Publish a status snapshot for an order"""
+        if self.backend == 'redis':
+            try:
+                self._get_redis().publish(f"{CHANNEL_PREFIX}{order_id}", json.dumps(data))
+                return
+            except Exception as e:
+                logger.error(f"Payment status publish error for {order_id}: {str(e)}")
+        self._dispatch(order_id, data)
+    
+    def subscribe(self, order_id: str) -> Subscription:
+        """Register a stream for an order and return the queue it reads from"""
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers[order_id].add(subscription)
+            if self.backend == 'redis' and (self._listener is None or not self._listener.is_alive()):
+                self._listener = threading.Thread(target=self._listen, name='payment-status-listener', daemon=True)
+                self._listener.start()
+        return subscription
+    
+    def unsubscribe(self, order_id: str, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(order_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[order_id]
+    
+    def _dispatch(self, order_id: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(order_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(data)
+            except queue.Full:
+                # A stalled client only needs the latest snapshot
+                pass
+    
+    def _listen(self):
+        """Forward redis messages to local subscribers, reconnecting on errors"""
+        delay = 1
+        while True:
+            try:
+                pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                delay = 1
+                for message in pubsub.listen():
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._dispatch(channel[len(CHANNEL_PREFIX):], json.loads(message['data']))
+            except Exception as e:
+                logger.error(f"Payment status listener error: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+payment_events = PaymentStatusBroker()
+
+
+def _change_key(data: dict) -> tuple:
+    return (
+        data.get('status'),
+        data.get('confirmations'),
+        data.get('received_amount'),
+        data.get('address_status'),
+        data.get('payment_address'),
+    )
+
+
+def _format_event(data: dict) -> str:
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+class _StatusStream:
+    """Event building shared by the sync and async stream generators"""
+    
+    def __init__(self, initial: dict, max_duration: int = None):
+        if max_duration is None:
+            max_duration = getattr(settings, 'PAYMENT_STREAM_MAX_DURATION', 300)
+        self.heartbeat = getattr(settings, 'PAYMENT_STREAM_HEARTBEAT', 15)
+        self.deadline = time.monotonic() + max_duration
+        self.initial = initial
+        self.last_key = _change_key(initial)
+        self.closed = initial.get('status') in FINAL_STATUSES
+    
+    def opening(self) -> list:
+        return [f"retry: {getattr(settings, 'PAYMENT_STREAM_RETRY_MS', 3000)}\n", _format_event(self.initial)]
+    
+    def is_open(self) -> bool:
+        return not self.closed and time.monotonic() < self.deadline
+    
+    def wait_timeout(self) -> float:
+        """Seconds to wait for the next snapshot before a keep-alive"""
+        return min(self.heartbeat, max(self.deadline - time.monotonic(), 0))
+    
+    def receive(self, data: dict = None) -> list:
+        """Chunks for a snapshot, or for a keep-alive when ``data`` is None"""
+        if data is None:
+            return [": keep-alive\n\n"]
+        
+        chunks = []
+        key = _change_key(data)
+        if key != self.last_key:
+            self.last_key = key
+            chunks.append(_format_event(data))
+        if data.get('status') in FINAL_STATUSES:
+            self.closed = True
+        return chunks
+
+
+def stream_payment_status(order_id: str, subscription: Subscription, initial: dict, max_duration: int = None):
+    """Server-Sent Events generator yielding a status event only when it changes.
+    
+    Blocks the thread serving it until the stream closes; WSGI deployments
+    pass a short ``max_duration`` so clients reconnect instead.
+    """
+    stream = _StatusStream(initial, max_duration)
+    try:
+        yield from stream.opening()
+        while stream.is_open():
+            try:
+                data = subscription.get(timeout=stream.wait_timeout())
+            except queue.Empty:
+                data = None
+            yield from stream.receive(data)
+    finally:
+        payment_events.unsubscribe(order_id, subscription)
+
+
+async def astream_payment_status(order_id: str, subscription: Subscription, initial: dict):
+    """Async stream_payment_status for ASGI; open streams wait on the event loop, not a thread"""
+    stream = _StatusStream(initial)
+    try:
+        for chunk in stream.opening():
+            yield chunk
+        while stream.is_open():
+            try:
+                data = await subscription.aget(timeout=stream.wait_timeout())
+            except queue.Empty:
+                data = None
+            for chunk in stream.receive(data):
+                yield chunk
+    finally:
+        payment_events.unsubscribe(order_id, subscription)
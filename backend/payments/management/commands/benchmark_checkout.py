@@ -0,0 +1,67 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.benchmark import CheckoutBenchmark, compare_results
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order checkout through payment webhooks against the local payment stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=10, help='Concurrent simulated buyers')
+        parser.add_argument('--orders', type=int, default=5, help='Orders placed by each buyer')
+        parser.add_argument('--address-delay', type=float, default=0.0,
+                            help='Seconds before a new invoice has a deposit address')
+        parser.add_argument('--seed', type=int, default=getattr(settings, 'MOCK_PAYMENTS_SEED', 0))
+        parser.add_argument('--output', help='Write the JSON results to this file')
+        parser.add_argument('--compare', help='Baseline results file to compare against')
+        parser.add_argument('--keep-data', action='store_true', help='Keep the fixture users, products and orders')
+
+    def handle(self, *args, **options):
+        if options['buyers'] < 1 or options['orders'] < 1:
+            raise CommandError('--buyers and --orders must be positive')
+        
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+        
+        benchmark = CheckoutBenchmark(
+            buyers=options['buyers'],
+            orders_per_buyer=options['orders'],
+            address_delay=options['address_delay'],
+            seed=options['seed'],
+            keep_data=options['keep_data']
+        )
+        try:
+            results = benchmark.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        if baseline:
+            results['comparison'] = compare_results(baseline, results)
+        
+        orders = results['orders']
+        self.stdout.write(
+            f"{orders['completed']}/{orders['attempted']} orders paid in {results['duration_s']}s: "
+            f"{results['orders_per_second']} orders/s, {results['queries_per_order']} queries/order"
+        )
+        if orders['errors']:
+            self.stdout.write(self.style.WARNING(f"Errors: {orders['errors']}"))
+        for stage, summary in results['stages'].items():
+            self.stdout.write(
+                f"  {stage:<20} p50 {summary['p50_ms']:>9.1f}ms  p95 {summary['p95_ms']:>9.1f}ms  "
+                f"p99 {summary['p99_ms']:>9.1f}ms  n={summary['count']}"
+            )
+        if baseline:
+            self.stdout.write(f"Compared with {results['comparison']['baseline_commit'] or options['compare']}: "
+                              f"{json.dumps(results['comparison'], indent=2)}")
+        
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
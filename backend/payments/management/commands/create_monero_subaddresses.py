@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services import AddressPoolService
+
+
+class Command(BaseCommand):
+    help = 'Pre-create Monero subaddresses in bulk and add them to the address pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Number of subaddresses to create')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 1:
+            raise CommandError('count must be positive')
+        
+        added = AddressPoolService().stock('XMR', count)
+        if added < count:
+            raise CommandError(f'Only {added} of {count} subaddresses were created, check the wallet RPC')
+        
+        self.stdout.write(self.style.SUCCESS(f'Added {added} Monero subaddresses to the pool'))
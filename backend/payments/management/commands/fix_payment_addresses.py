@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services import PaymentAddressBackfillService
+
+
+class Command(BaseCommand):
+    help = 'Generate payment addresses for orders that have none, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent provider calls')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders per batch and bulk update')
+        parser.add_argument('--limit', type=int, help='Stop after this many orders')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the oldest order')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be done without calling providers or writing')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+        
+        backfill = PaymentAddressBackfillService(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        
+        def progress(stats):
+            self.stdout.write(
+                f"Batch {stats['batches']}: {stats['orders']} orders, {stats['linked']} linked, "
+                f"{stats['generated']} generated, {stats['failed']} failed"
+            )
+        
+        stats = backfill.run(restart=options['restart'], limit=options['limit'], progress=progress)
+        
+        prefix = 'Dry run: would have fixed' if options['dry_run'] else 'Fixed'
+        message = f"{prefix} {stats['linked'] + stats['generated']} of {stats['orders']} orders"
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f"{message}, {stats['failed']} failed; rerun to retry them"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.standin import StandInState, WebhookFirer, create_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local BTCPay Server / monero-wallet-rpc stand-in for offline load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=18089)
+        parser.add_argument('--seed', type=int, default=getattr(settings, 'MOCK_PAYMENTS_SEED', 0))
+        parser.add_argument('--address-delay', type=float, default=0.0,
+                            help='Seconds before a new invoice has a deposit address')
+        parser.add_argument('--block-interval', type=float, default=2.0,
+                            help='Seconds per simulated Monero block')
+        parser.add_argument('--xmr-amount', type=Decimal, default=Decimal('1000'),
+                            help='XMR sent to each paid subaddress')
+        parser.add_argument('--webhook-rate', type=float, default=0.0,
+                            help='Payments per second to simulate; 0 disables payments and webhooks')
+        parser.add_argument('--webhook-url', default=f"{settings.SITE_URL}/api/v1/payments/webhooks/btcpay/")
+
+    def handle(self, *args, **options):
+        if options['webhook_rate'] < 0:
+            raise CommandError('--webhook-rate must not be negative')
+        
+        state = StandInState(
+            seed=options['seed'],
+            address_delay=options['address_delay'],
+            block_interval=options['block_interval'],
+            xmr_amount=options['xmr_amount']
+        )
+        server = create_server(options['host'], options['port'], state)
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+        
+        firer = None
+        if options['webhook_rate']:
+            firer = WebhookFirer(state, options['webhook_url'], options['webhook_rate'])
+            firer.start()
+        
+        self.stdout.write(self.style.SUCCESS(f'Payment stand-in listening on {base_url}'))
+        self.stdout.write(f'  BTCPAY_SERVER_URL={base_url}')
+        self.stdout.write(f'  MONERO_RPC_URL={base_url}/json_rpc')
+        if firer:
+            self.stdout.write(f"  Paying {options['webhook_rate']}/s, webhooks -> {options['webhook_url']}")
+        
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if firer:
+                firer.stop()
+                self.stdout.write(f'Webhooks: {firer.stats}')
+            server.server_close()
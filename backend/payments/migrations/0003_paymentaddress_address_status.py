@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_paymentwebhook_delivery_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentaddress',
+            name='address_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='paymentaddress',
+            name='payment_address',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='paymentaddress',
+            index=models.Index(fields=['address_status'], name='payment_add_address_93f827_idx'),
+        ),
+    ]
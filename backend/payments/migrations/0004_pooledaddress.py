@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_paymentaddress_address_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledAddress',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('payment_address', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('available', 'Available'), ('claimed', 'Claimed')], default='available', max_length=20)),
+                ('btcpay_invoice_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('btcpay_checkout_link', models.URLField(blank=True, null=True)),
+                ('monero_subaddress_index', models.IntegerField(blank=True, null=True)),
+                ('order_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payment_address_pool',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentaddress',
+            index=models.Index(fields=['btcpay_invoice_id'], name='payment_add_btcpay__e9db0d_idx'),
+        ),
+        migrations.AddField(
+            model_name='pooledaddress',
+            name='crypto_currency',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shared.cryptocurrency'),
+        ),
+        migrations.AddIndex(
+            model_name='pooledaddress',
+            index=models.Index(fields=['crypto_currency', 'status', 'created_at'], name='payment_add_crypto__9fe770_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pooledaddress',
+            index=models.Index(fields=['claimed_at'], name='payment_add_claimed_c02c59_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:22
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_pooledaddress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScannerCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('height', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'payment_scanner_checkpoints',
+            },
+        ),
+    ]
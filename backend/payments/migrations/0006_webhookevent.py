@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:23
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_scannercheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('webhook_type', models.CharField(choices=[('btcpay', 'BTCPay Server'), ('monero', 'Monero RPC'), ('manual', 'Manual Update')], max_length=20)),
+                ('external_id', models.CharField(blank=True, max_length=255)),
+                ('delivery_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payment_webhook_events',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='payment_web_status_3b94c0_idx'), models.Index(fields=['external_id', 'created_at'], name='payment_web_externa_d86b8b_idx')],
+            },
+        ),
+    ]
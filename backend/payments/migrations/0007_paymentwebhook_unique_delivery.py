@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:24
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_deliveries(apps, schema_editor):
+    """Keep one row per (webhook_type, delivery_id), preferring the processed one"""
+    PaymentWebhook = apps.get_model('payments', 'PaymentWebhook')
+    duplicates = PaymentWebhook.objects.exclude(delivery_id__isnull=True).values(
+        'webhook_type', 'delivery_id'
+    ).annotate(rows=Count('id')).filter(rows__gt=1)
+
+    for duplicate in duplicates:
+        rows = PaymentWebhook.objects.filter(
+            webhook_type=duplicate['webhook_type'],
+            delivery_id=duplicate['delivery_id']
+        ).order_by('-processed', 'created_at')
+        keep = rows.first()
+        rows.exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_webhookevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_deliveries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentwebhook',
+            constraint=models.UniqueConstraint(fields=('webhook_type', 'delivery_id'), name='unique_webhook_delivery'),
+        ),
+    ]
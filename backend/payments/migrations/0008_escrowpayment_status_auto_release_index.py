@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_paymentwebhook_unique_delivery'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowpayment',
+            index=models.Index(fields=['status', 'auto_release_at'], name='escrow_paym_status_c90b23_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_escrowpayment_status_auto_release_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentDailyStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('expected_volume', models.DecimalField(decimal_places=8, default=0, max_digits=28)),
+                ('received_volume', models.DecimalField(decimal_places=8, default=0, max_digits=28)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'payment_daily_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentaddress',
+            index=models.Index(fields=['created_at'], name='payment_add_created_444f0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentaddress',
+            index=models.Index(fields=['updated_at'], name='payment_add_updated_c85643_idx'),
+        ),
+        migrations.AddField(
+            model_name='paymentdailystats',
+            name='crypto_currency',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shared.cryptocurrency'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentdailystats',
+            index=models.Index(fields=['date'], name='payment_dai_date_efaa4f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentdailystats',
+            index=models.Index(fields=['refreshed_at'], name='payment_dai_refresh_c4ad6a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentdailystats',
+            constraint=models.UniqueConstraint(fields=('date', 'crypto_currency', 'status'), name='unique_payment_daily_stats'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_paymentdailystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowpayment',
+            index=models.Index(fields=['created_at', 'id'], name='escrow_paym_created_c8b7ac_idx'),
+        ),
+    ]
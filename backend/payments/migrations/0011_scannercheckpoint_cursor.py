@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_escrowpayment_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scannercheckpoint',
+            name='cursor',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
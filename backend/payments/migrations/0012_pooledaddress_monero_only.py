@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def drop_btcpay_pool_entries(apps, schema_editor):
+    """Open-amount BTCPay invoices can't be bound to an order total; discard the unclaimed ones"""
+    PooledAddress = apps.get_model('payments', 'PooledAddress')
+    PooledAddress.objects.filter(status='available', btcpay_invoice_id__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_scannercheckpoint_cursor'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_btcpay_pool_entries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pooledaddress',
+            name='btcpay_checkout_link',
+        ),
+        migrations.RemoveField(
+            model_name='pooledaddress',
+            name='btcpay_invoice_id',
+        ),
+    ]
@@ -1,26 +1,150 @@
+import math
 import time
 import random
+import threading
+from collections import Counter
 from decimal import Decimal
 from django.conf import settings
 from .models import PaymentAddress, PaymentStatus
 from .services import BTCPayServerService, MoneroRPCService
 from django.utils import timezone
 from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# z-score of the 99th percentile, used to fit a log-normal to p50/p99
+Z_99 = 2.3263
+
+# Used when MOCK_PAYMENTS_PROFILES does not define a key
+DEFAULT_PROFILE = {
+    'latency_p50': 0.0,       # seconds
+    'latency_p99': 0.0,       # seconds
+    'error_rate': 0.0,        # share of calls that fail fast
+    'timeout_rate': 0.0,      # share of calls that hang until `timeout`
+    'timeout': 30.0,          # seconds, matches the real clients' request timeout
+    'payment_success_rate': 1.0,
+    'operations': {},         # per-operation overrides of the keys above
+}
+
+# Process-wide generators for the MOCK_PAYMENTS_SEED streams, so the short-lived
+# services get_payment_service() builds per call keep drawing new values
+_shared_streams = {}
+_shared_streams_lock = threading.Lock()
+
+
+def _shared_stream(seed, stream: str) -> tuple:
+    """(rng, lock) shared by every profile drawing from ``stream`` under ``seed``"""
+    with _shared_streams_lock:
+        if (seed, stream) not in _shared_streams:
+            _shared_streams[(seed, stream)] = (random.Random(f"{seed}:{stream}"), threading.Lock())
+        return _shared_streams[(seed, stream)]
+
+
+class FaultProfile:
+    """Seeded latency and failure injection for one mock provider.
+    
+    Latency follows a log-normal fitted to the profile's p50/p99. A failed
+    call returns None, like the real services do when their HTTP call fails;
+    a timed-out call first blocks for the full timeout.
+    
+    Profiles built without an explicit ``seed`` share one generator per
+    stream for the whole process; an explicit seed starts a private sequence
+    that repeats exactly.
+    """
+    
+    def __init__(self, stream: str, name: str = None, seed: int = None):
+        self.name = name or getattr(settings, 'MOCK_PAYMENTS_PROFILE', 'test')
+        profiles = {'test': {}, **getattr(settings, 'MOCK_PAYMENTS_PROFILES', {})}
+        if self.name not in profiles:
+            raise ValueError(f"Unknown mock payments profile: {self.name}")
+        self.config = {**DEFAULT_PROFILE, **profiles.get(self.name, {})}
+        
+        # One stream per provider so adding calls to one does not shift another
+        if seed is None:
+            self.rng, self._lock = _shared_stream(getattr(settings, 'MOCK_PAYMENTS_SEED', 0), stream)
+        else:
+            self.rng, self._lock = random.Random(f"{seed}:{stream}"), threading.Lock()
+        self.stream = stream
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+    
+    def option(self, operation: str, key: str):
+        return self.config['operations'].get(operation, {}).get(key, self.config[key])
+    
+    def latency(self, operation: str) -> float:
+        """Draw one latency sample for an operation"""
+        p50 = self.option(operation, 'latency_p50')
+        p99 = max(self.option(operation, 'latency_p99'), p50)
+        if p50 <= 0:
+            return 0.0
+        
+        sigma = (math.log(p99) - math.log(p50)) / Z_99
+        with self._lock:
+            return self.rng.lognormvariate(math.log(p50), sigma)
+    
+    def chance(self, probability: float) -> bool:
+        with self._lock:
+            return self.rng.random() < probability
+    
+    def choice(self, options: list):
+        with self._lock:
+            return self.rng.choice(options)
+    
+    def randint(self, low: int, high: int) -> int:
+        with self._lock:
+            return self.rng.randint(low, high)
+    
+    def call(self, operation: str) -> bool:
+        """Simulate the provider round trip; False when an error or timeout was injected"""
+        with self._lock:
+            roll = self.rng.random()
+        timeout_rate = self.option(operation, 'timeout_rate')
+        error_rate = self.option(operation, 'error_rate')
+        
+        if roll < timeout_rate:
+            time.sleep(self.option(operation, 'timeout'))
+            self._record(operation, 'timeouts')
+            logger.warning(f"Mock {self.stream}.{operation}: injected timeout")
+            return False
+        
+        delay = self.latency(operation)
+        if delay:
+            time.sleep(delay)
+        
+        if roll < timeout_rate + error_rate:
+            self._record(operation, 'errors', delay)
+            logger.warning(f"Mock {self.stream}.{operation}: injected error")
+            return False
+        
+        self._record(operation, 'ok', delay)
+        return True
+    
+    def _record(self, operation: str, outcome: str, delay: float = 0.0):
+        with self._stats_lock:
+            self.stats['calls'] += 1
+            self.stats[outcome] += 1
+            self.stats[f"{operation}.{outcome}"] += 1
+            self.stats['latency_ms'] += int(delay * 1000)
+
 
 class MockBTCPayService:
     """Mock BTCPay service for local development"""
     
+    def __init__(self, profile: FaultProfile = None):
+        self.profile = profile or FaultProfile('btcpay')
+    
     def create_invoice(self, order_id: str, amount: Decimal, currency: str = 'BTC') -> dict:
         """Create mock BTCPay invoice"""
-        # Simulate API delay
-        time.sleep(1)
+        if not self.profile.call('create_invoice'):
+            return None
         
         # Generate mock data
         mock_invoice = {
             'id': f'mock_invoice_{order_id}',
             'checkoutLink': f'http://localhost:3000/mock-payment/{order_id}',
             'addresses': {
-                'BTC': f'tb1q{random.randint(1000000000000000000, 9999999999999999999)}'
+                'BTC': f'tb1q{self.profile.randint(1000000000000000000, 9999999999999999999)}'
             },
             'status': 'New',
             'amount': str(amount),
@@ -31,11 +155,12 @@ class MockBTCPayService:
     
     def get_invoice_status(self, invoice_id: str) -> dict:
         """Get mock invoice status"""
-        time.sleep(0.5)
+        if not self.profile.call('get_invoice_status'):
+            return None
         
         # Simulate payment progression
         statuses = ['New', 'Paid', 'Confirmed', 'Complete']
-        current_status = random.choice(statuses)
+        current_status = self.profile.choice(statuses)
         
         return {
             'id': invoice_id,
@@ -47,40 +172,65 @@ class MockBTCPayService:
 class MockMoneroService:
     """Mock Monero service for local development"""
     
+    def __init__(self, profile: FaultProfile = None):
+        self.profile = profile or FaultProfile('monero')
+    
     def create_subaddress(self, account_index: int = 0, label: str = "") -> dict:
         """Create mock Monero subaddress"""
-        time.sleep(1)
+        if not self.profile.call('create_address'):
+            return None
         
         # Generate mock address
-        mock_address = f'9{random.randint(1000000000000000000, 9999999999999999999)}'
+        mock_address = f'9{self.profile.randint(1000000000000000000, 9999999999999999999)}'
         
         return {
             'address': mock_address,
             'address_index': account_index
         }
     
+    def create_subaddresses(self, count: int, account_index: int = 0, label: str = "") -> list:
+        """Create mock Monero subaddresses in a single call"""
+        if not self.profile.call('create_address'):
+            return []
+        
+        return [
+            {
+                'address': f'9{self.profile.randint(1000000000000000000, 9999999999999999999)}',
+                'address_index': address_index
+            }
+            for address_index in range(1, count + 1)
+        ]
+    
+    def get_height(self) -> int:
+        """Get mock chain tip"""
+        if not self.profile.call('get_height'):
+            return None
+        return 3000000 + int(time.time() // 120)
+    
     def get_balance(self, account_index: int = 0) -> dict:
         """Get mock wallet balance"""
-        time.sleep(0.5)
+        if not self.profile.call('get_balance'):
+            return None
         
         return {
-            'balance': random.randint(100000000000, 999999999999),
-            'unlocked_balance': random.randint(100000000000, 999999999999)
+            'balance': self.profile.randint(100000000000, 999999999999),
+            'unlocked_balance': self.profile.randint(100000000000, 999999999999)
         }
     
     def check_payment(self, payment_id: str, amount: int) -> bool:
         """Mock payment check"""
-        time.sleep(0.5)
+        if not self.profile.call('get_payments'):
+            return False
         
-        # Simulate 80% success rate
-        return random.random() > 0.2
+        return self.profile.chance(self.profile.config['payment_success_rate'])
 
 class MockPaymentService:
     """Mock payment service for local development"""
     
-    def __init__(self):
-        self.btcpay = MockBTCPayService()
-        self.monero = MockMoneroService()
+    def __init__(self, profile_name: str = None, seed: int = None):
+        self.btcpay = MockBTCPayService(FaultProfile('btcpay', profile_name, seed))
+        self.monero = MockMoneroService(FaultProfile('monero', profile_name, seed))
+        self.profile = FaultProfile('payments', profile_name, seed)
     
     def create_payment_address(self, order_id: str, crypto_currency: str, 
                              amount: Decimal, payment_type: str = 'wallet',
@@ -88,15 +238,16 @@ class MockPaymentService:
         """Create mock payment address"""
         
         # Simulate processing delay
-        time.sleep(2)
+        if not self.profile.call('create_payment_address'):
+            raise Exception(f"Mock payment address creation failed for order {order_id}")
         
         # Generate mock address based on cryptocurrency
         if crypto_currency == 'BTC':
-            payment_address = f'tb1q{random.randint(1000000000000000000, 9999999999999999999)}'
+            payment_address = f'tb1q{self.profile.randint(1000000000000000000, 9999999999999999999)}'
         elif crypto_currency == 'XMR':
-            payment_address = f'9{random.randint(1000000000000000000, 9999999999999999999)}'
+            payment_address = f'9{self.profile.randint(1000000000000000000, 9999999999999999999)}'
         else:
-            payment_address = f'mock_{crypto_currency}_{random.randint(1000000, 9999999)}'
+            payment_address = f'mock_{crypto_currency}_{self.profile.randint(1000000, 9999999)}'
         
         # Create payment address record
         payment_address_obj = PaymentAddress.objects.create(
@@ -123,7 +274,7 @@ class MockPaymentService:
                 payment_address.status = 'paid'
                 payment_address.confirmed_at = timezone.now()
                 payment_address.received_amount = payment_address.expected_amount
-                payment_address.transaction_hash = f'mock_tx_{random.randint(1000000000000000000, 9999999999999999999)}'
+                payment_address.transaction_hash = f'mock_tx_{self.profile.randint(1000000000000000000, 9999999999999999999)}'
                 payment_address.save()
                 
                 print(f"✅ Mock payment confirmed for order {order_id}")
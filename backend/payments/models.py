@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from shared.models import BaseModel, CryptoCurrency
 import uuid
 from enum import Enum
@@ -33,7 +34,12 @@ class PaymentAddress(BaseModel):
     btcpay_checkout_link = models.URLField(blank=True, null=True)
     
     # Crypto addresses
-    payment_address = models.CharField(max_length=255)
+    payment_address = models.CharField(max_length=255, blank=True)
+    address_status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ], default='ready')  # BTCPay addresses are generated after the invoice
     expected_amount = models.DecimalField(max_digits=20, decimal_places=8)
     received_amount = models.DecimalField(max_digits=20, decimal_places=8, default=0)
     
@@ -65,11 +71,49 @@ class PaymentAddress(BaseModel):
             models.Index(fields=['order_id']),
             models.Index(fields=['payment_address']),
             models.Index(fields=['status']),
+            models.Index(fields=['address_status']),
+            models.Index(fields=['btcpay_invoice_id']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
         return f"Payment {self.order_id} - {self.crypto_currency.symbol}"
 
+    @property
+    def is_address_pending(self):
+        """Check if the deposit address is still being generated"""
+        return self.address_status == 'pending'
+
+
+class PooledAddress(BaseModel):
+    """Pre-generated deposit address waiting to be claimed by an order"""
+    
+    POOL_STATUS = [
+        ('available', 'Available'),
+        ('claimed', 'Claimed'),
+    ]
+    
+    crypto_currency = models.ForeignKey(CryptoCurrency, on_delete=models.CASCADE)
+    payment_address = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=POOL_STATUS, default='available')
+    
+    # Wallet reference copied onto the PaymentAddress when claimed
+    monero_subaddress_index = models.IntegerField(blank=True, null=True)
+    
+    order_id = models.CharField(max_length=100, blank=True, null=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'payment_address_pool'
+        indexes = [
+            models.Index(fields=['crypto_currency', 'status', 'created_at']),
+            models.Index(fields=['claimed_at']),
+        ]
+
+    def __str__(self):
+        return f"Pooled {self.crypto_currency.symbol} address - {self.status}"
+
 
 class EscrowPayment(BaseModel):
     """Model for escrow payments"""
@@ -111,6 +155,8 @@ class EscrowPayment(BaseModel):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['auto_release_at']),
+            models.Index(fields=['status', 'auto_release_at']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
@@ -145,6 +191,9 @@ class PaymentWebhook(BaseModel):
     
     class Meta:
         db_table = 'payment_webhooks'
+        constraints = [
+            models.UniqueConstraint(fields=['webhook_type', 'delivery_id'], name='unique_webhook_delivery'),
+        ]
         indexes = [
             models.Index(fields=['external_id']),
             models.Index(fields=['processed']),
@@ -155,6 +204,38 @@ class PaymentWebhook(BaseModel):
         return f"Webhook {self.webhook_type} - {self.external_id}"
 
 
+class WebhookEvent(BaseModel):
+    """Verified webhook payload queued for background processing"""
+    
+    EVENT_STATUS = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    webhook_type = models.CharField(max_length=20, choices=PaymentWebhook.WEBHOOK_TYPES)
+    external_id = models.CharField(max_length=255, blank=True)  # BTCPay invoice ID, used for ordering
+    delivery_id = models.CharField(max_length=255, blank=True, null=True)
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=20, choices=EVENT_STATUS, default='queued')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'payment_webhook_events'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['external_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"WebhookEvent {self.webhook_type} - {self.external_id} ({self.status})"
+
+
 class PaymentMethod(BaseModel):
     """Model for storing accepted payment methods per vendor"""
     
@@ -204,4 +285,46 @@ class BlockchainTransaction(BaseModel):
         ]
 
     def __str__(self):
-        return f"TX {self.transaction_hash[:8]}... - {self.amount}" 
\ No newline at end of file
+        return f"TX {self.transaction_hash[:8]}... - {self.amount}" 
+
+
+class ScannerCheckpoint(BaseModel):
+    """Persisted progress marker for chain scanners"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    height = models.IntegerField(default=0)
+    cursor = models.CharField(max_length=100, blank=True)  # keyset position for jobs that don't walk blocks
+    
+    class Meta:
+        db_table = 'payment_scanner_checkpoints'
+
+    def __str__(self):
+        return f"{self.name} @ {self.height}"
+
+
+class PaymentDailyStats(BaseModel):
+    """Daily payment rollup per currency and status, keyed by creation date"""
+    
+    date = models.DateField()
+    crypto_currency = models.ForeignKey(CryptoCurrency, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    
+    payment_count = models.IntegerField(default=0)
+    expected_volume = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+    received_volume = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+    
+    # Start of the refresh that wrote this row; the next refresh resumes from here
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'payment_daily_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'crypto_currency', 'status'], name='unique_payment_daily_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['refreshed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.crypto_currency.symbol} {self.status}: {self.payment_count}"
@@ -0,0 +1,243 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from decimal import Decimal, ROUND_HALF_UP
+from types import MappingProxyType
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+import requests
+import logging
+
+from shared.models import CryptoCurrency
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'exchange-rates:snapshot'
+QUOTE_CURRENCY = 'USD'
+
+
+class RateSnapshot:
+    """Immutable set of USD prices, shared by every reader in the process.
+    
+    A refresh builds a new snapshot and swaps the reference, so readers never
+    see a half-updated set of rates and never take a lock.
+    """
+    
+    __slots__ = ('_rates', '_fetched_at', '_provider')
+    
+    def __init__(self, rates: dict, fetched_at=None, provider: str = ''):
+        object.__setattr__(self, '_rates', MappingProxyType({
+            symbol.upper(): Decimal(str(price)) for symbol, price in rates.items()
+        }))
+        object.__setattr__(self, '_fetched_at', fetched_at or timezone.now())
+        object.__setattr__(self, '_provider', provider)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("RateSnapshot is immutable")
+    
+    @property
+    def rates(self):
+        return self._rates
+    
+    @property
+    def fetched_at(self):
+        return self._fetched_at
+    
+    @property
+    def provider(self) -> str:
+        return self._provider
+    
+    def rate(self, from_symbol: str, to_symbol: str = QUOTE_CURRENCY):
+        """Units of ``to_symbol`` per unit of ``from_symbol``, or None if unknown"""
+        from_symbol, to_symbol = from_symbol.upper(), to_symbol.upper()
+        if from_symbol == to_symbol:
+            return Decimal(1)
+        
+        from_usd = Decimal(1) if from_symbol == QUOTE_CURRENCY else self._rates.get(from_symbol)
+        to_usd = Decimal(1) if to_symbol == QUOTE_CURRENCY else self._rates.get(to_symbol)
+        if not from_usd or not to_usd:
+            return None
+        return from_usd / to_usd
+    
+    def convert(self, amount, from_symbol: str, to_symbol: str = QUOTE_CURRENCY, places: int = 2):
+        """Convert a single amount; None when either rate is missing"""
+        return self.convert_many([amount], from_symbol, to_symbol, places)[0]
+    
+    def convert_many(self, amounts, from_symbol: str, to_symbol: str = QUOTE_CURRENCY, places: int = 2) -> list:
+        """Convert many amounts with one rate lookup; None entries pass through"""
+        rate = self.rate(from_symbol, to_symbol)
+        if rate is None:
+            return [None] * len(amounts)
+        
+        quantum = Decimal(1).scaleb(-places)
+        return [
+            None if amount is None else (Decimal(str(amount)) * rate).quantize(quantum, rounding=ROUND_HALF_UP)
+            for amount in amounts
+        ]
+    
+    def to_dict(self) -> dict:
+        return {
+            'rates': {symbol: str(price) for symbol, price in self._rates.items()},
+            'fetched_at': self._fetched_at.isoformat(),
+            'provider': self._provider
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RateSnapshot':
+        return cls(data['rates'], parse_datetime(data['fetched_at']), data.get('provider', ''))
+
+
+class ExchangeRateProvider(ABC):
+    """Source of USD prices for a set of currency symbols"""
+    
+    name = ''
+    
+    @abstractmethod
+    def fetch(self, symbols: list) -> dict:
+        """USD price per symbol for the symbols this provider knows"""
+
+
+class CoinGeckoRateProvider(ExchangeRateProvider):
+    """Public CoinGecko simple-price API"""
+    
+    name = 'coingecko'
+    COIN_IDS = {
+        'BTC': 'bitcoin',
+        'XMR': 'monero',
+        'ETH': 'ethereum',
+        'LTC': 'litecoin',
+    }
+    
+    def __init__(self):
+        self.base_url = getattr(settings, 'COINGECKO_API_URL', 'https://api.coingecko.com/api/v3')
+        self.timeout = getattr(settings, 'EXCHANGE_RATE_TIMEOUT', 10)
+    
+    def fetch(self, symbols: list) -> dict:
+        ids = {self.COIN_IDS[symbol]: symbol for symbol in symbols if symbol in self.COIN_IDS}
+        if not ids:
+            return {}
+        
+        response = requests.get(
+            f"{self.base_url}/simple/price",
+            params={'ids': ','.join(ids), 'vs_currencies': 'usd'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        
+        return {
+            ids[coin_id]: Decimal(str(prices['usd']))
+            for coin_id, prices in response.json().items()
+            if coin_id in ids and 'usd' in prices
+        }
+
+
+class FixtureRateProvider(ExchangeRateProvider):
+    """Static prices from EXCHANGE_RATE_FIXTURES, for offline runs and tests"""
+    
+    name = 'fixture'
+    
+    def fetch(self, symbols: list) -> dict:
+        fixtures = getattr(settings, 'EXCHANGE_RATE_FIXTURES', {})
+        return {symbol: Decimal(str(fixtures[symbol])) for symbol in symbols if symbol in fixtures}
+
+
+PROVIDERS = {
+    CoinGeckoRateProvider.name: CoinGeckoRateProvider,
+    FixtureRateProvider.name: FixtureRateProvider,
+}
+
+
+def get_rate_provider(name: str = None) -> ExchangeRateProvider:
+    """Provider by short name, or by dotted path to an ExchangeRateProvider subclass"""
+    name = name or getattr(settings, 'EXCHANGE_RATE_PROVIDER', 'coingecko')
+    provider_class = PROVIDERS.get(name) or import_string(name)
+    return provider_class()
+
+
+class ExchangeRateService:
+    """Refreshes prices and hands out the current in-process snapshot.
+    
+    The refresh job (Celery beat) writes each new snapshot to
+    CryptoCurrency.current_price and the shared cache. Other processes pick it
+    up from the cache once their copy is older than EXCHANGE_RATE_SNAPSHOT_TTL;
+    readers in between only dereference the snapshot.
+    """
+    
+    def __init__(self):
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+    
+    def refresh(self, provider: ExchangeRateProvider = None) -> RateSnapshot:
+        """Fetch prices for all active currencies and publish a new snapshot"""
+        provider = provider or get_rate_provider()
+        symbols = list(CryptoCurrency.objects.filter(is_active=True).values_list('symbol', flat=True))
+        
+        try:
+            prices = provider.fetch(symbols)
+        except Exception as e:
+            logger.error(f"Exchange rate refresh from {provider.name} failed: {str(e)}")
+            return self.get_snapshot()
+        
+        if not prices:
+            logger.warning(f"Exchange rate provider {provider.name} returned no prices")
+            return self.get_snapshot()
+        
+        now = timezone.now()
+        currencies = list(CryptoCurrency.objects.filter(symbol__in=prices))
+        for currency in currencies:
+            currency.current_price = prices[currency.symbol]
+            currency.updated_at = now
+        CryptoCurrency.objects.bulk_update(currencies, ['current_price', 'updated_at'])
+        
+        snapshot = RateSnapshot(prices, now, provider.name)
+        try:
+            cache.set(SNAPSHOT_CACHE_KEY, snapshot.to_dict(), timeout=None)
+        except Exception as e:
+            logger.warning(f"Exchange rate snapshot cache write failed: {str(e)}")
+        self._publish(snapshot)
+        
+        logger.info(f"Refreshed {len(prices)} exchange rates from {provider.name}")
+        return snapshot
+    
+    def get_snapshot(self) -> RateSnapshot:
+        """Current snapshot, reloaded from the shared cache when it is older than the TTL"""
+        ttl = getattr(settings, 'EXCHANGE_RATE_SNAPSHOT_TTL', 30)
+        if self._snapshot is not None and time.monotonic() - self._loaded_at < ttl:
+            return self._snapshot
+        
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at >= ttl:
+                self._publish(self._load())
+        return self._snapshot
+    
+    def _publish(self, snapshot: RateSnapshot):
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+    
+    def _load(self) -> RateSnapshot:
+        try:
+            data = cache.get(SNAPSHOT_CACHE_KEY)
+            if data:
+                return RateSnapshot.from_dict(data)
+        except Exception as e:
+            logger.warning(f"Exchange rate snapshot cache read failed: {str(e)}")
+        
+        # Empty cache (cold start or flush): fall back to the stored prices
+        try:
+            prices = dict(
+                CryptoCurrency.objects.filter(is_active=True, current_price__gt=0)
+                .values_list('symbol', 'current_price')
+            )
+        except Exception as e:
+            logger.warning(f"Exchange rate fallback read failed: {str(e)}")
+            if self._snapshot is not None:
+                return self._snapshot
+            raise
+        return RateSnapshot(prices, provider='database')
+
+
+exchange_rates = ExchangeRateService()
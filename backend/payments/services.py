@@ -2,11 +2,26 @@ import requests
 import json
 import hashlib
 import hmac
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Case, Count, DateTimeField, Exists, F, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.functions import Coalesce, Trunc, TruncDate
 from django.utils import timezone
-from .models import PaymentAddress, EscrowPayment, PaymentWebhook, BlockchainTransaction
+from .models import (
+    PaymentDailyStats,
+    PaymentAddress, PooledAddress, EscrowPayment, PaymentWebhook, WebhookEvent, BlockchainTransaction,
+    ScannerCheckpoint
+)
+from .cache import processed_deliveries
+from .events import payment_events
 from shared.models import CryptoCurrency
 import logging
 
@@ -20,6 +35,7 @@ class BTCPayServerService:
         self.base_url = getattr(settings, 'BTCPAY_SERVER_URL', 'http://94.130.201.44:23000')
         self.store_id = getattr(settings, 'BTCPAY_STORE_ID', 'AKwDcGXvXRfKkVD3uTD7cK2Yv3jbnidDhwihfxBGyUN3')  # Correct Store ID
         self.api_key = getattr(settings, 'BTCPAY_API_KEY', '')
+        self.address_timeout = getattr(settings, 'BTCPAY_ADDRESS_TIMEOUT', 5)
         self.headers = {
             'Authorization': f'token {self.api_key}',
             'Content-Type': 'application/json'
@@ -53,38 +69,14 @@ class BTCPayServerService:
                 data = response.json()
                 logger.info(f"BTCPay invoice created successfully: {data}")
                 
-                invoice_id = data.get('id')
-                
-                # Wait a moment for address generation, then fetch the invoice details
-                import time
-                time.sleep(2)  # Wait 2 seconds for address generation
-                
-                # Get the payment methods to get the BTC address
-                payment_methods_response = requests.get(
-                    f"{self.base_url}/api/v1/stores/{self.store_id}/invoices/{invoice_id}/payment-methods",
-                    headers=self.headers,
-                    timeout=30
-                )
-                
-                btc_address = ''
-                if payment_methods_response.status_code == 200:
-                    payment_methods_data = payment_methods_response.json()
-                    logger.info(f"BTCPay payment methods: {payment_methods_data}")
-                    
-                    # Extract BTC address from the payment methods response
-                    for payment_method in payment_methods_data:
-                        if payment_method.get('paymentMethodId') == 'BTC-CHAIN':
-                            btc_address = payment_method.get('destination', '')
-                            break
-                
-                logger.info(f"Extracted BTC address: {btc_address}")
-                
-                # Return a standardized format
+                # Return as soon as the invoice exists. The deposit address is
+                # resolved separately (see get_invoice_address) because BTCPay
+                # generates it asynchronously.
                 return {
-                    'invoice_id': invoice_id,
-                    'address': btc_address,
+                    'invoice_id': data.get('id'),
+                    'address': '',
                     'checkoutLink': data.get('checkoutLink', ''),
-                    'amount': str(amount),
+                    'amount': str(amount) if amount is not None else None,
                     'currency': currency,
                     'orderId': order_id
                 }
@@ -97,6 +89,52 @@ class BTCPayServerService:
             logger.error(f"BTCPay service error: {str(e)}")
             return None
     
+    def get_invoice_address(self, invoice_id: str) -> str:
+        """Get the BTC deposit address of an invoice, or '' if not generated yet"""
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/v1/stores/{self.store_id}/invoices/{invoice_id}/payment-methods",
+                headers=self.headers,
+                timeout=self.address_timeout
+            )
+            
+            if response.status_code == 200:
+                # Extract BTC address from the payment methods response
+                for payment_method in response.json():
+                    if payment_method.get('paymentMethodId') == 'BTC-CHAIN':
+                        return payment_method.get('destination', '') or ''
+            return ''
+            
+        except Exception as e:
+            logger.error(f"BTCPay payment methods error: {str(e)}")
+            return ''
+    
+    def poll_invoice_address(self, invoice_id: str, attempts: int = None,
+                             initial_delay: float = None, max_delay: float = 2.0) -> str:
+        """Poll for the invoice address with exponential backoff.
+        
+        The first attempt is made immediately; the total wait is bounded by
+        ``attempts`` and ``max_delay``. Returns '' if the address is still not
+        available, in which case the caller should leave it pending.
+        """
+        if attempts is None:
+            attempts = getattr(settings, 'BTCPAY_ADDRESS_POLL_ATTEMPTS', 3)
+        delay = initial_delay if initial_delay is not None else getattr(
+            settings, 'BTCPAY_ADDRESS_POLL_DELAY', 0.25
+        )
+        
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            
+            address = self.get_invoice_address(invoice_id)
+            if address:
+                return address
+        
+        logger.info(f"BTCPay address not ready after {attempts} attempts for invoice {invoice_id}")
+        return ''
+    
     def get_invoice_status(self, invoice_id: str) -> dict:
         """Get invoice status from BTCPay"""
         try:
@@ -114,6 +152,33 @@ class BTCPayServerService:
             logger.error(f"BTCPay status check error: {str(e)}")
             return None
     
+    def list_invoices(self, start: datetime = None, end: datetime = None, statuses: list = None,
+                      skip: int = 0, take: int = 100) -> list:
+        """One page of store invoices, newest first, or None if the request failed"""
+        params = [('skip', skip), ('take', take)]
+        if start:
+            params.append(('startDate', int(start.timestamp())))
+        if end:
+            params.append(('endDate', int(end.timestamp())))
+        params.extend(('status', status) for status in statuses or [])
+        
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/v1/stores/{self.store_id}/invoices",
+                headers=self.headers,
+                params=params,
+                timeout=30
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            logger.error(f"BTCPay invoice list failed. Status: {response.status_code}, Response: {response.text}")
+            return None
+            
+        except Exception as e:
+            logger.error(f"BTCPay invoice list error: {str(e)}")
+            return None
+    
     def verify_webhook(self, payload: str, signature: str) -> bool:
         """Verify BTCPay webhook signature"""
         try:
@@ -140,6 +205,9 @@ class BTCPayServerService:
 class MoneroRPCService:
     """Service for Monero wallet RPC integration"""
     
+    # monero-wallet-rpc rejects create_address with count > 64
+    MAX_SUBADDRESSES_PER_CALL = 64
+    
     def __init__(self):
         # Updated to use Monero wallet RPC on localhost:18082
         self.rpc_url = getattr(settings, 'MONERO_RPC_URL', 'http://localhost:18082/json_rpc')
@@ -192,6 +260,38 @@ class MoneroRPCService:
             }
         return None
     
+    def create_subaddresses(self, count: int, account_index: int = 0, label: str = "") -> list:
+        """Create many subaddresses with as few RPC calls as possible.
+        
+        The wallet RPC caps ``count`` per create_address call, so this makes
+        ceil(count / MAX_SUBADDRESSES_PER_CALL) calls. All addresses share the
+        same label. Returns whatever was created before any RPC failure.
+        """
+        addresses = []
+        
+        while len(addresses) < count:
+            batch = min(count - len(addresses), self.MAX_SUBADDRESSES_PER_CALL)
+            result = self._make_rpc_call("create_address", {
+                "account_index": account_index,
+                "count": batch,
+                "label": label
+            })
+            
+            if not result or 'result' not in result:
+                logger.error(f"Monero batch subaddress creation stopped after {len(addresses)} of {count}")
+                break
+            
+            data = result['result']
+            # Older wallets only return the first address when count is 1
+            batch_addresses = data.get('addresses') or [data['address']]
+            batch_indices = data.get('address_indices') or [data['address_index']]
+            addresses.extend(
+                {'address': address, 'address_index': address_index}
+                for address, address_index in zip(batch_addresses, batch_indices)
+            )
+        
+        return addresses
+    
     def get_balance(self, account_index: int = 0) -> dict:
         """Get wallet balance"""
         result = self._make_rpc_call("get_balance", {
@@ -202,22 +302,38 @@ class MoneroRPCService:
             return result['result']
         return None
     
-    def get_transfers(self, account_index: int = 0, subaddr_indices: list = None) -> dict:
-        """Get incoming transfers"""
+    def get_transfers(self, account_index: int = 0, subaddr_indices: list = None,
+                      min_height: int = None, pool: bool = False) -> dict:
+        """Get incoming transfers, optionally from min_height and including the mempool"""
         params = {
             "in": True,
+            "pool": pool,
             "account_index": account_index
         }
         
         if subaddr_indices:
             params["subaddr_indices"] = subaddr_indices
             
+        if min_height:
+            params["filter_by_height"] = True
+            # min_height is exclusive in the wallet RPC
+            params["min_height"] = min_height - 1
+            
         result = self._make_rpc_call("get_transfers", params)
         
         if result and 'result' in result:
             return result['result']
         return None
     
+    def get_height(self) -> int:
+        """Current chain tip as seen by the wallet, or None on RPC failure"""
+        result = self._make_rpc_call("get_height")
+        
+        if result and 'result' in result:
+            # get_height returns the block count, one past the tip
+            return result['result']['height'] - 1
+        return None
+    
     def check_payment(self, payment_id: str, amount: int) -> bool:
         """Check if payment has been received"""
         result = self._make_rpc_call("get_payments", {
@@ -231,17 +347,416 @@ class MoneroRPCService:
         return False
 
 
+class MoneroTransferScanner:
+    """Matches incoming Monero transfers to open payments, one RPC call per cycle"""
+    
+    CHECKPOINT_NAME = 'monero-transfers'
+    ATOMIC_UNITS = Decimal(10 ** 12)
+    
+    def __init__(self, monero: MoneroRPCService = None):
+        self.monero = monero or MoneroRPCService()
+    
+    def scan(self) -> dict:
+        """Run one scan cycle and return its counters, or None if the RPC failed"""
+        ScannerCheckpoint.objects.get_or_create(name=self.CHECKPOINT_NAME)
+        
+        with transaction.atomic():
+            # Row lock keeps concurrent scanners from racing on the checkpoint
+            checkpoint = ScannerCheckpoint.objects.select_for_update().get(name=self.CHECKPOINT_NAME)
+            
+            open_addresses = {
+                payment_address.monero_subaddress_index: payment_address
+                for payment_address in PaymentAddress.objects.filter(
+                    crypto_currency__symbol='XMR',
+                    status__in=['pending', 'partial'],
+                    monero_subaddress_index__isnull=False
+                ).select_related('escrow')
+            }
+            
+            stats = {'open_addresses': len(open_addresses), 'transfers': 0, 'updated': 0, 'paid': 0}
+            if not open_addresses:
+                return stats
+            
+            result = self.monero.get_transfers(
+                subaddr_indices=sorted(open_addresses),
+                min_height=checkpoint.height,
+                pool=True
+            )
+            if result is None:
+                return None
+            
+            transactions, tip = self._match_transfers(
+                result.get('in', []) + result.get('pool', []), open_addresses
+            )
+            stats['transfers'] = len(transactions)
+            
+            if transactions:
+                BlockchainTransaction.objects.bulk_create(
+                    transactions,
+                    update_conflicts=True,
+                    unique_fields=['transaction_hash'],
+                    update_fields=['block_height', 'confirmations', 'confirmed', 'confirmed_at', 'raw_transaction', 'updated_at']
+                )
+                updated, paid = self._update_payment_addresses(
+                    {tx.payment_address_id for tx in transactions}, open_addresses
+                )
+                stats['updated'] = len(updated)
+                stats['paid'] = len(paid)
+            
+            checkpoint.height = self._next_checkpoint(checkpoint.height, transactions, tip)
+            checkpoint.save(update_fields=['height', 'updated_at'])
+            stats['checkpoint'] = checkpoint.height
+        
+        if stats['updated']:
+            logger.info(f"Monero scan: {stats}")
+        return stats
+    
+    def _match_transfers(self, transfers: list, open_addresses: dict) -> tuple:
+        """Turn RPC transfers for open subaddresses into BlockchainTransaction rows"""
+        now = timezone.now()
+        matched = {}
+        tip = None
+        
+        for transfer in transfers:
+            payment_address = open_addresses.get(transfer.get('subaddr_index', {}).get('minor'))
+            if payment_address is None:
+                continue
+            
+            height = transfer.get('height') or None  # 0 while in the mempool
+            confirmations = transfer.get('confirmations', 0) if height else 0
+            if height:
+                tip = max(tip or 0, height + confirmations - 1)
+            
+            confirmed = confirmations >= payment_address.required_confirmations
+            matched[transfer['txid']] = BlockchainTransaction(
+                payment_address=payment_address,
+                transaction_hash=transfer['txid'],
+                block_height=height,
+                confirmations=confirmations,
+                amount=Decimal(transfer['amount']) / self.ATOMIC_UNITS,
+                fee=Decimal(transfer.get('fee', 0)) / self.ATOMIC_UNITS,
+                confirmed=confirmed,
+                confirmed_at=now if confirmed else None,
+                raw_transaction=transfer
+            )
+        
+        return list(matched.values()), tip
+    
+    def _update_payment_addresses(self, payment_address_ids: set, open_addresses: dict) -> tuple:
+        """Recompute totals for touched payments and bulk-update them"""
+        by_id = {payment_address.id: payment_address for payment_address in open_addresses.values()}
+        totals = BlockchainTransaction.objects.filter(
+            payment_address_id__in=payment_address_ids
+        ).values('payment_address_id').annotate(
+            received=Sum('amount'),
+            min_confirmations=Min('confirmations'),
+            last_transaction=Max('transaction_hash')
+        )
+        
+        now = timezone.now()
+        updated, paid = [], []
+        for total in totals:
+            payment_address = by_id[total['payment_address_id']]
+            payment_address.received_amount = total['received']
+            payment_address.confirmations = total['min_confirmations']
+            payment_address.transaction_hash = total['last_transaction']
+            
+            if payment_address.received_amount >= payment_address.expected_amount:
+                if payment_address.confirmations >= payment_address.required_confirmations:
+                    overpaid = payment_address.received_amount > payment_address.expected_amount
+                    payment_address.status = 'overpaid' if overpaid else 'paid'
+                    payment_address.confirmed_at = now
+                    paid.append(payment_address)
+            elif payment_address.received_amount > 0:
+                payment_address.status = 'partial'
+            
+            payment_address.updated_at = now
+            updated.append(payment_address)
+        
+        PaymentAddress.objects.bulk_update(
+            updated,
+            ['received_amount', 'confirmations', 'transaction_hash', 'status', 'confirmed_at', 'updated_at']
+        )
+        if paid:
+            PaymentService.mark_orders_paid([payment_address.order_id for payment_address in paid])
+            for payment_address in paid:
+                if hasattr(payment_address, 'escrow') and payment_address.escrow.status == 'created':
+                    payment_address.escrow.status = 'funded'
+        for payment_address in updated:
+            PaymentService.publish_payment_status(payment_address)
+        
+        return updated, paid
+    
+    def _next_checkpoint(self, current: int, transactions: list, tip: int) -> int:
+        """Lowest height that still has to be rescanned next cycle"""
+        unconfirmed_heights = [tx.block_height for tx in transactions if tx.block_height and not tx.confirmed]
+        if unconfirmed_heights:
+            return max(current, min(unconfirmed_heights))
+        if tip:
+            margin = getattr(settings, 'MONERO_SCAN_REORG_MARGIN', 10)
+            return max(current, tip - margin)
+        return current
+
+
+class ConfirmationTracker:
+    """Advances confirmation counts when a chain gets a new tip.
+    
+    Only transactions that are still unconfirmed are touched, and those all
+    sit in the last few blocks, so the work per block tracks recent chain
+    activity rather than the number of open payments.
+    """
+    
+    CHECKPOINT_PREFIX = 'tip:'
+    
+    def __init__(self, monero: MoneroRPCService = None):
+        self.monero = monero or MoneroRPCService()
+    
+    def poll(self) -> dict:
+        """Check the Monero wallet for a new tip and process it"""
+        tip = self.monero.get_height()
+        if tip is None:
+            return None
+        return self.on_new_tip('XMR', tip)
+    
+    def on_new_tip(self, crypto_currency: str, tip: int) -> dict:
+        """Recompute confirmations for every unconfirmed transaction below ``tip``"""
+        name = f"{self.CHECKPOINT_PREFIX}{crypto_currency}"
+        ScannerCheckpoint.objects.get_or_create(name=name)
+        
+        with transaction.atomic():
+            checkpoint = ScannerCheckpoint.objects.select_for_update().get(name=name)
+            stats = {'tip': tip, 'transactions': 0, 'payments': 0, 'paid': 0}
+            if tip == checkpoint.height:
+                return stats
+            
+            pending = BlockchainTransaction.objects.filter(
+                payment_address__crypto_currency__symbol=crypto_currency,
+                confirmed=False,
+                block_height__isnull=False,
+                block_height__lte=tip
+            )
+            touched = set(pending.values_list('payment_address_id', flat=True))
+            
+            if touched:
+                stats['transactions'] = self._update_transactions(pending, tip)
+                paid = self._update_payment_addresses(touched)
+                stats['payments'] = len(touched)
+                stats['paid'] = len(paid)
+            
+            checkpoint.height = tip
+            checkpoint.save(update_fields=['height', 'updated_at'])
+        
+        if stats['transactions']:
+            logger.info(f"{crypto_currency} tip {tip}: {stats}")
+        return stats
+    
+    def _update_transactions(self, pending, tip: int) -> int:
+        """One UPDATE: confirmations = tip - block_height + 1, confirmed once required is reached"""
+        now = timezone.now()
+        confirmations = Value(tip + 1) - F('block_height')
+        required = Subquery(
+            PaymentAddress.objects.filter(id=OuterRef('payment_address_id')).values('required_confirmations')[:1]
+        )
+        reached = GreaterThanOrEqual(confirmations, required)
+        
+        return pending.update(
+            confirmations=confirmations,
+            confirmed=Case(When(reached, then=Value(True)), default=Value(False)),
+            confirmed_at=Case(When(reached, then=Value(now)), default=Value(None), output_field=DateTimeField()),
+            updated_at=now
+        )
+    
+    def _update_payment_addresses(self, payment_address_ids: set) -> list:
+        """Roll transaction confirmations up to their payments and settle the ones now paid"""
+        now = timezone.now()
+        open_payments = PaymentAddress.objects.filter(
+            id__in=payment_address_ids, status__in=['pending', 'partial']
+        )
+        open_payments.update(
+            confirmations=Subquery(
+                BlockchainTransaction.objects.filter(
+                    payment_address_id=OuterRef('id')
+                ).values('payment_address_id').annotate(lowest=Min('confirmations')).values('lowest')[:1]
+            ),
+            updated_at=now
+        )
+        
+        paid_ids = list(open_payments.filter(
+            received_amount__gte=F('expected_amount'),
+            confirmations__gte=F('required_confirmations')
+        ).values_list('id', flat=True))
+        if paid_ids:
+            PaymentAddress.objects.filter(id__in=paid_ids).update(
+                status=Case(
+                    When(received_amount__gt=F('expected_amount'), then=Value('overpaid')),
+                    default=Value('paid')
+                ),
+                confirmed_at=now,
+                updated_at=now
+            )
+        
+        payments = list(PaymentAddress.objects.filter(id__in=payment_address_ids).select_related('escrow'))
+        paid = [payment_address for payment_address in payments if payment_address.id in paid_ids]
+        if paid:
+            PaymentService.mark_orders_paid([payment_address.order_id for payment_address in paid])
+            for payment_address in paid:
+                if hasattr(payment_address, 'escrow') and payment_address.escrow.status == 'created':
+                    payment_address.escrow.status = 'funded'
+        for payment_address in payments:
+            PaymentService.publish_payment_status(payment_address)
+        
+        return paid
+
+
+class AddressPoolService:
+    """Keeps a warm pool of pre-generated deposit addresses per currency.
+    
+    Only Monero subaddresses are pooled: they carry no amount and never expire,
+    so any order can take one. A BTCPay invoice is bound to its amount and
+    expires on BTCPay's schedule, so BTC orders always create their own.
+    """
+    
+    POOLED_CURRENCIES = ('XMR',)
+    
+    def __init__(self, btcpay: BTCPayServerService = None, monero: MoneroRPCService = None):
+        self.btcpay = btcpay or BTCPayServerService()
+        self.monero = monero or MoneroRPCService()
+    
+    def is_enabled(self, crypto_currency: str) -> bool:
+        """Check if pooling is configured for a currency"""
+        return (
+            getattr(settings, 'ADDRESS_POOL_ENABLED', False)
+            and crypto_currency in self.POOLED_CURRENCIES
+            and crypto_currency in getattr(settings, 'ADDRESS_POOL', {})
+        )
+    
+    def claim(self, crypto_currency: str, order_id: str) -> PooledAddress:
+        """Claim the oldest available address, or None if the pool is empty.
+        
+        SKIP LOCKED lets concurrent checkouts claim different rows without
+        waiting on each other.
+        """
+        if not self.is_enabled(crypto_currency):
+            return None
+        
+        with transaction.atomic():
+            pooled = PooledAddress.objects.select_for_update(
+                skip_locked=True, of=('self',)
+            ).filter(
+                crypto_currency__symbol=crypto_currency,
+                status='available'
+            ).order_by('created_at').first()
+            
+            if not pooled:
+                logger.warning(f"{crypto_currency} address pool is empty, falling back to live generation")
+                return None
+            
+            pooled.status = 'claimed'
+            pooled.order_id = order_id
+            pooled.claimed_at = timezone.now()
+            pooled.save(update_fields=['status', 'order_id', 'claimed_at', 'updated_at'])
+        
+        return pooled
+    
+    def get_depth(self, crypto_currency: str) -> int:
+        """Number of available addresses for a currency"""
+        return PooledAddress.objects.filter(
+            crypto_currency__symbol=crypto_currency,
+            status='available'
+        ).count()
+    
+    def refill(self, crypto_currency: str) -> int:
+        """Top the pool back up to its target once it drops below the low-water mark"""
+        config = getattr(settings, 'ADDRESS_POOL', {}).get(crypto_currency)
+        if not config or not self.is_enabled(crypto_currency):
+            return 0
+        
+        # Only one node refills a given currency at a time
+        lock_key = f"address-pool-refill:{crypto_currency}"
+        if not cache.add(lock_key, 1, timeout=300):
+            return 0
+        
+        try:
+            depth = self.get_depth(crypto_currency)
+            if depth >= config['low_water']:
+                return 0
+            
+            started = time.monotonic()
+            added = self.stock(crypto_currency, config['target'] - depth)
+            
+            logger.info(
+                f"Refilled {crypto_currency} address pool: depth {depth} -> {depth + added} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+            return added
+            
+        finally:
+            cache.delete(lock_key)
+    
+    def stock(self, crypto_currency: str, count: int) -> int:
+        """Generate ``count`` addresses and add them to the pool"""
+        if crypto_currency not in self.POOLED_CURRENCIES:
+            return 0
+        
+        crypto = CryptoCurrency.objects.get(symbol=crypto_currency)
+        pooled = self._generate_monero_addresses(crypto, count)
+        PooledAddress.objects.bulk_create(pooled, batch_size=1000, ignore_conflicts=True)
+        return len(pooled)
+    
+    def _generate_monero_addresses(self, crypto: CryptoCurrency, count: int) -> list:
+        """Create Monero subaddresses for the pool in batched RPC calls"""
+        return [
+            PooledAddress(
+                crypto_currency=crypto,
+                payment_address=subaddress_data['address'],
+                monero_subaddress_index=subaddress_data['address_index']
+            )
+            for subaddress_data in self.monero.create_subaddresses(count, label="Pool")
+        ]
+    
+    def get_metrics(self) -> dict:
+        """Pool depth and refill/claim rates per currency over the last hour"""
+        since = timezone.now() - timedelta(hours=1)
+        pool_config = getattr(settings, 'ADDRESS_POOL', {})
+        
+        rows = PooledAddress.objects.values('crypto_currency__symbol').annotate(
+            available=Count('id', filter=Q(status='available')),
+            refilled_last_hour=Count('id', filter=Q(created_at__gte=since)),
+            claimed_last_hour=Count('id', filter=Q(claimed_at__gte=since)),
+        )
+        
+        metrics = {
+            symbol: {
+                'available': 0,
+                'refilled_last_hour': 0,
+                'claimed_last_hour': 0,
+                'low_water': config['low_water'],
+                'target': config['target'],
+            }
+            for symbol, config in pool_config.items()
+        }
+        for row in rows:
+            entry = metrics.setdefault(row.pop('crypto_currency__symbol'), {})
+            entry.update(row)
+        
+        return {
+            'enabled': getattr(settings, 'ADDRESS_POOL_ENABLED', False),
+            'currencies': metrics
+        }
+
+
 class PaymentService:
     """Main payment service orchestrator"""
     
     def __init__(self):
         self.btcpay = BTCPayServerService()
         self.monero = MoneroRPCService()
+        self.address_pool = AddressPoolService(self.btcpay, self.monero)
     
     def create_payment_address(self, order_id: str, crypto_currency: str, 
                              amount: Decimal, payment_type: str = 'wallet',
-                             use_escrow: bool = False) -> PaymentAddress:
-        
+                             use_escrow: bool = False, subaddress: dict = None) -> PaymentAddress:
+        """Create (or refresh) the payment for an order; ``subaddress`` is an XMR address created in bulk by the caller"""
         try:
             crypto = CryptoCurrency.objects.get(symbol=crypto_currency)
             
@@ -269,22 +784,34 @@ class PaymentService:
                     crypto_currency, 1 if crypto_currency == 'XMR' else 3
             )
             
+            # Claim a pre-generated address so checkout doesn't wait on the wallet
+            if not payment_address.payment_address and not payment_address.is_address_pending and not subaddress:
+                self._claim_pooled_address(payment_address, crypto_currency)
+            
             # Generate address based on cryptocurrency (only if not already created)
-            if crypto_currency == 'BTC' and not payment_address.payment_address:
+            if crypto_currency == 'BTC' and not payment_address.payment_address and not payment_address.is_address_pending:
                 # Try BTCPay Server first
                 invoice_data = self.btcpay.create_invoice(order_id, amount, 'BTC')
-                if invoice_data and invoice_data.get('address'):
+                if invoice_data and invoice_data.get('invoice_id'):
                     payment_address.btcpay_invoice_id = invoice_data.get('invoice_id', '')
                     payment_address.btcpay_checkout_link = invoice_data.get('checkoutLink', '')
-                    payment_address.payment_address = invoice_data['address']
-                    logger.info(f"BTCPay address generated for order {order_id}: {payment_address.payment_address}")
+                    payment_address.payment_address = self.btcpay.poll_invoice_address(
+                        payment_address.btcpay_invoice_id
+                    )
+                    if payment_address.payment_address:
+                        payment_address.address_status = 'ready'
+                        logger.info(f"BTCPay address generated for order {order_id}: {payment_address.payment_address}")
+                    else:
+                        # Address is filled in later by the resolve_btcpay_address task
+                        payment_address.address_status = 'pending'
+                        logger.info(f"BTCPay address pending for order {order_id}, invoice {payment_address.btcpay_invoice_id}")
                 else:
                     # Fallback to static address generation
                     payment_address.payment_address = self._generate_btc_address(order_id)
                     logger.warning(f"Using fallback BTC address for order {order_id}: {payment_address.payment_address}")
                     
             elif crypto_currency == 'XMR' and not payment_address.payment_address:
-                subaddress_data = self.monero.create_subaddress(label=f"Order-{order_id}")
+                subaddress_data = subaddress or self.monero.create_subaddress(label=f"Order-{order_id}")
                 if subaddress_data:
                     payment_address.payment_address = subaddress_data['address']
                     payment_address.monero_subaddress_index = subaddress_data['address_index']
@@ -294,6 +821,9 @@ class PaymentService:
             
             payment_address.save()
             
+            if payment_address.is_address_pending:
+                self._schedule_address_resolution(payment_address)
+            
             # Create escrow if requested
             if use_escrow:
                 self._create_escrow_payment(payment_address, amount)
@@ -304,6 +834,120 @@ class PaymentService:
             logger.error(f"Payment address creation error: {str(e)}")
             raise
     
+    def _claim_pooled_address(self, payment_address: PaymentAddress, crypto_currency: str) -> bool:
+        """Fill the payment address from the pool if one is available"""
+        pooled = self.address_pool.claim(crypto_currency, payment_address.order_id)
+        if not pooled:
+            return False
+        
+        payment_address.payment_address = pooled.payment_address
+        payment_address.address_status = 'ready'
+        payment_address.monero_subaddress_index = pooled.monero_subaddress_index
+        logger.info(f"Pooled {crypto_currency} address claimed for order {payment_address.order_id}: {pooled.payment_address}")
+        return True
+    
+    def _schedule_address_resolution(self, payment_address: PaymentAddress):
+        """Queue background resolution of a pending BTCPay address"""
+        from .tasks import resolve_btcpay_address
+        
+        def enqueue():
+            try:
+                resolve_btcpay_address.delay(str(payment_address.id))
+            except Exception as e:
+                # The periodic resolve_pending_btcpay_addresses sweep picks it up
+                logger.error(f"Failed to queue address resolution for order {payment_address.order_id}: {str(e)}")
+        
+        transaction.on_commit(enqueue)
+    
+    def resolve_btcpay_address(self, payment_address: PaymentAddress) -> bool:
+        """Fetch a pending BTCPay address once and store it on the payment and order"""
+        if not payment_address.is_address_pending:
+            return True
+        
+        address = self.btcpay.get_invoice_address(payment_address.btcpay_invoice_id)
+        if not address:
+            return False
+        
+        from orders.models import Order
+        
+        with transaction.atomic():
+            PaymentAddress.objects.filter(
+                id=payment_address.id, address_status='pending'
+            ).update(payment_address=address, address_status='ready', updated_at=timezone.now())
+            Order.objects.filter(
+                order_id=payment_address.order_id, payment_address=''
+            ).update(payment_address=address, updated_at=timezone.now())
+        
+        payment_address.payment_address = address
+        payment_address.address_status = 'ready'
+        self.publish_payment_status(payment_address)
+        logger.info(f"BTCPay address resolved for order {payment_address.order_id}: {address}")
+        return True
+    
+    def mark_address_failed(self, payment_address: PaymentAddress):
+        """Give up on a pending BTCPay address"""
+        PaymentAddress.objects.filter(
+            id=payment_address.id, address_status='pending'
+        ).update(address_status='failed', updated_at=timezone.now())
+        payment_address.address_status = 'failed'
+        logger.error(f"BTCPay address resolution failed for order {payment_address.order_id}")
+    
+    def provision_order_address(self, order_id: str) -> bool:
+        """Create the payment address for a queued order and copy it onto the order.
+        
+        Returns False when there is nothing to provision; provider errors are
+        raised so the task can retry them.
+        """
+        from orders.models import Order, OrderStatus, PaymentProvisioning
+        
+        order = Order.objects.filter(order_id=order_id).only(
+            'id', 'order_id', 'crypto_currency', 'total_amount', 'use_escrow', 'order_status', 'payment_provisioning'
+        ).first()
+        if order is None or order.payment_provisioning == PaymentProvisioning.READY.value:
+            return False
+        if order.order_status != OrderStatus.PENDING_PAYMENT.value:
+            # Cancelled or expired while queued
+            Order.objects.filter(id=order.id).update(
+                payment_provisioning=PaymentProvisioning.FAILED.value, updated_at=timezone.now()
+            )
+            return False
+        
+        Order.objects.filter(id=order.id).update(
+            payment_provisioning=PaymentProvisioning.PROVISIONING.value, updated_at=timezone.now()
+        )
+        try:
+            payment_address = self.create_payment_address(
+                order_id=order.order_id,
+                crypto_currency=order.crypto_currency,
+                amount=order.total_amount,
+                payment_type='wallet',
+                use_escrow=order.use_escrow
+            )
+        except Exception:
+            Order.objects.filter(id=order.id).update(
+                payment_provisioning=PaymentProvisioning.QUEUED.value, updated_at=timezone.now()
+            )
+            raise
+        
+        Order.objects.filter(id=order.id).update(
+            payment_address=payment_address.payment_address,
+            payment_expires_at=payment_address.expires_at,
+            payment_provisioning=PaymentProvisioning.READY.value,
+            updated_at=timezone.now()
+        )
+        self.publish_payment_status(payment_address)
+        logger.info(f"Payment address provisioned for order {order_id}")
+        return True
+    
+    def mark_provisioning_failed(self, order_id: str):
+        """Give up on provisioning an order's payment address"""
+        from orders.models import Order, PaymentProvisioning
+        
+        Order.objects.filter(order_id=order_id).exclude(
+            payment_provisioning=PaymentProvisioning.READY.value
+        ).update(payment_provisioning=PaymentProvisioning.FAILED.value, updated_at=timezone.now())
+        logger.error(f"Payment address provisioning failed for order {order_id}")
+    
     def _generate_btc_address(self, order_id: str) -> str:
         """Generate deterministic BTC testnet address (for development/testing only)"""
         # This is a simplified version that generates a valid testnet address format
@@ -349,6 +993,11 @@ class PaymentService:
             status = payload.get('status')
             webhook_type = payload.get('type')
             
+            delivery_id = payload.get('deliveryId')
+            if delivery_id and ('btcpay', delivery_id) in processed_deliveries:
+                logger.info(f"Webhook delivery {delivery_id} already processed, skipping")
+                return True
+            
             logger.info(f"Processing BTCPay webhook: invoice_id={invoice_id}, order_id={order_id}, status={status}, type={webhook_type}")
             logger.info(f"Full webhook payload: {payload}")
             
@@ -374,27 +1023,14 @@ class PaymentService:
                 logger.warning(f"PaymentAddress not found for order_id={order_id}, invoice_id={invoice_id}")
                 return False
             
-            # Check if this webhook was already processed
-            existing_webhook = PaymentWebhook.objects.filter(
-                payment_address=payment_address,
-                webhook_type='btcpay',
-                external_id=invoice_id,
-                delivery_id=payload.get('deliveryId')
-            ).first()
-            
-            if existing_webhook and existing_webhook.processed:
+            # Store webhook; the (webhook_type, delivery_id) unique constraint
+            # rejects redeliveries in the insert itself
+            webhook = self._store_webhook(payment_address, 'btcpay', invoice_id, payload)
+            if webhook.processed:
                 logger.info(f"Webhook already processed for invoice {invoice_id}, skipping")
+                processed_deliveries.add(('btcpay', webhook.delivery_id))
                 return True
             
-            # Store webhook
-            webhook = PaymentWebhook.objects.create(
-                payment_address=payment_address,
-                webhook_type='btcpay',
-                external_id=invoice_id,
-                raw_data=payload,
-                delivery_id=payload.get('deliveryId')
-            )
-            
             # Update payment status based on webhook type
             if webhook_type == 'InvoiceReceivedPayment':
                 # Payment received, update status
@@ -418,11 +1054,14 @@ class PaymentService:
                     escrow = payment_address.escrow
                     escrow.status = 'funded'
                     escrow.save()
+                self.publish_payment_status(payment_address)
                 
                 # Mark webhook as processed
                 webhook.processed = True
                 webhook.processed_at = timezone.now()
                 webhook.save()
+                if delivery_id:
+                    processed_deliveries.add(('btcpay', delivery_id))
                 
                 logger.info(f"Payment confirmed for order {payment_address.order_id}")
             
@@ -431,6 +1070,7 @@ class PaymentService:
                 payment_address.status = 'paid'
                 payment_address.confirmed_at = timezone.now()
                 payment_address.save()
+                self.publish_payment_status(payment_address)
                 
                 # Update order status
                 logger.info(f"Calling _update_order_status_on_payment for settled order {payment_address.order_id}")
@@ -440,6 +1080,8 @@ class PaymentService:
                 webhook.processed = True
                 webhook.processed_at = timezone.now()
                 webhook.save()
+                if delivery_id:
+                    processed_deliveries.add(('btcpay', delivery_id))
                 
                 logger.info(f"Invoice settled for order {payment_address.order_id}")
             
@@ -449,6 +1091,22 @@ class PaymentService:
             logger.error(f"BTCPay webhook processing error: {str(e)}")
             return False
     
+    def _store_webhook(self, payment_address: PaymentAddress, webhook_type: str,
+                       external_id: str, payload: dict) -> PaymentWebhook:
+        """Insert a webhook row, or return the existing row for a redelivery"""
+        delivery_id = payload.get('deliveryId')
+        try:
+            with transaction.atomic():
+                return PaymentWebhook.objects.create(
+                    payment_address=payment_address,
+                    webhook_type=webhook_type,
+                    external_id=external_id,
+                    raw_data=payload,
+                    delivery_id=delivery_id
+                )
+        except IntegrityError:
+            return PaymentWebhook.objects.get(webhook_type=webhook_type, delivery_id=delivery_id)
+    
     def _update_order_status_on_payment(self, order_id: str):
         """Update order status when payment is received"""
         try:
@@ -459,7 +1117,9 @@ class PaymentService:
             logger.info(f"Found order: {order.id}, current status: {order.order_status}, payment_status: {order.payment_status}")
             
             # Only update if order is not already paid
-            if order.payment_status != 'paid':
+            if order.order_status == OrderStatus.CANCELLED.value:
+                logger.warning(f"Payment received for cancelled order {order_id}; needs a manual refund")
+            elif order.payment_status != 'paid':
                 # Update order status to processing
                 order.order_status = OrderStatus.PROCESSING.value
                 order.payment_status = 'paid'
@@ -478,9 +1138,9 @@ class PaymentService:
     def _process_monero_webhook(self, payload: dict) -> bool:
         """Process Monero payment notification"""
         try:
-            # Implementation for Monero payment processing
-            # This would involve checking transfers to specific subaddresses
-            return True
+            # monero-wallet-rpc --tx-notify only tells us something arrived;
+            # a scan cycle matches it (and anything else new) to open orders
+            return MoneroTransferScanner(self.monero).scan() is not None
             
         except Exception as e:
             logger.error(f"Monero webhook processing error: {str(e)}")
@@ -496,26 +1156,13 @@ class PaymentService:
     def check_payment_status(self, order_id: str) -> dict:
         """Check current payment status"""
         try:
-            payment_address = PaymentAddress.objects.get(order_id=order_id)
-            
-            result = {
-                'order_id': order_id,
-                'status': payment_address.status,
-                'expected_amount': str(payment_address.expected_amount),
-                'received_amount': str(payment_address.received_amount),
-                'payment_address': payment_address.payment_address,
-                'expires_at': payment_address.expires_at.isoformat(),
-                'confirmations': payment_address.confirmations,
-                'required_confirmations': payment_address.required_confirmations
-            }
-            
-            # Add escrow info if applicable
-            if hasattr(payment_address, 'escrow'):
-                result['escrow'] = {
-                    'status': payment_address.escrow.status,
-                    'auto_release_at': payment_address.escrow.auto_release_at.isoformat() if payment_address.escrow.auto_release_at else None
-                }
+            cached = self.get_cached_payment_status(order_id)
+            if cached is not None:
+                return cached
             
+            payment_address = PaymentAddress.objects.select_related('escrow').get(order_id=order_id)
+            result = self.serialize_payment_status(payment_address)
+            self.cache_payment_status(order_id, result)
             return result
             
         except PaymentAddress.DoesNotExist:
@@ -524,6 +1171,122 @@ class PaymentService:
             logger.error(f"Payment status check error: {str(e)}")
             return {'error': str(e)}
     
+    @staticmethod
+    def serialize_payment_status(payment_address: PaymentAddress) -> dict:
+        """Build the payment status payload served to checkout clients"""
+        result = {
+            'order_id': payment_address.order_id,
+            'status': payment_address.status,
+            'expected_amount': str(payment_address.expected_amount),
+            'received_amount': str(payment_address.received_amount),
+            'payment_address': payment_address.payment_address,
+            'address_status': payment_address.address_status,
+            'expires_at': payment_address.expires_at.isoformat(),
+            'confirmations': payment_address.confirmations,
+            'required_confirmations': payment_address.required_confirmations
+        }
+        
+        # Add escrow info if applicable
+        if hasattr(payment_address, 'escrow'):
+            result['escrow'] = {
+                'status': payment_address.escrow.status,
+                'auto_release_at': payment_address.escrow.auto_release_at.isoformat() if payment_address.escrow.auto_release_at else None
+            }
+        
+        return result
+    
+    @staticmethod
+    def payment_status_cache_key(order_id: str) -> str:
+        """Cache key for the serialized status of one order"""
+        return f"payment_status:{order_id}"
+    
+    @classmethod
+    def get_cached_payment_status(cls, order_id: str):
+        """Serialized status from the cache, or None on a miss"""
+        try:
+            return cache.get(cls.payment_status_cache_key(order_id))
+        except Exception as e:
+            logger.warning(f"Payment status cache read failed for order {order_id}: {str(e)}")
+            return None
+    
+    @classmethod
+    def cache_payment_status(cls, order_id: str, data: dict):
+        """Store a serialized status"""
+        timeout = getattr(settings, 'PAYMENT_STATUS_CACHE_TTL', 300)
+        try:
+            cache.set(cls.payment_status_cache_key(order_id), data, timeout)
+        except Exception as e:
+            logger.warning(f"Payment status cache write failed for order {order_id}: {str(e)}")
+    
+    @classmethod
+    def invalidate_payment_status(cls, *order_ids: str):
+        """Drop cached statuses once the surrounding transaction commits"""
+        keys = [cls.payment_status_cache_key(order_id) for order_id in order_ids]
+        if not keys:
+            return
+        
+        def delete():
+            try:
+                cache.delete_many(keys)
+            except Exception as e:
+                logger.warning(f"Payment status cache invalidation failed: {str(e)}")
+        
+        transaction.on_commit(delete)
+    
+    @classmethod
+    def publish_payment_status(cls, payment_address: PaymentAddress):
+        """Write the current status through to the cache and open status streams once the change commits"""
+        order_id = payment_address.order_id
+        data = cls.serialize_payment_status(payment_address)
+        
+        def write_through():
+            cls.cache_payment_status(order_id, data)
+            payment_events.publish(order_id, data)
+        
+        transaction.on_commit(write_through)
+    
+    @classmethod
+    def publish_payment_statuses(cls, *order_ids: str):
+        """publish_payment_status for orders changed by a bulk update, read back in one query once it commits"""
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        
+        def write_through():
+            try:
+                for payment_address in PaymentAddress.objects.select_related('escrow').filter(order_id__in=order_ids):
+                    data = cls.serialize_payment_status(payment_address)
+                    cls.cache_payment_status(payment_address.order_id, data)
+                    payment_events.publish(payment_address.order_id, data)
+            except Exception as e:
+                logger.warning(f"Payment status publish failed, dropping cached statuses: {str(e)}")
+                try:
+                    cache.delete_many([cls.payment_status_cache_key(order_id) for order_id in order_ids])
+                except Exception:
+                    pass
+        
+        transaction.on_commit(write_through)
+    
+    @staticmethod
+    def mark_orders_paid(order_ids: list):
+        """Set-based equivalent of _update_order_status_on_payment for many orders"""
+        from orders.models import Order, OrderStatus
+        
+        now = timezone.now()
+        # Cancelled orders have had their stock returned; they are never revived
+        Order.objects.filter(order_id__in=order_ids).exclude(payment_status='paid').exclude(
+            order_status=OrderStatus.CANCELLED.value
+        ).update(
+            order_status=OrderStatus.PROCESSING.value,
+            payment_status='paid',
+            payment_confirmed_at=now,
+            updated_at=now
+        )
+        EscrowPayment.objects.filter(
+            payment_address__order_id__in=order_ids, status='created'
+        ).update(status='funded', updated_at=now)
+        logger.info(f"Payments confirmed for orders: {order_ids}")
+    
     def release_escrow(self, order_id: str, released_by_user_id: int, admin_override: bool = False) -> bool:
         """Release escrow payment to vendor"""
         try:
@@ -538,6 +1301,7 @@ class PaymentService:
             escrow.released_at = timezone.now()
             escrow.released_by_id = released_by_user_id
             escrow.save()
+            self.publish_payment_status(payment_address)
             
             logger.info(f"Escrow released for order {order_id}")
             return True
@@ -547,27 +1311,202 @@ class PaymentService:
             return False
 
 
+class WebhookQueueService:
+    """Durable inbox for verified webhooks, drained in batches by workers"""
+    
+    def __init__(self, payment_service: PaymentService = None):
+        self.payment_service = payment_service or PaymentService()
+        self.batch_size = getattr(settings, 'WEBHOOK_QUEUE_BATCH_SIZE', 100)
+        self.max_attempts = getattr(settings, 'WEBHOOK_QUEUE_MAX_ATTEMPTS', 8)
+        self.processing_timeout = timedelta(seconds=getattr(settings, 'WEBHOOK_QUEUE_PROCESSING_TIMEOUT', 300))
+    
+    def enqueue(self, webhook_type: str, payload: dict) -> WebhookEvent:
+        """Persist a verified payload; processing happens in drain()"""
+        event = WebhookEvent.objects.create(
+            webhook_type=webhook_type,
+            external_id=payload.get('invoiceId') or '',
+            delivery_id=payload.get('deliveryId'),
+            payload=payload
+        )
+        
+        from .tasks import drain_webhook_queue
+        
+        def wake_worker():
+            try:
+                drain_webhook_queue.delay()
+            except Exception as e:
+                # The periodic drain picks the event up
+                logger.warning(f"Failed to queue webhook drain: {str(e)}")
+        
+        transaction.on_commit(wake_worker)
+        return event
+    
+    def drain(self) -> dict:
+        """Process queued events until the queue is empty; returns counters"""
+        self._requeue_stale()
+        
+        stats = {'done': 0, 'retried': 0, 'failed': 0}
+        while True:
+            events = self._claim_batch()
+            if not events:
+                return stats
+            
+            blocked = set()
+            for event in events:
+                # Keep per-invoice ordering: once an event fails, later events
+                # for the same invoice wait until it goes through
+                if event.external_id and event.external_id in blocked:
+                    self._release(event)
+                    continue
+                
+                outcome = self._process(event)
+                stats[outcome] += 1
+                if outcome != 'done' and event.external_id:
+                    blocked.add(event.external_id)
+    
+    def _claim_batch(self) -> list:
+        """Lock and mark the next batch of ready events as processing"""
+        now = timezone.now()
+        
+        # An event is ready only when no earlier event for its invoice is
+        # still outstanding (queued for retry or held by another worker)
+        earlier_outstanding = WebhookEvent.objects.filter(
+            external_id=OuterRef('external_id'),
+            status__in=['queued', 'processing'],
+            created_at__lt=OuterRef('created_at')
+        ).exclude(external_id='')
+        
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status='queued', next_attempt_at__lte=now)
+                .exclude(Exists(earlier_outstanding))
+                .order_by('created_at')[:self.batch_size]
+            )
+            if events:
+                WebhookEvent.objects.filter(id__in=[event.id for event in events]).update(
+                    status='processing',
+                    attempts=F('attempts') + 1,
+                    updated_at=now
+                )
+        
+        for event in events:
+            event.attempts += 1
+        return events
+    
+    def _process(self, event: WebhookEvent) -> str:
+        """Run one event through the payment service and record the outcome"""
+        now = timezone.now()
+        try:
+            success = self.payment_service.process_payment_webhook(event.webhook_type, event.payload)
+            error = '' if success else 'Processing returned failure'
+        except Exception as e:
+            success, error = False, str(e)
+        
+        if success:
+            WebhookEvent.objects.filter(id=event.id).update(
+                status='done', processed_at=now, last_error='', updated_at=now
+            )
+            return 'done'
+        
+        if event.attempts >= self.max_attempts:
+            WebhookEvent.objects.filter(id=event.id).update(
+                status='failed', last_error=error, updated_at=now
+            )
+            logger.error(f"Webhook event {event.id} failed after {event.attempts} attempts: {error}")
+            return 'failed'
+        
+        # 2s, 4s, 8s, ... capped at one hour
+        backoff = timedelta(seconds=min(2 ** event.attempts, 3600))
+        WebhookEvent.objects.filter(id=event.id).update(
+            status='queued', next_attempt_at=now + backoff, last_error=error, updated_at=now
+        )
+        return 'retried'
+    
+    def _release(self, event: WebhookEvent):
+        """Put a claimed event back without counting the attempt"""
+        WebhookEvent.objects.filter(id=event.id).update(
+            status='queued', attempts=F('attempts') - 1, updated_at=timezone.now()
+        )
+    
+    def _requeue_stale(self):
+        """Recover events left in processing by a crashed worker"""
+        cutoff = timezone.now() - self.processing_timeout
+        stale = WebhookEvent.objects.filter(status='processing', updated_at__lt=cutoff).update(
+            status='queued', updated_at=timezone.now()
+        )
+        if stale:
+            logger.warning(f"Requeued {stale} stale webhook events")
+
+
 class EscrowService:
     """Service for escrow management"""
     
-    def auto_release_escrows(self):
-        """Auto-release expired escrows"""
-        expired_escrows = EscrowPayment.objects.filter(
-            status='funded',
-            auto_release_enabled=True,
-            auto_release_at__lte=timezone.now()
+    # One statement per batch: lock due rows (skipping rows another node holds),
+    # release them and hand back what was released
+    AUTO_RELEASE_SQL = """
+        WITH due AS (
+            SELECT id FROM {table}
+            WHERE status = 'funded' AND auto_release_enabled AND auto_release_at <= %s
+            ORDER BY auto_release_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
         )
+        UPDATE {table} AS escrow
+        SET status = 'released', released_at = %s, updated_at = %s
+        FROM due
+        WHERE escrow.id = due.id
+        RETURNING escrow.id, escrow.payment_address_id
+    """
         
-        for escrow in expired_escrows:
-            try:
-                escrow.status = 'released'
-                escrow.released_at = timezone.now()
-                escrow.save()
+    def auto_release_escrows(self, batch_size: int = None) -> dict:
+        """Auto-release matured escrows in set-based batches"""
+        batch_size = batch_size or getattr(settings, 'ESCROW_AUTO_RELEASE_BATCH_SIZE', 1000)
+        now = timezone.now()
+        released = batches = 0
                 
-                logger.info(f"Auto-released escrow for order {escrow.payment_address.order_id}")
+        while True:
+            batch = self._release_batch(now, batch_size)
+            if not batch:
+                break
+            released += len(batch)
+            batches += 1
+            if len(batch) < batch_size:
+                break
                 
-            except Exception as e:
-                logger.error(f"Auto-release error for escrow {escrow.id}: {str(e)}")
+        if released:
+            logger.info(f"Auto-released {released} escrows in {batches} batches")
+        return {'released': released, 'batches': batches}
+    
+    def _release_batch(self, now, batch_size: int) -> list:
+        """Release one batch of matured escrows, returning (id, payment_address_id) rows"""
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        self.AUTO_RELEASE_SQL.format(table=EscrowPayment._meta.db_table),
+                        [now, batch_size, now, now]
+                    )
+                    released = cursor.fetchall()
+            else:
+                # Local/test databases without SKIP LOCKED
+                due = EscrowPayment.objects.filter(
+                    status='funded',
+                    auto_release_enabled=True,
+                    auto_release_at__lte=now
+                ).order_by('auto_release_at')
+                released = list(due.values_list('id', 'payment_address_id')[:batch_size])
+                EscrowPayment.objects.filter(
+                    id__in=[escrow_id for escrow_id, _ in released], status='funded'
+                ).update(status='released', released_at=now, updated_at=now)
+            
+            if released:
+                order_ids = PaymentAddress.objects.filter(
+                    id__in=[payment_address_id for _, payment_address_id in released]
+                ).values_list('order_id', flat=True)
+                PaymentService.publish_payment_statuses(*order_ids)
+        
+        return released
     
     def dispute_escrow(self, order_id: str, reason: str) -> bool:
         """Mark escrow as disputed"""
@@ -578,9 +1517,461 @@ class EscrowService:
             escrow.status = 'disputed'
             escrow.dispute_reason = reason
             escrow.save()
+            PaymentService.publish_payment_status(payment_address)
             
             return True
             
         except Exception as e:
             logger.error(f"Escrow dispute error: {str(e)}")
-            return False 
\ No newline at end of file
+            return False 
+
+
+class BTCPayReconciliationService:
+    """Repairs payments whose BTCPay webhooks were missed.
+    
+    Invoices for a time window are read from the store's invoice list a page
+    at a time and compared with the PaymentAddress rows in memory. Payments
+    that BTCPay shows further along are moved forward with one UPDATE per
+    target status; nothing is ever moved backwards.
+    
+    Money that arrived after a payment expired is never applied: the expiry
+    sweep has already cancelled the order and returned its stock. Those
+    payments are reported as late settlements for manual refund instead.
+    """
+    
+    STATUSES = ['Processing', 'Settled', 'Expired']
+    
+    # Statuses a payment may be moved out of, per target status
+    FORWARD_FROM = {
+        'paid': ['pending', 'partial'],
+        'overpaid': ['pending', 'partial'],
+        'partial': ['pending'],
+        'expired': ['pending'],
+    }
+    
+    def __init__(self, btcpay: BTCPayServerService = None, page_size: int = None):
+        self.btcpay = btcpay or BTCPayServerService()
+        self.page_size = page_size or getattr(settings, 'BTCPAY_RECONCILE_PAGE_SIZE', 200)
+    
+    def reconcile(self, start: datetime = None, end: datetime = None) -> dict:
+        """Reconcile invoices created in [start, end]; returns counters, or None if listing failed"""
+        end = end or timezone.now()
+        start = start or end - timedelta(hours=getattr(settings, 'BTCPAY_RECONCILE_WINDOW_HOURS', 24))
+        
+        targets, pages = {}, 0
+        while True:
+            page = self.btcpay.list_invoices(start, end, self.STATUSES, skip=pages * self.page_size, take=self.page_size)
+            if page is None:
+                return None
+            pages += 1
+            for invoice in page:
+                target = self.target_status(invoice)
+                if target:
+                    targets[invoice['id']] = target
+            if len(page) < self.page_size:
+                break
+        
+        drift, late = self._find_drift(targets)
+        stats = {'invoices': len(targets), 'pages': pages, 'repaired': 0}
+        if late:
+            stats['late_settlements'] = len(late)
+            logger.warning(
+                f"BTCPay reconciliation found {len(late)} payments received after expiry; "
+                f"orders need a manual refund: {late}"
+            )
+        for status, payments in drift.items():
+            stats[status] = self._repair(status, payments)
+            stats['repaired'] += stats[status]
+        
+        if stats['repaired']:
+            logger.info(f"BTCPay reconciliation repaired {stats['repaired']} payments: {stats}")
+        return stats
+    
+    @staticmethod
+    def target_status(invoice: dict) -> str:
+        """PaymentAddress status an invoice implies, or None if it says nothing new"""
+        status, additional = invoice.get('status'), invoice.get('additionalStatus')
+        if status in ('Processing', 'Settled') or additional == 'PaidLate':
+            return 'overpaid' if additional == 'PaidOver' else 'paid'
+        if status == 'Expired':
+            return 'partial' if additional == 'PaidPartial' else 'expired'
+        return None
+    
+    def _find_drift(self, targets: dict) -> tuple:
+        """Payments whose stored status is behind their invoice, grouped by target status,
+        and the orders of expired payments that were paid anyway"""
+        drift, late = {}, []
+        invoice_ids = list(targets)
+        for offset in range(0, len(invoice_ids), 1000):
+            rows = PaymentAddress.objects.filter(
+                btcpay_invoice_id__in=invoice_ids[offset:offset + 1000]
+            ).values_list('id', 'order_id', 'btcpay_invoice_id', 'status')
+            for payment_id, order_id, invoice_id, status in rows:
+                target = targets[invoice_id]
+                if status in self.FORWARD_FROM[target]:
+                    drift.setdefault(target, []).append((payment_id, order_id))
+                elif status == 'expired' and target != 'expired':
+                    late.append(order_id)
+        return drift, late
+    
+    def _repair(self, status: str, payments: list) -> int:
+        now = timezone.now()
+        ids = [payment_id for payment_id, _ in payments]
+        order_ids = [order_id for _, order_id in payments]
+        
+        with transaction.atomic():
+            changes = {'status': status, 'updated_at': now}
+            if status in ('paid', 'overpaid'):
+                changes['confirmed_at'] = Coalesce(F('confirmed_at'), Value(now))
+            repaired = PaymentAddress.objects.filter(
+                id__in=ids, status__in=self.FORWARD_FROM[status]
+            ).update(**changes)
+            
+            if status in ('paid', 'overpaid'):
+                PaymentService.mark_orders_paid(order_ids)
+            PaymentService.publish_payment_statuses(*order_ids)
+        
+        return repaired
+
+
+class PaymentExpiryService:
+    """Expires unpaid orders and returns their reserved stock"""
+    
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or getattr(settings, 'PAYMENT_EXPIRY_BATCH_SIZE', 500)
+    
+    def sweep(self) -> dict:
+        """Expire every overdue unpaid order, one transaction per batch"""
+        now = timezone.now()
+        expired = restocked = batches = 0
+        
+        while True:
+            orders, units = self._expire_batch(now)
+            if not orders:
+                break
+            expired += orders
+            restocked += units
+            batches += 1
+            if orders < self.batch_size:
+                break
+        
+        if expired:
+            logger.info(f"Expired {expired} unpaid orders in {batches} batches, returned {restocked} units to stock")
+        return {'expired': expired, 'restocked': restocked, 'batches': batches}
+    
+    def _overdue_orders(self, now):
+        """Unpaid orders past their payment window whose payment has not started arriving"""
+        from orders.models import Order, OrderStatus
+        
+        fallback_cutoff = now - timedelta(hours=getattr(settings, 'PAYMENT_EXPIRY_HOURS', 2))
+        # A payment already expired by reconciliation still leaves its order to cancel here
+        started_payment = PaymentAddress.objects.filter(
+            order_id=OuterRef('order_id'), status__in=['partial', 'paid', 'overpaid']
+        )
+        
+        return Order.objects.filter(
+            Q(payment_expires_at__lte=now) |
+            Q(payment_expires_at__isnull=True, created_at__lte=fallback_cutoff),
+            order_status=OrderStatus.PENDING_PAYMENT.value,
+            payment_status='pending'
+        ).exclude(Exists(started_payment))
+    
+    def _expire_batch(self, now) -> tuple:
+        """Expire one batch; returns (orders expired, units returned to stock)"""
+        from orders.models import Order, OrderStatus
+        from products.models import Product
+        
+        with transaction.atomic():
+            batch = list(
+                self._overdue_orders(now)
+                .select_for_update(skip_locked=True)
+                .order_by('payment_expires_at')
+                .values_list('id', 'order_id', 'product_id', 'quantity')[:self.batch_size]
+            )
+            if not batch:
+                return 0, 0
+            
+            ids = [order_pk for order_pk, _, _, _ in batch]
+            order_ids = [order_id for _, order_id, _, _ in batch]
+            
+            Order.objects.filter(id__in=ids).update(
+                order_status=OrderStatus.CANCELLED.value,
+                payment_status='expired',
+                updated_at=now
+            )
+            PaymentAddress.objects.filter(order_id__in=order_ids, status='pending').update(
+                status='expired', updated_at=now
+            )
+            EscrowPayment.objects.filter(
+                payment_address__order_id__in=order_ids, status='created'
+            ).update(status='cancelled', updated_at=now)
+            
+            # One increment per product, in a fixed order so concurrent sweeps can't deadlock
+            quantities = {}
+            for _, _, product_id, quantity in batch:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            for product_id, quantity in sorted(quantities.items()):
+                Product.objects.filter(id=product_id).update(
+                    quantity_available=F('quantity_available') + quantity,
+                    status=Case(When(status='reserved', then=Value('approved')), default=F('status')),
+                    updated_at=now
+                )
+            
+            PaymentService.publish_payment_statuses(*order_ids)
+        
+        return len(batch), sum(quantities.values())
+
+
+class PaymentAddressBackfillService:
+    """Generates missing payment addresses for orders after a provider outage.
+    
+    Orders are walked in (created_at, id) order. Provider calls for a batch run
+    on a bounded thread pool, order rows are written back with one bulk_update
+    per batch, and the position after each batch is kept in a checkpoint so an
+    interrupted run resumes where it stopped. A batch's Monero subaddresses are
+    created up front, up to MAX_SUBADDRESSES_PER_CALL per wallet call.
+    """
+    
+    CHECKPOINT_NAME = 'backfill:payment_addresses'
+    
+    def __init__(self, workers: int = 8, batch_size: int = 500, dry_run: bool = False):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self._local = threading.local()
+    
+    def run(self, restart: bool = False, limit: int = None, progress=None) -> dict:
+        """Backfill until no orders are left (or ``limit`` is reached); returns counters"""
+        stats = {'orders': 0, 'linked': 0, 'generated': 0, 'failed': 0, 'batches': 0}
+        position = None if restart else self._load_checkpoint()
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill') as pool:
+            while limit is None or stats['orders'] < limit:
+                size = self.batch_size if limit is None else min(self.batch_size, limit - stats['orders'])
+                orders = list(self._pending_orders(position)[:size])
+                if not orders:
+                    break
+                
+                self._backfill_batch(orders, pool, stats)
+                position = (orders[-1].created_at, orders[-1].id)
+                if not self.dry_run:
+                    self._save_checkpoint(position)
+                
+                stats['orders'] += len(orders)
+                stats['batches'] += 1
+                if progress:
+                    progress(stats)
+        
+        if not self.dry_run and limit is None:
+            # A full pass is done; the next run starts from the beginning again
+            ScannerCheckpoint.objects.filter(name=self.CHECKPOINT_NAME).update(cursor='', updated_at=timezone.now())
+        
+        logger.info(f"Payment address backfill{' (dry run)' if self.dry_run else ''}: {stats}")
+        return stats
+    
+    def _pending_orders(self, position=None):
+        from orders.models import Order
+        
+        orders = Order.objects.filter(payment_address='').only(
+            'id', 'order_id', 'crypto_currency', 'total_amount', 'created_at'
+        ).order_by('created_at', 'id')
+        if position:
+            created_at, order_pk = position
+            orders = orders.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=order_pk))
+        return orders
+    
+    def _backfill_batch(self, orders: list, pool: ThreadPoolExecutor, stats: dict):
+        from orders.models import Order
+        
+        # Orders whose payment row already has an address only need linking
+        existing = {
+            payment.order_id: payment
+            for payment in PaymentAddress.objects.filter(
+                order_id__in=[order.order_id for order in orders]
+            ).exclude(payment_address='').only('order_id', 'payment_address', 'expires_at')
+        }
+        missing = [order for order in orders if order.order_id not in existing]
+        
+        stats['linked'] += len(orders) - len(missing)
+        if self.dry_run:
+            stats['generated'] += len(missing)
+            return
+        
+        subaddresses = self._create_subaddresses(missing)
+        for order, payment in zip(missing, pool.map(self._generate, missing, subaddresses)):
+            if payment is None or not payment.payment_address:
+                stats['failed'] += 1
+            else:
+                existing[order.order_id] = payment
+                stats['generated'] += 1
+        
+        now = timezone.now()
+        updated = []
+        for order in orders:
+            payment = existing.get(order.order_id)
+            if payment:
+                order.payment_address = payment.payment_address
+                order.payment_expires_at = payment.expires_at
+                order.updated_at = now
+                updated.append(order)
+        Order.objects.bulk_update(updated, ['payment_address', 'payment_expires_at', 'updated_at'])
+    
+    def _generate(self, order, subaddress: dict = None):
+        """Provider call for one order, on a pool thread; None on failure"""
+        payment_service = getattr(self._local, 'payment_service', None)
+        if payment_service is None:
+            payment_service = self._local.payment_service = PaymentService()
+        
+        try:
+            return payment_service.create_payment_address(
+                order.order_id, order.crypto_currency, order.total_amount, subaddress=subaddress
+            )
+        except Exception as e:
+            logger.error(f"Backfill failed for order {order.order_id}: {str(e)}")
+            return None
+        finally:
+            # Pool threads are not request threads, so nothing else closes their connections
+            connections.close_all()
+    
+    def _create_subaddresses(self, orders: list) -> list:
+        """Monero subaddresses for the batch's XMR orders in batched RPC calls, aligned with ``orders``.
+        
+        Orders left without one (non-XMR, or the wallet stopped early) get None
+        and fall back to a live create_subaddress.
+        """
+        xmr_orders = [index for index, order in enumerate(orders) if order.crypto_currency == 'XMR']
+        subaddresses = [None] * len(orders)
+        if not xmr_orders:
+            return subaddresses
+        
+        created = MoneroRPCService().create_subaddresses(len(xmr_orders), label='Backfill')
+        for index, subaddress in zip(xmr_orders, created):
+            subaddresses[index] = subaddress
+        if len(created) < len(xmr_orders):
+            logger.warning(f"Backfill pre-created {len(created)} of {len(xmr_orders)} Monero subaddresses")
+        return subaddresses
+    
+    def _load_checkpoint(self):
+        cursor = ScannerCheckpoint.objects.filter(name=self.CHECKPOINT_NAME).values_list('cursor', flat=True).first()
+        if not cursor:
+            return None
+        created_at, order_pk = cursor.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(order_pk)
+    
+    def _save_checkpoint(self, position):
+        created_at, order_pk = position
+        ScannerCheckpoint.objects.update_or_create(
+            name=self.CHECKPOINT_NAME,
+            defaults={'cursor': f"{created_at.isoformat()}|{order_pk}"}
+        )
+
+
+class PaymentStatsService:
+    """Maintains the payment_daily_stats rollup behind the analytics time series"""
+    
+    GRANULARITIES = ('day', 'week', 'month')
+    
+    def refresh(self) -> int:
+        """Recompute the rollup for every day touched since the last refresh"""
+        lock_key = 'payment-daily-stats-refresh'
+        if not cache.add(lock_key, 1, timeout=300):
+            return 0
+        
+        try:
+            started = timezone.now()
+            last_refresh = PaymentDailyStats.objects.aggregate(last=Max('refreshed_at'))['last']
+            
+            if last_refresh is None:
+                return self._rebuild_days(None, started)
+            
+            # Step back so rows committed late with an older updated_at are not missed
+            lag = timedelta(seconds=getattr(settings, 'PAYMENT_STATS_REFRESH_LAG', 300))
+            days = sorted(
+                PaymentAddress.objects.filter(updated_at__gte=last_refresh - lag)
+                .annotate(day=TruncDate('created_at'))
+                .values_list('day', flat=True).distinct().order_by()
+            )
+            if not days:
+                return 0
+            
+            return self._rebuild_days(days, started)
+            
+        finally:
+            cache.delete(lock_key)
+    
+    def _rebuild_days(self, days, refreshed_at) -> int:
+        """Replace the rollup rows for the given days (all days when None) with one grouped query"""
+        payments = PaymentAddress.objects.all()
+        stale = PaymentDailyStats.objects.all()
+        if days is not None:
+            in_days = Q()
+            for day in days:
+                start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+                in_days |= Q(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+            payments = payments.filter(in_days)
+            stale = stale.filter(date__in=days)
+        
+        groups = payments.annotate(day=TruncDate('created_at')).values(
+            'day', 'crypto_currency_id', 'status'
+        ).annotate(
+            payment_count=Count('id'),
+            expected_volume=Sum('expected_amount'),
+            received_volume=Sum('received_amount')
+        ).order_by()
+        
+        rows = [
+            PaymentDailyStats(
+                date=group['day'],
+                crypto_currency_id=group['crypto_currency_id'],
+                status=group['status'],
+                payment_count=group['payment_count'],
+                expected_volume=group['expected_volume'] or 0,
+                received_volume=group['received_volume'] or 0,
+                refreshed_at=refreshed_at
+            )
+            for group in groups
+        ]
+        
+        with transaction.atomic():
+            stale.delete()
+            PaymentDailyStats.objects.bulk_create(rows, batch_size=1000)
+        
+        logger.info(f"Rebuilt payment daily stats: {len(rows)} rows")
+        return len(rows)
+    
+    def get_summary(self) -> dict:
+        """Live all-time payment totals in one conditional aggregate"""
+        totals = PaymentAddress.objects.aggregate(
+            total=Count('id'),
+            successful=Count('id', filter=Q(status='paid')),
+            pending=Count('id', filter=Q(status='pending'))
+        )
+        total = totals['total']
+        totals['success_rate'] = round(totals['successful'] / total * 100, 2) if total > 0 else 0
+        return totals
+    
+    def get_series(self, date_from, date_to, granularity: str = 'day') -> list:
+        """Payment counts and volumes per period, currency and status"""
+        rows = PaymentDailyStats.objects.filter(
+            date__gte=date_from, date__lte=date_to
+        ).annotate(
+            period=Trunc('date', granularity)
+        ).values(
+            'period', 'crypto_currency__symbol', 'status'
+        ).annotate(
+            count=Sum('payment_count'),
+            expected_volume=Sum('expected_volume'),
+            received_volume=Sum('received_volume')
+        ).order_by('period', 'crypto_currency__symbol', 'status')
+        
+        return [
+            {
+                'period': row['period'].isoformat(),
+                'currency': row['crypto_currency__symbol'],
+                'status': row['status'],
+                'count': row['count'],
+                'expected_volume': str(row['expected_volume']),
+                'received_volume': str(row['received_volume'])
+            }
+            for row in rows
+        ]
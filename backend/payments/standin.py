@@ -0,0 +1,419 @@
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from django.conf import settings
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+ATOMIC_UNITS = 10 ** 12
+
+INVOICES_PATH = re.compile(r'^/api/v1/stores/(?P<store_id>[^/]+)/invoices/?$')
+INVOICE_PATH = re.compile(r'^/api/v1/stores/(?P<store_id>[^/]+)/invoices/(?P<invoice_id>[^/]+)/?$')
+PAYMENT_METHODS_PATH = re.compile(r'^/api/v1/stores/(?P<store_id>[^/]+)/invoices/(?P<invoice_id>[^/]+)/payment-methods/?$')
+
+
+class StandInState:
+    """In-memory BTCPay store and Monero wallet behind the stand-in server.
+    
+    Everything random is drawn from one seeded generator so a load test can
+    be replayed. Invoice addresses only appear after ``address_delay`` to
+    mimic BTCPay generating them asynchronously. Monero transfers wait in the
+    mempool (``pool``) until the next simulated block, which arrives every
+    ``block_interval`` seconds or on ``mine_block()``.
+    """
+    
+    def __init__(self, seed: int = 0, address_delay: float = 0.0, block_interval: float = 120.0,
+                 xmr_amount: Decimal = Decimal('1000')):
+        self.rng = random.Random(seed)
+        self.address_delay = address_delay
+        self.block_interval = block_interval
+        self.xmr_amount = xmr_amount
+        self.started = time.monotonic()
+        self.mined_blocks = 0
+        self.invoices = {}
+        self.subaddresses = [{'address': self._xmr_address(), 'address_index': 0, 'label': 'Primary account'}]
+        self.pool = []
+        self.transfers = []
+        self.lock = threading.Lock()
+    
+    def _btc_address(self) -> str:
+        return f"tb1q{self.rng.getrandbits(160):040x}"
+    
+    def _xmr_address(self) -> str:
+        return f"8{self.rng.getrandbits(376):094x}"
+    
+    @property
+    def height(self) -> int:
+        """Simulated chain tip, advancing one block per block_interval"""
+        return 1000 + int((time.monotonic() - self.started) / self.block_interval) + self.mined_blocks
+    
+    def mine_block(self) -> int:
+        """Add a block now, confirming the mempool; returns the new tip"""
+        with self.lock:
+            self.mined_blocks += 1
+            self._confirm_pool()
+            return self.height
+    
+    def _confirm_pool(self):
+        """Move mempool transfers into the first block after they were sent (caller holds the lock)"""
+        tip = self.height
+        waiting = []
+        for transfer in self.pool:
+            if tip > transfer['_sent_tip']:
+                self.transfers.append(dict(
+                    self._public(transfer), height=transfer['_sent_tip'] + 1, type='in'
+                ))
+            else:
+                waiting.append(transfer)
+        self.pool = waiting
+    
+    # BTCPay Greenfield API
+    
+    def create_invoice(self, store_id: str, body: dict) -> dict:
+        with self.lock:
+            invoice_id = f"SI{uuid.UUID(int=self.rng.getrandbits(128)).hex[:20].upper()}"
+            invoice = {
+                'id': invoice_id,
+                'storeId': store_id,
+                'amount': body.get('amount'),
+                'currency': body.get('currency', 'BTC'),
+                'type': 'Standard',
+                'checkoutLink': f"http://standin/i/{invoice_id}",
+                'status': 'New',
+                'additionalStatus': 'None',
+                'createdTime': int(time.time()),
+                'expirationTime': int(time.time()) + 3600,
+                'metadata': dict(body.get('metadata') or {}, orderId=body.get('orderId') or (body.get('metadata') or {}).get('orderId')),
+                '_created': time.monotonic(),
+                '_address': self._btc_address(),
+            }
+            self.invoices[invoice_id] = invoice
+        return self._public(invoice)
+    
+    def get_invoice(self, invoice_id: str) -> dict:
+        invoice = self.invoices.get(invoice_id)
+        return self._public(invoice) if invoice else None
+    
+    def list_invoices(self, store_id: str, statuses: list = None, start: int = None, end: int = None,
+                      skip: int = 0, take: int = None) -> list:
+        """Invoices newest first, filtered like GET /stores/{storeId}/invoices"""
+        with self.lock:
+            invoices = [
+                invoice for invoice in self.invoices.values()
+                if invoice['storeId'] == store_id
+                and (not statuses or invoice['status'] in statuses)
+                and (start is None or invoice['createdTime'] >= start)
+                and (end is None or invoice['createdTime'] <= end)
+            ]
+        invoices.reverse()
+        page = invoices[skip:skip + take] if take is not None else invoices[skip:]
+        return [self._public(invoice) for invoice in page]
+    
+    def get_payment_methods(self, invoice_id: str) -> list:
+        invoice = self.invoices.get(invoice_id)
+        if invoice is None:
+            return None
+        
+        ready = time.monotonic() - invoice['_created'] >= self.address_delay
+        return [{
+            'paymentMethodId': 'BTC-CHAIN',
+            'cryptoCode': 'BTC',
+            'destination': invoice['_address'] if ready else '',
+            'amount': invoice['amount'],
+            'paymentLink': f"bitcoin:{invoice['_address']}" if ready else '',
+            'activated': ready,
+        }]
+    
+    def pay_next_invoice(self):
+        """Settle the oldest open invoice; returns it with the payment made, or None"""
+        with self.lock:
+            invoice = next((invoice for invoice in self.invoices.values() if invoice['status'] == 'New'), None)
+            if invoice is None:
+                return None
+            invoice['status'] = 'Settled'
+        return self._settled(invoice)
+    
+    def pay_invoice(self, invoice_id: str):
+        """Settle one open invoice by id; returns it with the payment made, or None"""
+        with self.lock:
+            invoice = self.invoices.get(invoice_id)
+            if invoice is None or invoice['status'] != 'New':
+                return None
+            invoice['status'] = 'Settled'
+        return self._settled(invoice)
+    
+    def _settled(self, invoice: dict):
+        payment = {
+            'id': f"{self.rng.getrandbits(256):064x}-0",
+            'receivedDate': int(time.time()),
+            'value': str(invoice['amount']),
+            'fee': '0',
+            'status': 'Settled',
+            'destination': invoice['_address'],
+        }
+        return self._public(invoice), payment
+    
+    @staticmethod
+    def _public(record: dict) -> dict:
+        return {key: value for key, value in record.items() if not key.startswith('_')}
+    
+    # monero-wallet-rpc JSON-RPC
+    
+    def rpc(self, method: str, params: dict):
+        handler = getattr(self, f"rpc_{method}", None)
+        if handler is None:
+            return None
+        return handler(params or {})
+    
+    def rpc_create_address(self, params: dict) -> dict:
+        count = params.get('count', 1)
+        if count > 64:
+            raise ValueError("count must be at most 64")
+        
+        with self.lock:
+            created = []
+            for _ in range(count):
+                subaddress = {
+                    'address': self._xmr_address(),
+                    'address_index': len(self.subaddresses),
+                    'label': params.get('label', ''),
+                }
+                self.subaddresses.append(subaddress)
+                created.append(subaddress)
+        
+        return {
+            'address': created[0]['address'],
+            'address_index': created[0]['address_index'],
+            'addresses': [subaddress['address'] for subaddress in created],
+            'address_indices': [subaddress['address_index'] for subaddress in created],
+        }
+    
+    def rpc_get_height(self, params: dict) -> dict:
+        return {'height': self.height + 1}
+    
+    def rpc_get_balance(self, params: dict) -> dict:
+        with self.lock:
+            self._confirm_pool()
+            tip = self.height
+            balance = sum(transfer['amount'] for transfer in self.transfers)
+            unlocked = sum(transfer['amount'] for transfer in self.transfers if tip - transfer['height'] + 1 >= 10)
+        return {'balance': balance, 'unlocked_balance': unlocked, 'multisig_import_needed': False}
+    
+    def rpc_get_transfers(self, params: dict) -> dict:
+        indices = set(params.get('subaddr_indices') or [])
+        min_height = params.get('min_height', 0) if params.get('filter_by_height') else -1
+        wanted = lambda transfer: not indices or transfer['subaddr_index']['minor'] in indices
+        
+        with self.lock:
+            self._confirm_pool()
+            tip = self.height
+            incoming = [
+                dict(transfer, confirmations=tip - transfer['height'] + 1)
+                for transfer in self.transfers
+                if wanted(transfer) and transfer['height'] > min_height
+            ]
+            # Like the wallet, mempool transfers ignore the height filter
+            pool = [dict(self._public(transfer), confirmations=0) for transfer in self.pool if wanted(transfer)]
+        
+        result = {}
+        if params.get('in', True) and incoming:
+            result['in'] = incoming
+        if params.get('pool') and pool:
+            result['pool'] = pool
+        return result
+    
+    def rpc_get_payments(self, params: dict) -> dict:
+        payment_id = params.get('payment_id')
+        with self.lock:
+            self._confirm_pool()
+        return {'payments': [
+            {
+                'payment_id': payment_id,
+                'tx_hash': transfer['txid'],
+                'amount': transfer['amount'],
+                'block_height': transfer['height'],
+                'subaddr_index': transfer['subaddr_index'],
+                'address': transfer['address'],
+            }
+            for transfer in self.transfers if transfer.get('payment_id') == payment_id
+        ]}
+    
+    def pay_next_subaddress(self):
+        """Send xmr_amount to the oldest unpaid subaddress; returns the mempool transfer, or None"""
+        with self.lock:
+            self._confirm_pool()
+            paid = {transfer['subaddr_index']['minor'] for transfer in self.transfers + self.pool}
+            subaddress = next(
+                (subaddress for subaddress in self.subaddresses[1:] if subaddress['address_index'] not in paid),
+                None
+            )
+            if subaddress is None:
+                return None
+            
+            transfer = {
+                'txid': f"{self.rng.getrandbits(256):064x}",
+                'amount': int(self.xmr_amount * ATOMIC_UNITS),
+                'fee': 30000000,
+                'height': 0,
+                'timestamp': int(time.time()),
+                'type': 'pool',
+                'address': subaddress['address'],
+                'subaddr_index': {'major': 0, 'minor': subaddress['address_index']},
+                'payment_id': '0000000000000000',
+                '_sent_tip': self.height,
+            }
+            self.pool.append(transfer)
+        return self._public(transfer)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes BTCPay Greenfield and monero-wallet-rpc requests to StandInState"""
+    
+    server_version = 'PaymentStandIn/1.0'
+    
+    @property
+    def state(self) -> StandInState:
+        return self.server.state
+    
+    def log_message(self, format, *args):
+        logger.debug(f"Stand-in {self.address_string()} {format % args}")
+    
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+    
+    def _send_json(self, data, status: int = 200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        
+        match = INVOICES_PATH.match(path)
+        if match:
+            params = parse_qs(query)
+            number = lambda name: int(params[name][0]) if name in params else None
+            return self._send_json(self.state.list_invoices(
+                match['store_id'], params.get('status'), number('startDate'), number('endDate'),
+                number('skip') or 0, number('take')
+            ))
+        
+        match = PAYMENT_METHODS_PATH.match(path)
+        if match:
+            methods = self.state.get_payment_methods(match['invoice_id'])
+            return self._send_json(methods, 200) if methods is not None else self._send_json({'code': 'invoice-not-found'}, 404)
+        
+        match = INVOICE_PATH.match(path)
+        if match:
+            invoice = self.state.get_invoice(match['invoice_id'])
+            return self._send_json(invoice, 200) if invoice else self._send_json({'code': 'invoice-not-found'}, 404)
+        
+        self._send_json({'code': 'not-found'}, 404)
+    
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            body = self._read_json()
+        except ValueError:
+            return self._send_json({'code': 'invalid-json'}, 400)
+        
+        match = INVOICES_PATH.match(path)
+        if match:
+            return self._send_json(self.state.create_invoice(match['store_id'], body))
+        
+        if path == '/json_rpc':
+            try:
+                result = self.state.rpc(body.get('method'), body.get('params'))
+            except ValueError as e:
+                return self._send_json({'jsonrpc': '2.0', 'id': body.get('id'), 'error': {'code': -1, 'message': str(e)}})
+            if result is None:
+                return self._send_json({'jsonrpc': '2.0', 'id': body.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}})
+            return self._send_json({'jsonrpc': '2.0', 'id': body.get('id'), 'result': result})
+        
+        self._send_json({'code': 'not-found'}, 404)
+
+
+class WebhookFirer(threading.Thread):
+    """Pays open invoices and subaddresses at a fixed rate.
+    
+    Each BTC payment is delivered to ``webhook_url`` as signed
+    InvoiceReceivedPayment and InvoiceSettled webhooks, the way BTCPay would.
+    Monero payments only show up in get_transfers, where the scanner finds them.
+    """
+    
+    def __init__(self, state: StandInState, webhook_url: str, rate: float, secret: str = None):
+        super().__init__(name='standin-webhooks', daemon=True)
+        self.state = state
+        self.webhook_url = webhook_url
+        self.interval = 1.0 / rate
+        self.secret = secret if secret is not None else getattr(settings, 'BTCPAY_WEBHOOK_SECRET', '')
+        self.session = requests.Session()
+        self.stopped = threading.Event()
+        self.stats = {'sent': 0, 'failed': 0, 'xmr_transfers': 0}
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            paid = self.state.pay_next_invoice()
+            if paid:
+                invoice, payment = paid
+                self.send('InvoiceReceivedPayment', invoice, payment=payment)
+                self.send('InvoiceSettled', invoice)
+            if self.state.pay_next_subaddress():
+                self.stats['xmr_transfers'] += 1
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def send(self, webhook_type: str, invoice: dict, **extra) -> bool:
+        body, headers = build_webhook(self.secret, webhook_type, invoice, **extra)
+        
+        try:
+            response = self.session.post(self.webhook_url, data=body, headers=headers, timeout=10)
+            ok = response.status_code == 200
+        except requests.RequestException as e:
+            logger.warning(f"Stand-in webhook to {self.webhook_url} failed: {str(e)}")
+            ok = False
+        
+        self.stats['sent' if ok else 'failed'] += 1
+        return ok
+
+
+def build_webhook(secret: str, webhook_type: str, invoice: dict, **extra):
+    """Signed BTCPay webhook body and headers for an invoice event"""
+    payload = {
+        'deliveryId': uuid.uuid4().hex,
+        'webhookId': 'standin',
+        'originalDeliveryId': None,
+        'isRedelivery': False,
+        'type': webhook_type,
+        'timestamp': int(time.time()),
+        'storeId': invoice['storeId'],
+        'invoiceId': invoice['id'],
+        'metadata': invoice['metadata'],
+        **extra
+    }
+    body = json.dumps(payload).encode('utf-8')
+    signature = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return body, {'Content-Type': 'application/json', 'BTCPay-Sig': f"sha256={signature}"}
+
+
+def create_server(host: str = '127.0.0.1', port: int = 0, state: StandInState = None) -> ThreadingHTTPServer:
+    """Bind the stand-in server (port 0 picks a free port) without starting it"""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.state = state or StandInState()
+    return server
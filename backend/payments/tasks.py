@@ -0,0 +1,151 @@
+from celery import shared_task
+from celery.exceptions import MaxRetriesExceededError
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+import logging
+
+from .models import PaymentAddress
+from .rates import exchange_rates
+from .services import PaymentService, AddressPoolService, BTCPayReconciliationService, MoneroTransferScanner, ConfirmationTracker, WebhookQueueService, EscrowService, PaymentExpiryService, PaymentStatsService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=getattr(settings, 'BTCPAY_ADDRESS_RESOLVE_RETRIES', 8))
+def resolve_btcpay_address(self, payment_address_id: str) -> bool:
+    """Resolve a pending BTCPay deposit address, retrying with backoff"""
+    try:
+        payment_address = PaymentAddress.objects.get(id=payment_address_id)
+    except PaymentAddress.DoesNotExist:
+        logger.warning(f"PaymentAddress {payment_address_id} not found for address resolution")
+        return False
+    
+    payment_service = PaymentService()
+    if payment_service.resolve_btcpay_address(payment_address):
+        return True
+    
+    try:
+        # 1s, 2s, 4s, ... capped at one minute
+        raise self.retry(countdown=min(2 ** self.request.retries, 60))
+    except MaxRetriesExceededError:
+        payment_service.mark_address_failed(payment_address)
+        return False
+
+
+@shared_task
+def resolve_pending_btcpay_addresses() -> int:
+    """Sweep pending BTCPay addresses whose resolution task was lost"""
+    payment_service = PaymentService()
+    resolved = 0
+    
+    pending = PaymentAddress.objects.filter(
+        address_status='pending',
+        expires_at__gt=timezone.now()
+    ).exclude(btcpay_invoice_id__isnull=True).exclude(btcpay_invoice_id='')
+    
+    for payment_address in pending.iterator():
+        if payment_service.resolve_btcpay_address(payment_address):
+            resolved += 1
+    
+    if resolved:
+        logger.info(f"Resolved {resolved} pending BTCPay addresses")
+    return resolved
+
+
+@shared_task(bind=True, max_retries=getattr(settings, 'PAYMENT_PROVISIONING_RETRIES', 6))
+def provision_payment_address(self, order_id: str) -> bool:
+    """Create the payment address for a newly placed order, retrying provider errors"""
+    payment_service = PaymentService()
+    try:
+        return payment_service.provision_order_address(order_id)
+    except Exception as e:
+        logger.warning(f"Payment address provisioning for order {order_id} failed: {str(e)}")
+        try:
+            # 1s, 2s, 4s, ... capped at one minute
+            raise self.retry(countdown=min(2 ** self.request.retries, 60))
+        except MaxRetriesExceededError:
+            payment_service.mark_provisioning_failed(order_id)
+            return False
+
+
+@shared_task
+def requeue_stalled_provisioning() -> int:
+    """Re-enqueue provisioning for orders whose task was lost"""
+    from orders.models import Order, OrderStatus, PaymentProvisioning
+    
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'PAYMENT_PROVISIONING_STALE_AFTER', 120))
+    order_ids = list(
+        Order.objects.filter(
+            payment_provisioning__in=[PaymentProvisioning.QUEUED.value, PaymentProvisioning.PROVISIONING.value],
+            updated_at__lt=stale_before
+        ).values_list('order_id', flat=True)[:500]
+    )
+    for order_id in order_ids:
+        provision_payment_address.delay(order_id)
+    
+    if order_ids:
+        logger.info(f"Re-enqueued payment provisioning for {len(order_ids)} orders")
+    return len(order_ids)
+
+
+@shared_task
+def refill_address_pools() -> dict:
+    """Refill every configured address pool that is below its low-water mark"""
+    pool_service = AddressPoolService()
+    return {
+        crypto_currency: pool_service.refill(crypto_currency)
+        for crypto_currency in getattr(settings, 'ADDRESS_POOL', {})
+    }
+
+
+@shared_task
+def scan_monero_transfers() -> dict:
+    """Match new Monero transfers to every open order in one wallet RPC call"""
+    return MoneroTransferScanner().scan()
+
+
+@shared_task
+def drain_webhook_queue() -> dict:
+    """Process queued webhook events in batches"""
+    return WebhookQueueService().drain()
+
+
+@shared_task
+def auto_release_escrows() -> dict:
+    """Release escrows whose auto-release date has passed"""
+    return EscrowService().auto_release_escrows()
+
+
+@shared_task
+def expire_unpaid_orders() -> dict:
+    """Expire overdue unpaid orders and return their reserved stock"""
+    return PaymentExpiryService().sweep()
+
+
+@shared_task
+def refresh_payment_daily_stats() -> int:
+    """Fold recent payment changes into the daily stats rollup"""
+    return PaymentStatsService().refresh()
+
+
+@shared_task
+def refresh_exchange_rates() -> dict:
+    """Pull current prices from the configured rate provider"""
+    return exchange_rates.refresh().to_dict()
+
+
+@shared_task
+def track_confirmations(crypto_currency: str = None, tip: int = None) -> dict:
+    """Apply a new chain tip reported by block-notify, or poll the Monero wallet for one"""
+    tracker = ConfirmationTracker()
+    if crypto_currency and tip is not None:
+        return tracker.on_new_tip(crypto_currency, tip)
+    return tracker.poll()
+
+
+@shared_task
+def reconcile_btcpay_invoices(hours: int = None) -> dict:
+    """Repair payments whose BTCPay webhooks were missed in the last ``hours``"""
+    start = timezone.now() - timedelta(hours=hours) if hours else None
+    return BTCPayReconciliationService().reconcile(start=start)
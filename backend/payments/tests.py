@@ -0,0 +1,1122 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+from unittest import mock
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from shared.models import CryptoCurrency
+from orders.models import Order
+from orders.views import OrderViewSet
+from products.models import Product, ProductCategory
+from .models import PaymentAddress, PaymentWebhook, PooledAddress, BlockchainTransaction, ScannerCheckpoint, WebhookEvent, EscrowPayment
+from .services import AddressPoolService, BTCPayServerService, BTCPayReconciliationService, MoneroRPCService, MoneroTransferScanner, ConfirmationTracker, WebhookQueueService, PaymentService, EscrowService, PaymentExpiryService, PaymentStatsService, PaymentAddressBackfillService
+from .cache import TTLCache, processed_deliveries
+from .events import payment_events, stream_payment_status, astream_payment_status
+from .rates import ExchangeRateProvider, ExchangeRateService, FixtureRateProvider, RateSnapshot
+from .views import PaymentAnalyticsView, AdminEscrowView
+from .mock_services import FaultProfile, MockBTCPayService
+from .standin import StandInState, WebhookFirer, create_server
+from .tasks import provision_payment_address
+from .benchmark import CheckoutBenchmark, compare_results, percentile
+
+
+def create_crypto(symbol='XMR'):
+    return CryptoCurrency.objects.create(
+        name=symbol,
+        symbol=symbol,
+        current_price=Decimal('150'),
+        market_cap=Decimal('0'),
+        volume_24h=Decimal('0'),
+        price_change_24h=Decimal('0')
+    )
+
+
+def create_payment_address(crypto, order_id, **kwargs):
+    defaults = {
+        'payment_address': f'addr-{order_id}',
+        'expected_amount': Decimal('1.0'),
+        'expires_at': timezone.now() + timedelta(hours=2),
+        'required_confirmations': 1,
+    }
+    defaults.update(kwargs)
+    return PaymentAddress.objects.create(crypto_currency=crypto, order_id=order_id, **defaults)
+
+
+@override_settings(ADDRESS_POOL_ENABLED=True, ADDRESS_POOL={'XMR': {'low_water': 2, 'target': 4}, 'BTC': {'low_water': 2, 'target': 4}})
+class AddressPoolTest(TestCase):
+    """Test claiming and refilling the pre-generated subaddress pool"""
+    
+    def setUp(self):
+        cache.clear()
+        self.xmr = create_crypto('XMR')
+        self.monero = mock.Mock()
+        self.monero.create_subaddresses.side_effect = lambda count, **kwargs: [
+            {'address': f'sub-{index}', 'address_index': index} for index in range(10, 10 + count)
+        ]
+        self.pool = AddressPoolService(btcpay=mock.Mock(), monero=self.monero)
+    
+    def pool_address(self, address, index):
+        return PooledAddress.objects.create(crypto_currency=self.xmr, payment_address=address, monero_subaddress_index=index)
+    
+    def test_claim_takes_each_address_once(self):
+        """Test claims hand out the oldest available address and None once the pool is empty"""
+        first = self.pool_address('sub-1', 1)
+        self.pool_address('sub-2', 2)
+        
+        claimed = self.pool.claim('XMR', 'ORD-1')
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual((claimed.status, claimed.order_id), ('claimed', 'ORD-1'))
+        self.assertEqual(self.pool.claim('XMR', 'ORD-2').payment_address, 'sub-2')
+        self.assertIsNone(self.pool.claim('XMR', 'ORD-3'))
+    
+    def test_refill_tops_up_below_low_water(self):
+        """Test a refill stocks up to the target in one batched wallet call, and only below the low-water mark"""
+        self.pool_address('sub-1', 1)
+        
+        self.assertEqual(self.pool.refill('XMR'), 3)
+        self.monero.create_subaddresses.assert_called_once_with(3, label='Pool')
+        self.assertEqual(self.pool.get_depth('XMR'), 4)
+        self.assertEqual(self.pool.refill('XMR'), 0)
+    
+    def test_btc_is_never_pooled(self):
+        """Test BTCPay invoices are not pre-generated even when BTC is configured"""
+        create_crypto('BTC')
+        
+        self.assertFalse(self.pool.is_enabled('BTC'))
+        self.assertEqual(self.pool.stock('BTC', 5), 0)
+        self.assertIsNone(self.pool.claim('BTC', 'ORD-1'))
+        self.pool.btcpay.create_invoice.assert_not_called()
+    
+    def test_empty_pool_falls_back_to_live_subaddress(self):
+        """Test order creation uses a pooled subaddress and asks the wallet only when the pool is empty"""
+        service = PaymentService()
+        service.monero = service.address_pool.monero = self.monero
+        self.monero.create_subaddress.return_value = {'address': 'live-1', 'address_index': 50}
+        self.pool_address('sub-1', 1)
+        
+        pooled = service.create_payment_address('ORD-1', 'XMR', Decimal('1.0'))
+        live = service.create_payment_address('ORD-2', 'XMR', Decimal('1.0'))
+        
+        self.assertEqual((pooled.payment_address, pooled.monero_subaddress_index), ('sub-1', 1))
+        self.assertEqual((live.payment_address, live.monero_subaddress_index), ('live-1', 50))
+        self.monero.create_subaddress.assert_called_once()
+
+
+class MoneroRPCServiceTest(TestCase):
+    """Test batched subaddress creation against a mocked wallet RPC"""
+    
+    def setUp(self):
+        self.next_index = 1
+        self.fail_on_call = None
+        self.calls = []
+    
+    def fake_post(self, url, json=None, **kwargs):
+        self.calls.append(json)
+        if len(self.calls) == self.fail_on_call:
+            return mock.Mock(status_code=500, text='wallet busy')
+        
+        count = json['params']['count']
+        indices = list(range(self.next_index, self.next_index + count))
+        self.next_index += count
+        return mock.Mock(status_code=200, json=lambda: {'result': {
+            'address': f'sub-{indices[0]}', 'address_index': indices[0],
+            'addresses': [f'sub-{index}' for index in indices], 'address_indices': indices
+        }})
+    
+    def test_create_subaddresses_splits_calls_at_the_wallet_cap(self):
+        """Test a large count is split into calls of at most 64 and results keep their order"""
+        with mock.patch('payments.services.requests.post', side_effect=self.fake_post):
+            subaddresses = MoneroRPCService().create_subaddresses(150, account_index=2, label='Pool')
+        
+        self.assertEqual([call['params']['count'] for call in self.calls], [64, 64, 22])
+        self.assertTrue(all(call['method'] == 'create_address' for call in self.calls))
+        self.assertTrue(all(call['params']['count'] <= MoneroRPCService.MAX_SUBADDRESSES_PER_CALL for call in self.calls))
+        self.assertEqual({(call['params']['account_index'], call['params']['label']) for call in self.calls}, {(2, 'Pool')})
+        self.assertEqual([s['address_index'] for s in subaddresses], list(range(1, 151)))
+        self.assertEqual([s['address'] for s in subaddresses], [f'sub-{index}' for index in range(1, 151)])
+    
+    def test_create_subaddresses_keeps_batches_before_a_failure(self):
+        """Test an RPC failure stops the run and returns the addresses already created"""
+        self.fail_on_call = 2
+        with mock.patch('payments.services.requests.post', side_effect=self.fake_post):
+            subaddresses = MoneroRPCService().create_subaddresses(150)
+        
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual([s['address_index'] for s in subaddresses], list(range(1, 65)))
+
+
+class MoneroTransferScannerTest(TestCase):
+    """Test matching wallet transfers to open payments"""
+    
+    def setUp(self):
+        self.xmr = create_crypto('XMR')
+        self.paid = create_payment_address(self.xmr, 'ORD-PAID', monero_subaddress_index=1)
+        self.partial = create_payment_address(self.xmr, 'ORD-PART', monero_subaddress_index=2)
+        self.monero = mock.Mock()
+    
+    def transfer(self, txid, index, amount, height=100, confirmations=3):
+        return {
+            'txid': txid,
+            'subaddr_index': {'major': 0, 'minor': index},
+            'amount': int(amount * 10 ** 12),
+            'height': height,
+            'confirmations': confirmations,
+        }
+    
+    def test_scan_matches_all_open_payments_in_one_call(self):
+        """Test one get_transfers call updates every matching payment"""
+        self.monero.get_transfers.return_value = {
+            'in': [
+                self.transfer('tx1', 1, Decimal('1.0')),
+                self.transfer('tx2', 2, Decimal('0.4')),
+                self.transfer('tx3', 99, Decimal('5.0')),
+            ]
+        }
+        
+        stats = MoneroTransferScanner(self.monero).scan()
+        
+        self.monero.get_transfers.assert_called_once()
+        self.assertEqual(self.monero.get_transfers.call_args.kwargs['subaddr_indices'], [1, 2])
+        self.assertEqual(stats['transfers'], 2)
+        self.assertEqual(stats['paid'], 1)
+        
+        self.paid.refresh_from_db()
+        self.partial.refresh_from_db()
+        self.assertEqual(self.paid.status, 'paid')
+        self.assertEqual(self.paid.received_amount, Decimal('1.0'))
+        self.assertEqual(self.partial.status, 'partial')
+        self.assertEqual(BlockchainTransaction.objects.count(), 2)
+    
+    def test_unconfirmed_transfer_holds_checkpoint(self):
+        """Test the checkpoint stays at the lowest unconfirmed transfer"""
+        self.paid.required_confirmations = 10
+        self.paid.save()
+        self.monero.get_transfers.return_value = {
+            'in': [self.transfer('tx1', 1, Decimal('1.0'), height=500, confirmations=2)]
+        }
+        
+        MoneroTransferScanner(self.monero).scan()
+        
+        self.paid.refresh_from_db()
+        self.assertEqual(self.paid.status, 'pending')
+        self.assertEqual(self.paid.confirmations, 2)
+        self.assertEqual(ScannerCheckpoint.objects.get(name='monero-transfers').height, 500)
+
+
+class WebhookQueueServiceTest(TestCase):
+    """Test durable webhook queue draining"""
+    
+    def setUp(self):
+        self.payment_service = mock.Mock()
+        self.queue = WebhookQueueService(self.payment_service)
+    
+    def test_failed_event_blocks_later_events_for_same_invoice(self):
+        """Test per-invoice ordering survives a retry"""
+        first = self.queue.enqueue('btcpay', {'invoiceId': 'INV1', 'type': 'InvoiceReceivedPayment'})
+        second = self.queue.enqueue('btcpay', {'invoiceId': 'INV1', 'type': 'InvoiceSettled'})
+        other = self.queue.enqueue('btcpay', {'invoiceId': 'INV2', 'type': 'InvoiceSettled'})
+        self.payment_service.process_payment_webhook.side_effect = [False, True]
+        
+        stats = self.queue.drain()
+        
+        self.assertEqual(stats, {'done': 1, 'retried': 1, 'failed': 0})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.status, 'queued')
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        self.assertEqual(second.status, 'queued')
+        self.assertEqual(second.attempts, 0)
+        self.assertEqual(other.status, 'done')
+        
+        # Once the retry is due, both events go through in order
+        WebhookEvent.objects.filter(id=first.id).update(next_attempt_at=timezone.now())
+        self.payment_service.process_payment_webhook.side_effect = None
+        self.payment_service.process_payment_webhook.return_value = True
+        
+        self.queue.drain()
+        
+        processed = [call.args[1]['type'] for call in self.payment_service.process_payment_webhook.call_args_list[2:]]
+        self.assertEqual(processed, ['InvoiceReceivedPayment', 'InvoiceSettled'])
+        self.assertFalse(WebhookEvent.objects.exclude(status='done').exists())
+
+
+class WebhookDeduplicationTest(TestCase):
+    """Test BTCPay redelivery handling"""
+    
+    def setUp(self):
+        processed_deliveries.clear()
+        self.btc = create_crypto('BTC')
+        self.payment_address = create_payment_address(self.btc, 'ORD-BTC', btcpay_invoice_id='INV1')
+        self.payload = {
+            'deliveryId': 'DEL1',
+            'invoiceId': 'INV1',
+            'metadata': {'orderId': 'ORD-BTC'},
+            'type': 'InvoiceSettled',
+        }
+    
+    def test_redelivery_is_stored_once(self):
+        """Test the unique constraint and delivery cache reject duplicates"""
+        payment_service = PaymentService()
+        
+        self.assertTrue(payment_service.process_payment_webhook('btcpay', self.payload))
+        self.assertIn(('btcpay', 'DEL1'), processed_deliveries)
+        
+        # Hot redelivery is answered from the cache
+        with self.assertNumQueries(0):
+            self.assertTrue(payment_service.process_payment_webhook('btcpay', self.payload))
+        
+        # After the cache is gone the database constraint still deduplicates
+        processed_deliveries.clear()
+        self.assertTrue(payment_service.process_payment_webhook('btcpay', self.payload))
+        self.assertEqual(PaymentWebhook.objects.filter(delivery_id='DEL1').count(), 1)
+    
+    def test_ttl_cache_evicts_least_recently_used(self):
+        """Test the LRU bound"""
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.add('a')
+        cache.add('b')
+        cache.get('a')
+        cache.add('c')
+        
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+
+class PaymentStatusStreamTest(TestCase):
+    """Test the payment status event stream"""
+    
+    @override_settings(PAYMENT_EVENTS_BACKEND='local')
+    def test_stream_only_emits_changes(self):
+        """Test unchanged snapshots are suppressed and final status closes the stream"""
+        initial = {'order_id': 'ORD1', 'status': 'pending', 'confirmations': 0, 'received_amount': '0'}
+        subscription = payment_events.subscribe('ORD1')
+        
+        payment_events.publish('ORD1', dict(initial))
+        payment_events.publish('ORD1', dict(initial, confirmations=1, received_amount='1'))
+        payment_events.publish('ORD1', dict(initial, status='paid', confirmations=1, received_amount='1'))
+        
+        events = [
+            chunk for chunk in stream_payment_status('ORD1', subscription, initial)
+            if chunk.startswith('event:')
+        ]
+        
+        self.assertEqual(len(events), 3)
+        self.assertIn('"status": "paid"', events[-1])
+        self.assertNotIn('ORD1', payment_events._subscribers)
+    
+    @override_settings(PAYMENT_EVENTS_BACKEND='local', PAYMENT_STREAM_HEARTBEAT=5)
+    def test_async_stream_is_woken_by_other_threads(self):
+        """Test the ASGI stream receives changes published from a worker thread while it waits"""
+        initial = {'order_id': 'ORD2', 'status': 'pending', 'confirmations': 0, 'received_amount': '0'}
+        subscription = payment_events.subscribe('ORD2')
+        
+        def publish():
+            payment_events.publish('ORD2', dict(initial, confirmations=1, received_amount='1'))
+            payment_events.publish('ORD2', dict(initial, status='paid', confirmations=1, received_amount='1'))
+        
+        async def collect():
+            chunks = []
+            async for chunk in astream_payment_status('ORD2', subscription, initial):
+                chunks.append(chunk)
+                if chunk.startswith('event:') and len(chunks) == 2:
+                    # Publish only once the stream is waiting on the loop
+                    asyncio.get_running_loop().call_later(0.05, threading.Thread(target=publish).start)
+            return chunks
+        
+        chunks = asyncio.run(asyncio.wait_for(collect(), 3))
+        events = [chunk for chunk in chunks if chunk.startswith('event:')]
+        
+        self.assertEqual(len(events), 3)
+        self.assertNotIn(': keep-alive\n\n', chunks)
+        self.assertIn('"status": "paid"', events[-1])
+        self.assertNotIn('ORD2', payment_events._subscribers)
+    
+    @override_settings(PAYMENT_EVENTS_BACKEND='local', PAYMENT_STREAM_HEARTBEAT=15)
+    def test_sync_stream_honours_short_duration(self):
+        """Test WSGI streams close after max_duration rather than the heartbeat"""
+        initial = {'order_id': 'ORD3', 'status': 'pending', 'confirmations': 0, 'received_amount': '0'}
+        subscription = payment_events.subscribe('ORD3')
+        
+        chunks = list(stream_payment_status('ORD3', subscription, initial, max_duration=0.1))
+        
+        self.assertEqual(len([chunk for chunk in chunks if chunk.startswith('event:')]), 1)
+        self.assertNotIn('ORD3', payment_events._subscribers)
+
+
+@override_settings(PAYMENT_EVENTS_BACKEND='local')
+class PaymentStatusCacheTest(TestCase):
+    """Test the read-through payment status cache"""
+    
+    def setUp(self):
+        cache.clear()
+        self.btc = create_crypto('BTC')
+        self.payment_address = create_payment_address(self.btc, 'ORD1')
+    
+    def test_status_is_served_from_cache_and_written_through(self):
+        """Test repeated reads skip the database and changes replace the cached entry"""
+        service = PaymentService()
+        self.assertEqual(service.check_payment_status('ORD1')['status'], 'pending')
+        with self.assertNumQueries(0):
+            self.assertEqual(service.check_payment_status('ORD1')['status'], 'pending')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.payment_address.status = 'paid'
+            self.payment_address.save()
+            service.publish_payment_status(self.payment_address)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(service.check_payment_status('ORD1')['status'], 'paid')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentService.invalidate_payment_status('ORD1')
+        self.assertIsNone(PaymentService.get_cached_payment_status('ORD1'))
+
+
+class EscrowAutoReleaseTest(TestCase):
+    """Test set-based escrow auto-release"""
+    
+    def setUp(self):
+        User = get_user_model()
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+        self.vendor = User.objects.create_user(username='vendor', password='pass')
+        self.btc = create_crypto('BTC')
+    
+    def create_escrow(self, order_id, auto_release_at, **kwargs):
+        defaults = {'status': 'funded', 'escrow_amount': Decimal('1.0'), 'escrow_fee': Decimal('0.02')}
+        defaults.update(kwargs)
+        return EscrowPayment.objects.create(
+            payment_address=create_payment_address(self.btc, order_id),
+            buyer=self.buyer,
+            vendor=self.vendor,
+            auto_release_at=auto_release_at,
+            **defaults
+        )
+    
+    def test_releases_matured_escrows_in_batches(self):
+        """Test only funded, matured, auto-release escrows are released"""
+        past = timezone.now() - timedelta(days=1)
+        for i in range(3):
+            self.create_escrow(f'ORD{i}', past)
+        self.create_escrow('FUTURE', timezone.now() + timedelta(days=1))
+        self.create_escrow('MANUAL', past, auto_release_enabled=False)
+        self.create_escrow('DISPUTED', past, status='disputed')
+        
+        subscription = payment_events.subscribe('ORD0')
+        self.addCleanup(payment_events.unsubscribe, 'ORD0', subscription)
+        with override_settings(PAYMENT_EVENTS_BACKEND='local'), self.captureOnCommitCallbacks(execute=True):
+            result = EscrowService().auto_release_escrows(batch_size=2)
+        
+        self.assertEqual(result, {'released': 3, 'batches': 2})
+        self.assertEqual(subscription.get_nowait()['escrow']['status'], 'released')
+        self.assertEqual(EscrowPayment.objects.filter(status='released').count(), 3)
+        self.assertFalse(EscrowPayment.objects.filter(status='released', released_at__isnull=True).exists())
+
+
+class PaymentExpirySweepTest(TestCase):
+    """Test expiring unpaid orders and returning their stock"""
+    
+    def setUp(self):
+        User = get_user_model()
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+        self.vendor = User.objects.create_user(username='vendor', password='pass')
+        self.btc = create_crypto('BTC')
+        category = ProductCategory.objects.create(name='Gaming', slug='gaming')
+        self.product = Product.objects.create(
+            vendor=self.vendor,
+            category=category,
+            headline='Steam account',
+            website='steampowered.com',
+            account_type='gaming',
+            access_type='full_ownership',
+            description='Aged account',
+            price=Decimal('10'),
+            delivery_time='instant_auto',
+            quantity_available=0,
+            status='reserved'
+        )
+    
+    def create_order(self, order_id, expires_at, quantity=1, payment_status='pending'):
+        create_payment_address(self.btc, order_id, expires_at=expires_at, status=payment_status)
+        return Order.objects.create(
+            order_id=order_id,
+            buyer=self.buyer,
+            vendor=self.vendor,
+            product=self.product,
+            quantity=quantity,
+            unit_price=Decimal('10'),
+            crypto_currency='BTC',
+            payment_expires_at=expires_at
+        )
+    
+    def test_sweep_expires_orders_and_restocks_products(self):
+        """Test overdue orders are expired and quantities returned in one increment"""
+        past = timezone.now() - timedelta(minutes=5)
+        self.create_order('ORD1', past, quantity=2)
+        self.create_order('ORD2', past, quantity=3)
+        self.create_order('OPEN', timezone.now() + timedelta(hours=1))
+        self.create_order('PARTIAL', past, payment_status='partial')
+        
+        subscription = payment_events.subscribe('ORD1')
+        self.addCleanup(payment_events.unsubscribe, 'ORD1', subscription)
+        with override_settings(PAYMENT_EVENTS_BACKEND='local'), self.captureOnCommitCallbacks(execute=True):
+            result = PaymentExpiryService(batch_size=10).sweep()
+        
+        self.assertEqual(result, {'expired': 2, 'restocked': 5, 'batches': 1})
+        self.assertEqual(subscription.get_nowait()['status'], 'expired')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity_available, 5)
+        self.assertEqual(self.product.status, 'approved')
+        self.assertEqual(
+            set(Order.objects.filter(payment_status='expired').values_list('order_id', flat=True)),
+            {'ORD1', 'ORD2'}
+        )
+        self.assertEqual(PaymentAddress.objects.get(order_id='ORD1').status, 'expired')
+        self.assertEqual(PaymentAddress.objects.get(order_id='PARTIAL').status, 'partial')
+
+
+class PaymentAnalyticsTest(TestCase):
+    """Test the payment_daily_stats rollup and analytics endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.btc = create_crypto('BTC')
+        self.xmr = create_crypto('XMR')
+        create_payment_address(self.btc, 'ORD1', status='paid', received_amount=Decimal('1.0'))
+        create_payment_address(self.btc, 'ORD2')
+        create_payment_address(self.xmr, 'ORD3')
+    
+    def test_refresh_moves_changed_payments_between_buckets(self):
+        """Test incremental refresh replaces the rows of touched days"""
+        stats_service = PaymentStatsService()
+        stats_service.refresh()
+        self.assertEqual(stats_service.get_summary()['pending'], 2)
+        
+        PaymentAddress.objects.filter(order_id='ORD2').update(status='paid', updated_at=timezone.now())
+        self.assertEqual(stats_service.get_summary()['pending'], 1)
+        stats_service.refresh()
+        
+        summary = stats_service.get_summary()
+        self.assertEqual((summary['total'], summary['successful'], summary['pending']), (3, 2, 1))
+        self.assertEqual(summary['success_rate'], 66.67)
+        btc_paid = [
+            row for row in stats_service.get_series(timezone.localdate(), timezone.localdate())
+            if row['currency'] == 'BTC'
+        ]
+        self.assertEqual(len(btc_paid), 1)
+        self.assertEqual(btc_paid[0]['count'], 2)
+    
+    def test_summary_is_live_before_first_refresh(self):
+        """Test totals come from the payments themselves, not the rollup"""
+        with self.assertNumQueries(1):
+            summary = PaymentStatsService().get_summary()
+        self.assertEqual((summary['total'], summary['successful'], summary['pending']), (3, 1, 2))
+    
+    def test_analytics_endpoint_validates_range(self):
+        """Test the endpoint serves the rollup and rejects bad parameters"""
+        PaymentStatsService().refresh()
+        admin = get_user_model().objects.create_user(username='admin', password='pass')
+        
+        def get(params):
+            request = APIRequestFactory().get('/api/v1/payments/admin/analytics/', params)
+            force_authenticate(request, user=admin)
+            return PaymentAnalyticsView.as_view()(request)
+        
+        response = get({'granularity': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['payments']['total'], 3)
+        self.assertEqual(response.data['range']['granularity'], 'month')
+        self.assertEqual(sum(row['count'] for row in response.data['series']), 3)
+        
+        self.assertEqual(get({'granularity': 'hour'}).status_code, 400)
+        self.assertEqual(get({'from': '2026-02-30'}).status_code, 400)
+
+
+class AdminEscrowListTest(TestCase):
+    """Test keyset pagination and NDJSON export of the admin escrow listing"""
+    
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', password='pass')
+        buyer = User.objects.create_user(username='buyer', password='pass')
+        vendor = User.objects.create_user(username='vendor', password='pass')
+        btc = create_crypto('BTC')
+        created_at = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            escrow = EscrowPayment.objects.create(
+                payment_address=create_payment_address(btc, f'ORD{i}'),
+                buyer=buyer,
+                vendor=vendor,
+                escrow_amount=Decimal('1.0'),
+                escrow_fee=Decimal('0.02'),
+                status='funded' if i % 2 else 'created'
+            )
+        # Identical timestamps exercise the id tie-breaker
+        EscrowPayment.objects.update(created_at=created_at)
+    
+    def get(self, params):
+        request = APIRequestFactory().get('/api/v1/payments/admin/escrows/', params)
+        force_authenticate(request, user=self.admin)
+        return AdminEscrowView.as_view()(request)
+    
+    def test_cursor_walks_every_row_once(self):
+        """Test following next_cursor returns each escrow exactly once"""
+        seen, params = [], {'page_size': 2}
+        while True:
+            response = self.get(params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['order_id'] for row in response.data['escrows'])
+            if not response.data['has_more']:
+                break
+            params = {'page_size': 2, 'cursor': response.data['next_cursor']}
+        
+        self.assertEqual(sorted(seen), [f'ORD{i}' for i in range(5)])
+        self.assertEqual(self.get({'cursor': 'garbage'}).status_code, 400)
+    
+    def test_total_counts_every_matching_escrow(self):
+        """Test the total key still covers all matching rows, not just the page"""
+        response = self.get({'page_size': 2, 'status': 'created'})
+        
+        self.assertEqual((response.data['total'], response.data['total_exact']), (3, True))
+        self.assertEqual(response.data['count'], 2)
+    
+    def test_ndjson_export_streams_filtered_rows(self):
+        """Test the export streams one JSON object per matching escrow"""
+        response = self.get({'export': 'ndjson', 'status': 'funded'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(json.loads(line)['status'] == 'funded' for line in lines))
+
+
+class ExchangeRateServiceTest(TestCase):
+    """Test exchange rate snapshots and refresh"""
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_snapshot_converts_many_amounts(self):
+        """Test vectorized conversion and cross rates from one immutable snapshot"""
+        snapshot = RateSnapshot({'BTC': '60000', 'XMR': '150'})
+        
+        self.assertEqual(
+            snapshot.convert_many(['0.001', Decimal('0.5'), None], 'BTC'),
+            [Decimal('60.00'), Decimal('30000.00'), None]
+        )
+        self.assertEqual(snapshot.convert('1', 'BTC', 'XMR', places=4), Decimal('400.0000'))
+        self.assertEqual(snapshot.convert_many(['1'], 'ETH'), [None])
+        with self.assertRaises(AttributeError):
+            snapshot.provider = 'other'
+    
+    @override_settings(EXCHANGE_RATE_FIXTURES={'BTC': '65000', 'XMR': '160'})
+    def test_refresh_updates_prices_and_shared_snapshot(self):
+        """Test a refresh stores prices and other processes read them without the database"""
+        btc = create_crypto('BTC')
+        create_crypto('XMR')
+        
+        ExchangeRateService().refresh(FixtureRateProvider())
+        
+        btc.refresh_from_db()
+        self.assertEqual(btc.current_price, Decimal('65000'))
+        other_process = ExchangeRateService()
+        with self.assertNumQueries(0):
+            snapshot = other_process.get_snapshot()
+        self.assertEqual(snapshot.rates['XMR'], Decimal('160'))
+        self.assertEqual(snapshot.provider, 'fixture')
+
+    @override_settings(EXCHANGE_RATE_SNAPSHOT_TTL=0)
+    def test_expired_snapshot_rereads_database_when_cache_is_empty(self):
+        """Test a flushed cache falls back to stored prices on every reload, not only at cold start"""
+        btc = create_crypto('BTC')
+        service = ExchangeRateService()
+        self.assertEqual(service.get_snapshot().rates['BTC'], Decimal('150'))
+        
+        CryptoCurrency.objects.filter(pk=btc.pk).update(current_price=Decimal('200'))
+        snapshot = service.get_snapshot()
+        
+        self.assertEqual(snapshot.rates['BTC'], Decimal('200'))
+        self.assertEqual(snapshot.provider, 'database')
+    
+    def test_providers_must_implement_fetch(self):
+        """Test the provider base class is abstract"""
+        with self.assertRaises(TypeError):
+            ExchangeRateProvider()
+
+
+class ConfirmationTrackerTest(TestCase):
+    """Test tip-driven confirmation updates"""
+    
+    def setUp(self):
+        cache.clear()
+        self.xmr = create_crypto('XMR')
+    
+    def create_transaction(self, order_id, block_height):
+        payment_address = create_payment_address(self.xmr, order_id, required_confirmations=10, received_amount=Decimal('1.0'))
+        BlockchainTransaction.objects.create(
+            payment_address=payment_address,
+            transaction_hash=f'tx-{order_id}',
+            block_height=block_height,
+            amount=Decimal('1.0')
+        )
+        return payment_address
+    
+    def test_new_tip_confirms_matured_transactions(self):
+        """Test confirmations are recomputed and matured payments settle in one pass"""
+        matured = self.create_transaction('ORD1', 100)
+        recent = self.create_transaction('ORD2', 105)
+        
+        stats = ConfirmationTracker(monero=mock.Mock()).on_new_tip('XMR', 109)
+        
+        self.assertEqual((stats['transactions'], stats['payments'], stats['paid']), (2, 2, 1))
+        matured.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((matured.status, matured.confirmations), ('paid', 10))
+        self.assertEqual((recent.status, recent.confirmations), ('pending', 5))
+        self.assertTrue(BlockchainTransaction.objects.get(transaction_hash='tx-ORD1').confirmed)
+        self.assertFalse(BlockchainTransaction.objects.get(transaction_hash='tx-ORD2').confirmed)
+        
+        # The same tip again is a no-op; the next one only touches the unconfirmed row
+        self.assertEqual(ConfirmationTracker(monero=mock.Mock()).on_new_tip('XMR', 109)['transactions'], 0)
+        self.assertEqual(ConfirmationTracker(monero=mock.Mock()).on_new_tip('XMR', 110)['transactions'], 1)
+
+
+class MockFaultProfileTest(TestCase):
+    """Test seeded latency and failure injection for mock providers"""
+    
+    def test_test_profile_is_instant_and_deterministic(self):
+        """Test the test profile never sleeps or fails and repeats with the same seed"""
+        first = MockBTCPayService(FaultProfile('btcpay', 'test', seed=7))
+        second = MockBTCPayService(FaultProfile('btcpay', 'test', seed=7))
+        
+        with mock.patch('payments.mock_services.time.sleep') as sleep:
+            invoices = [first.create_invoice(f'ORD{i}', Decimal('0.1')) for i in range(3)]
+            self.assertEqual(invoices, [second.create_invoice(f'ORD{i}', Decimal('0.1')) for i in range(3)])
+        sleep.assert_not_called()
+        self.assertEqual(first.profile.stats['ok'], 3)
+    
+    @override_settings(MOCK_PAYMENTS_PROFILES={'flaky': {'error_rate': 0.5}})
+    def test_fresh_services_keep_drawing_from_the_seeded_stream(self):
+        """Test services built per call neither repeat one address nor share one outcome"""
+        with mock.patch('payments.mock_services.time.sleep'):
+            services = [MockBTCPayService(FaultProfile('btcpay', 'flaky')) for _ in range(20)]
+            invoices = [service.create_invoice('ORD1', Decimal('0.1')) for service in services]
+        
+        created = [invoice for invoice in invoices if invoice]
+        self.assertTrue(0 < len(created) < 20)
+        self.assertEqual(len({invoice['addresses']['BTC'] for invoice in created}), len(created))
+    
+    @override_settings(MOCK_PAYMENTS_PROFILES={'load': {
+        'latency_p50': 0.1, 'latency_p99': 1.0, 'error_rate': 0.1, 'timeout_rate': 0.05, 'timeout': 5
+    }})
+    def test_load_profile_injects_seeded_errors_and_latency(self):
+        """Test error, timeout and latency rates follow the profile"""
+        profile = FaultProfile('btcpay', 'load', seed=7)
+        with mock.patch('payments.mock_services.time.sleep'):
+            outcomes = [profile.call('create_invoice') for _ in range(2000)]
+        
+        self.assertAlmostEqual(profile.stats['errors'] / 2000, 0.1, delta=0.02)
+        self.assertAlmostEqual(profile.stats['timeouts'] / 2000, 0.05, delta=0.015)
+        self.assertEqual(outcomes.count(False), profile.stats['errors'] + profile.stats['timeouts'])
+        
+        latency_profile = FaultProfile('monero', 'load', seed=7)
+        samples = sorted(latency_profile.latency('get_transfers') for _ in range(5000))
+        self.assertAlmostEqual(samples[2500], 0.1, delta=0.01)
+        self.assertAlmostEqual(samples[4950], 1.0, delta=0.2)
+
+
+class PaymentAddressBackfillTest(TestCase):
+    """Test backfilling payment addresses for orders that have none"""
+    
+    def setUp(self):
+        User = get_user_model()
+        buyer = User.objects.create_user(username='buyer', password='pass')
+        vendor = User.objects.create_user(username='vendor', password='pass')
+        self.btc = create_crypto('BTC')
+        product = Product.objects.create(
+            vendor=vendor,
+            category=ProductCategory.objects.create(name='Gaming', slug='gaming'),
+            headline='Steam account',
+            website='steampowered.com',
+            account_type='gaming',
+            access_type='full_ownership',
+            description='Aged account',
+            price=Decimal('10'),
+            delivery_time='instant_auto',
+            quantity_available=10
+        )
+        for i in range(5):
+            Order.objects.create(
+                order_id=f'ORD{i}', buyer=buyer, vendor=vendor, product=product,
+                quantity=1, unit_price=Decimal('10'), crypto_currency='BTC'
+            )
+        create_payment_address(self.btc, 'ORD0')
+        self.expires_at = timezone.now() + timedelta(hours=2)
+    
+    def fake_create_payment_address(self, order_id, crypto_currency, amount, **kwargs):
+        if order_id == 'ORD3':
+            raise Exception('provider down')
+        return SimpleNamespace(payment_address=f'new-{order_id}', expires_at=self.expires_at)
+    
+    def run_backfill(self, **kwargs):
+        options = {'workers': 3, 'batch_size': 2}
+        options.update(kwargs.pop('service', {}))
+        with mock.patch.object(PaymentService, 'create_payment_address', autospec=True,
+                               side_effect=lambda service, *args, **kw: self.fake_create_payment_address(*args, **kw)) as create:
+            stats = PaymentAddressBackfillService(**options).run(**kwargs)
+        return stats, create
+    
+    def test_links_generates_and_bulk_updates(self):
+        """Test existing payments are linked and the rest generated on the pool"""
+        stats, create = self.run_backfill()
+        
+        self.assertEqual(stats, {'orders': 5, 'linked': 1, 'generated': 3, 'failed': 1, 'batches': 3})
+        self.assertEqual(create.call_count, 4)
+        addresses = dict(Order.objects.values_list('order_id', 'payment_address'))
+        self.assertEqual(addresses, {
+            'ORD0': 'addr-ORD0', 'ORD1': 'new-ORD1', 'ORD2': 'new-ORD2', 'ORD3': '', 'ORD4': 'new-ORD4'
+        })
+        self.assertEqual(ScannerCheckpoint.objects.get(name=PaymentAddressBackfillService.CHECKPOINT_NAME).cursor, '')
+    
+    def test_resumes_from_checkpoint(self):
+        """Test a limited run leaves a checkpoint the next run continues from"""
+        stats, _ = self.run_backfill(limit=2)
+        self.assertEqual(stats['orders'], 2)
+        
+        stats, create = self.run_backfill()
+        self.assertEqual(stats['orders'], 3)
+        self.assertEqual([call.args[1] for call in create.call_args_list], ['ORD2', 'ORD3', 'ORD4'])
+    
+    def test_dry_run_writes_nothing(self):
+        """Test dry runs only count"""
+        stats, create = self.run_backfill(service={'dry_run': True})
+        
+        self.assertEqual(stats['linked'] + stats['generated'], 5)
+        create.assert_not_called()
+        self.assertEqual(Order.objects.filter(payment_address='').count(), 5)
+        self.assertFalse(ScannerCheckpoint.objects.exists())
+
+    def test_monero_subaddresses_are_created_in_bulk(self):
+        """Test a batch's XMR orders share batched wallet calls even with the pool disabled"""
+        xmr = create_crypto('XMR')
+        Order.objects.exclude(order_id='ORD0').update(crypto_currency='XMR')
+        subaddresses = [{'address': f'sub-{index}', 'address_index': index} for index in range(1, 5)]
+        
+        with mock.patch.object(MoneroRPCService, 'create_subaddresses', return_value=subaddresses) as create_many:
+            stats, create = self.run_backfill(service={'batch_size': 10})
+        
+        self.assertEqual(stats['orders'], 5)
+        create_many.assert_called_once_with(4, label='Backfill')
+        self.assertEqual(
+            sorted(call.kwargs['subaddress']['address_index'] for call in create.call_args_list), [1, 2, 3, 4]
+        )
+        
+        # The pre-created subaddress is used instead of a pooled or live one
+        with mock.patch.object(MoneroRPCService, 'create_subaddress') as create_one:
+            payment = PaymentService().create_payment_address('ORD9', 'XMR', Decimal('1'), subaddress=subaddresses[0])
+        create_one.assert_not_called()
+        self.assertEqual((payment.crypto_currency, payment.payment_address, payment.monero_subaddress_index), (xmr, 'sub-1', 1))
+    
+    def test_pool_threads_close_their_connections(self):
+        """Test every provider call, failed ones included, closes its pool thread's connections"""
+        closing_threads = []
+        with mock.patch('payments.services.connections.close_all',
+                        side_effect=lambda: closing_threads.append(threading.current_thread().name)):
+            self.run_backfill()
+        
+        self.assertEqual(len(closing_threads), 4)
+        self.assertTrue(all(name.startswith('backfill') for name in closing_threads))
+
+
+@override_settings(ROOT_URLCONF='orders.urls')
+class OrderProvisioningTest(TestCase):
+    """Test order creation queues payment address provisioning"""
+    
+    def setUp(self):
+        User = get_user_model()
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+        vendor = User.objects.create_user(username='vendor', password='pass')
+        self.btc = create_crypto('BTC')
+        self.product = Product.objects.create(
+            vendor=vendor,
+            category=ProductCategory.objects.create(name='Gaming', slug='gaming'),
+            headline='Steam account',
+            website='steampowered.com',
+            account_type='gaming',
+            access_type='full_ownership',
+            description='Aged account',
+            price=Decimal('0.01'),
+            delivery_time='instant_auto',
+            quantity_available=5,
+            status='approved'
+        )
+    
+    def create_order(self):
+        request = APIRequestFactory().post('/orders/', {
+            'product': self.product.id, 'quantity': 1, 'crypto_currency': 'BTC'
+        }, format='json')
+        force_authenticate(request, user=self.buyer)
+        return OrderViewSet.as_view({'post': 'create'})(request)
+    
+    def test_create_returns_202_and_provisions_after_commit(self):
+        """Test the order is accepted before its address exists and filled in by the task"""
+        created = lambda service, order_id, crypto_currency, amount, **kwargs: create_payment_address(
+            self.btc, order_id, payment_address=f'tb1q-{order_id}'
+        )
+        # Run the task in-process rather than through the broker
+        run_task = lambda order_id: provision_payment_address.apply(args=[order_id])
+        with mock.patch.object(PaymentService, 'create_payment_address', autospec=True, side_effect=created) as create, \
+                mock.patch.object(provision_payment_address, 'delay', side_effect=run_task) as delay:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.create_order()
+            
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['payment_provisioning'], 'queued')
+            self.assertEqual(response.data['payment_address'], '')
+            self.assertTrue(response.data['status_url'].endswith(f"/orders/{response.data['id']}/"))
+            self.assertEqual(response['Location'], response.data['status_url'])
+            create.assert_not_called()
+            
+            for callback in callbacks:
+                callback()
+        
+        delay.assert_called_once_with(response.data['order_id'])
+        order = Order.objects.get(order_id=response.data['order_id'])
+        self.assertEqual(order.payment_provisioning, 'ready')
+        self.assertEqual(order.payment_address, f'tb1q-{order.order_id}')
+        self.assertIsNotNone(order.payment_expires_at)
+    
+    def test_provider_errors_requeue_and_cancelled_orders_are_skipped(self):
+        """Test failed attempts go back to queued and cancelled orders are not provisioned"""
+        with self.captureOnCommitCallbacks():
+            order_id = self.create_order().data['order_id']
+        payment_service = PaymentService()
+        
+        with mock.patch.object(PaymentService, 'create_payment_address', side_effect=Exception('provider down')):
+            with self.assertRaises(Exception):
+                payment_service.provision_order_address(order_id)
+        self.assertEqual(Order.objects.get(order_id=order_id).payment_provisioning, 'queued')
+        
+        payment_service.mark_provisioning_failed(order_id)
+        self.assertEqual(Order.objects.get(order_id=order_id).payment_provisioning, 'failed')
+        
+        Order.objects.filter(order_id=order_id).update(payment_provisioning='queued', order_status='cancelled')
+        with mock.patch.object(PaymentService, 'create_payment_address') as create:
+            self.assertFalse(payment_service.provision_order_address(order_id))
+        create.assert_not_called()
+        self.assertEqual(Order.objects.get(order_id=order_id).payment_provisioning, 'failed')
+
+
+class PaymentStandInTest(TestCase):
+    """Test the real provider clients against the local stand-in server"""
+    
+    def setUp(self):
+        self.state = StandInState(seed=1, block_interval=3600)
+        self.server = create_server(state=self.state)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.settings_override = override_settings(
+            BTCPAY_SERVER_URL=base_url, BTCPAY_STORE_ID='store', MONERO_RPC_URL=f"{base_url}/json_rpc"
+        )
+        self.settings_override.enable()
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_btcpay_invoice_flow_and_signed_webhooks(self):
+        """Test invoice creation, address lookup and webhook signatures"""
+        btcpay = BTCPayServerService()
+        invoice = btcpay.create_invoice('ORD1', Decimal('0.01'))
+        
+        self.assertTrue(btcpay.get_invoice_address(invoice['invoice_id']).startswith('tb1q'))
+        self.assertEqual(btcpay.get_invoice_status(invoice['invoice_id'])['status'], 'New')
+        
+        firer = WebhookFirer(self.state, 'http://webhooks.invalid/', rate=1, secret='secret')
+        firer.session = mock.Mock()
+        firer.session.post.return_value.status_code = 200
+        paid_invoice, payment = self.state.pay_next_invoice()
+        firer.send('InvoiceReceivedPayment', paid_invoice, payment=payment)
+        
+        sent = firer.session.post.call_args.kwargs
+        self.assertEqual(json.loads(sent['data'])['metadata']['orderId'], 'ORD1')
+        with override_settings(BTCPAY_WEBHOOK_SECRET='secret'):
+            self.assertTrue(btcpay.verify_webhook(sent['data'].decode(), sent['headers']['BTCPay-Sig']))
+        self.assertEqual(btcpay.get_invoice_status(invoice['invoice_id'])['status'], 'Settled')
+    
+    def test_reconciliation_repairs_missed_webhooks_from_invoice_list(self):
+        """Test drift is found from paged invoice lists and moved forward in bulk"""
+        btcpay = BTCPayServerService()
+        btc = create_crypto('BTC')
+        payments = {}
+        for order_id, status in [('ORD1', 'pending'), ('ORD2', 'pending'), ('ORD3', 'pending'), ('ORD4', 'paid')]:
+            invoice = btcpay.create_invoice(order_id, Decimal('0.01'))
+            payments[order_id] = create_payment_address(
+                btc, order_id, btcpay_invoice_id=invoice['invoice_id'], status=status
+            )
+        for order_id in ('ORD1', 'ORD4'):
+            self.state.pay_invoice(payments[order_id].btcpay_invoice_id)
+        self.state.invoices[payments['ORD2'].btcpay_invoice_id].update(status='Expired', additionalStatus='PaidPartial')
+        
+        subscription = payment_events.subscribe('ORD1')
+        self.addCleanup(payment_events.unsubscribe, 'ORD1', subscription)
+        with mock.patch.object(PaymentService, 'mark_orders_paid') as mark_orders_paid, \
+                override_settings(PAYMENT_EVENTS_BACKEND='local'), self.captureOnCommitCallbacks(execute=True):
+            stats = BTCPayReconciliationService(page_size=2).reconcile()
+        
+        self.assertEqual(stats, {'invoices': 3, 'pages': 2, 'repaired': 2, 'paid': 1, 'partial': 1})
+        mark_orders_paid.assert_called_once_with(['ORD1'])
+        statuses = dict(PaymentAddress.objects.values_list('order_id', 'status'))
+        self.assertEqual(statuses, {'ORD1': 'paid', 'ORD2': 'partial', 'ORD3': 'pending', 'ORD4': 'paid'})
+        self.assertIsNotNone(PaymentAddress.objects.get(order_id='ORD1').confirmed_at)
+        self.assertEqual(subscription.get_nowait()['status'], 'paid')
+        self.assertEqual(PaymentService.get_cached_payment_status('ORD2')['status'], 'partial')
+    
+    def test_reconciliation_never_revives_expired_payments(self):
+        """Test a settlement that arrives after the expiry sweep is reported, not applied"""
+        User = get_user_model()
+        vendor = User.objects.create_user(username='vendor', password='pass')
+        product = Product.objects.create(
+            vendor=vendor, category=ProductCategory.objects.create(name='Gaming', slug='gaming'),
+            headline='Steam account', website='steampowered.com', account_type='gaming',
+            access_type='full_ownership', description='Aged account', price=Decimal('0.01'),
+            delivery_time='instant_auto', quantity_available=1
+        )
+        order = Order.objects.create(
+            order_id='ORD1', buyer=User.objects.create_user(username='buyer', password='pass'), vendor=vendor,
+            product=product, quantity=1, unit_price=Decimal('0.01'), crypto_currency='BTC',
+            order_status='cancelled', payment_status='expired'
+        )
+        invoice = BTCPayServerService().create_invoice('ORD1', Decimal('0.01'))
+        create_payment_address(create_crypto('BTC'), 'ORD1', btcpay_invoice_id=invoice['invoice_id'], status='expired')
+        self.state.pay_invoice(invoice['invoice_id'])
+        
+        stats = BTCPayReconciliationService().reconcile()
+        
+        self.assertEqual((stats['repaired'], stats['late_settlements']), (0, 1))
+        self.assertEqual(PaymentAddress.objects.get(order_id='ORD1').status, 'expired')
+        order.refresh_from_db()
+        self.assertEqual((order.order_status, order.payment_status), ('cancelled', 'expired'))
+        
+        PaymentService.mark_orders_paid(['ORD1'])
+        order.refresh_from_db()
+        self.assertEqual(order.order_status, 'cancelled')
+    
+    def test_orders_of_invoices_expired_by_reconciliation_are_cancelled(self):
+        """Test the expiry sweep still cancels and restocks an order whose payment reconciliation expired"""
+        User = get_user_model()
+        vendor = User.objects.create_user(username='vendor', password='pass')
+        product = Product.objects.create(
+            vendor=vendor, category=ProductCategory.objects.create(name='Gaming', slug='gaming'),
+            headline='Steam account', website='steampowered.com', account_type='gaming',
+            access_type='full_ownership', description='Aged account', price=Decimal('0.01'),
+            delivery_time='instant_auto', quantity_available=0, status='reserved'
+        )
+        expired_at = timezone.now() - timedelta(minutes=5)
+        order = Order.objects.create(
+            order_id='ORD1', buyer=User.objects.create_user(username='buyer', password='pass'), vendor=vendor,
+            product=product, quantity=1, unit_price=Decimal('0.01'), crypto_currency='BTC',
+            payment_expires_at=expired_at
+        )
+        invoice = BTCPayServerService().create_invoice('ORD1', Decimal('0.01'))
+        create_payment_address(create_crypto('BTC'), 'ORD1', btcpay_invoice_id=invoice['invoice_id'], expires_at=expired_at)
+        self.state.invoices[invoice['invoice_id']]['status'] = 'Expired'
+        
+        stats = BTCPayReconciliationService().reconcile()
+        self.assertEqual((stats['repaired'], stats['expired']), (1, 1))
+        
+        self.assertEqual(PaymentExpiryService().sweep()['expired'], 1)
+        order.refresh_from_db()
+        self.assertEqual((order.order_status, order.payment_status), ('cancelled', 'expired'))
+        product.refresh_from_db()
+        self.assertEqual((product.quantity_available, product.status), (1, 'approved'))
+    
+    def test_monero_rpc_batches_and_transfers(self):
+        """Test batched subaddress creation and transfer filtering"""
+        monero = MoneroRPCService()
+        subaddresses = monero.create_subaddresses(70)
+        
+        self.assertEqual([s['address_index'] for s in subaddresses], list(range(1, 71)))
+        self.state.pay_next_subaddress()
+        self.state.mine_block()
+        transfers = monero.get_transfers(subaddr_indices=[1, 2], min_height=1001)['in']
+        self.assertEqual(len(transfers), 1)
+        self.assertEqual(transfers[0]['subaddr_index']['minor'], 1)
+        self.assertEqual(monero.get_height(), 1001)
+        self.assertIsNone(monero.get_transfers(subaddr_indices=[1], min_height=1002).get('in'))
+    
+    def test_monero_transfers_wait_in_the_mempool_until_a_block(self):
+        """Test unconfirmed transfers are only returned with pool=True until the next block confirms them"""
+        monero = MoneroRPCService()
+        monero.create_subaddresses(2)
+        self.state.pay_next_subaddress()
+        
+        self.assertEqual(monero.get_transfers(subaddr_indices=[1]), {})
+        pool = monero.get_transfers(subaddr_indices=[1], min_height=1000, pool=True)
+        self.assertNotIn('in', pool)
+        self.assertEqual((pool['pool'][0]['height'], pool['pool'][0]['confirmations']), (0, 0))
+        self.assertEqual(monero.get_balance()['balance'], 0)
+        
+        self.state.mine_block()
+        transfers = monero.get_transfers(subaddr_indices=[1], pool=True)
+        self.assertNotIn('pool', transfers)
+        self.assertEqual((transfers['in'][0]['height'], transfers['in'][0]['confirmations']), (1001, 1))
+        self.assertEqual(transfers['in'][0]['txid'], pool['pool'][0]['txid'])
+    
+    def test_scanner_sees_mempool_payments_before_they_confirm(self):
+        """Test the scanner records a 0-conf transfer and marks the payment paid once it is mined"""
+        subaddress = MoneroRPCService().create_subaddresses(1)[0]
+        payment = create_payment_address(
+            create_crypto('XMR'), 'ORD1', payment_address=subaddress['address'],
+            monero_subaddress_index=subaddress['address_index'], expected_amount=Decimal('1000')
+        )
+        self.state.pay_next_subaddress()
+        
+        stats = MoneroTransferScanner().scan()
+        self.assertEqual((stats['transfers'], stats['paid']), (1, 0))
+        transaction = BlockchainTransaction.objects.get(payment_address=payment)
+        self.assertEqual((transaction.block_height, transaction.confirmations), (None, 0))
+        
+        self.state.mine_block()
+        self.assertEqual(MoneroTransferScanner().scan()['paid'], 1)
+        transaction.refresh_from_db()
+        self.assertEqual((transaction.block_height, transaction.confirmations), (1001, 1))
+        self.assertEqual(PaymentAddress.objects.get(order_id='ORD1').status, 'paid')
+
+
+@override_settings(ROOT_URLCONF='orders.urls')
+class CheckoutBenchmarkTest(TransactionTestCase):
+    """Test the end-to-end checkout benchmark harness"""
+    
+    def test_percentile_uses_nearest_rank(self):
+        values = [0.5, 0.1, 0.4, 0.2, 0.3]
+        self.assertEqual(percentile(values, 50), 0.3)
+        self.assertEqual(percentile(values, 99), 0.5)
+        self.assertEqual(percentile([], 95), 0.0)
+    
+    def test_run_pays_every_order_and_cleans_up(self):
+        create_crypto('BTC')
+        # One buyer: the sqlite test database locks tables across threads
+        results = CheckoutBenchmark(buyers=1, orders_per_buyer=4, seed=1).run()
+        
+        self.assertEqual(results['orders']['completed'], 4, results['orders'])
+        self.assertGreater(results['queries_per_order'], 0)
+        for stage in ('order_create', 'provisioning', 'payment_address', 'webhook', 'webhook_processing', 'order_update', 'end_to_end'):
+            self.assertIn(stage, results['stages'])
+        self.assertEqual(results['stages']['end_to_end']['count'], 4)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(PaymentAddress.objects.exists())
+        
+        comparison = compare_results(results, results)
+        self.assertEqual(comparison['p95_change_pct']['end_to_end'], 0.0)
@@ -2,12 +2,15 @@ from django.urls import path
 from .views import (
     CreatePaymentAddressView,
     PaymentStatusView,
+    PaymentStatusStreamView,
     EscrowActionView,
     BTCPayWebhookView,
     MoneroWebhookView,
+    BlockNotifyView,
     SupportedCurrenciesView,
     AdminEscrowView,
-    PaymentAnalyticsView
+    PaymentAnalyticsView,
+    AddressPoolView
 )
 
 urlpatterns = [
@@ -16,6 +19,7 @@ urlpatterns = [
     
     # Payment status checking
     path('status/<str:order_id>/', PaymentStatusView.as_view(), name='payment_status'),
+    path('status/<str:order_id>/stream/', PaymentStatusStreamView.as_view(), name='payment_status_stream'),
     
     # Escrow actions
     path('escrow/<str:order_id>/', EscrowActionView.as_view(), name='escrow_action'),
@@ -23,6 +27,7 @@ urlpatterns = [
     # Webhooks
     path('webhooks/btcpay/', BTCPayWebhookView.as_view(), name='btcpay_webhook'),
     path('webhooks/monero/', MoneroWebhookView.as_view(), name='monero_webhook'),
+    path('webhooks/block/<str:crypto_currency>/', BlockNotifyView.as_view(), name='block_notify'),
     
     # Supported currencies
     path('currencies/', SupportedCurrenciesView.as_view(), name='supported_currencies'),
@@ -31,4 +36,5 @@ urlpatterns = [
     path('admin/escrows/', AdminEscrowView.as_view(), name='admin_escrows'),
     path('admin/escrows/<int:escrow_id>/', AdminEscrowView.as_view(), name='admin_escrow_action'),
     path('admin/analytics/', PaymentAnalyticsView.as_view(), name='payment_analytics'),
+    path('admin/address-pool/', AddressPoolView.as_view(), name='address_pool'),
 ] 
\ No newline at end of file
@@ -4,15 +4,27 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import timedelta
 from decimal import Decimal
+import base64
+import hmac
 import json
+import uuid
 import logging
+from django.conf import settings
 from django.utils import timezone
 
-from .services import PaymentService, EscrowService
+from .services import PaymentService, EscrowService, AddressPoolService, WebhookQueueService, PaymentStatsService
 from .mock_services import get_payment_service
+from .tasks import track_confirmations
+from .cache import processed_deliveries
+from .events import payment_events, stream_payment_status, astream_payment_status
 from .models import PaymentAddress, EscrowPayment
+from shared.counts import count_rows
 from shared.models import CryptoCurrency
 
 logger = logging.getLogger(__name__)
@@ -62,6 +74,7 @@ class CreatePaymentAddressView(APIView):
             response_data = {
                 'order_id': payment_address.order_id,
                 'payment_address': payment_address.payment_address,
+                'address_status': payment_address.address_status,
                 'expected_amount': str(payment_address.expected_amount),
                 'crypto_currency': payment_address.crypto_currency.symbol,
                 'payment_type': payment_address.payment_type,
@@ -141,6 +154,7 @@ class PaymentStatusView(APIView):
                 payment_address.status = 'paid'
                 payment_address.confirmed_at = timezone.now()
                 payment_address.save()
+                payment_service.publish_payment_status(payment_address)
                 logger.info(f"Payment address status updated for order {order_id}")
             else:
                 logger.warning(f"No payment address found for order {order_id}, but order status updated")
@@ -167,6 +181,50 @@ class PaymentStatusView(APIView):
             )
 
 
+class PaymentStatusStreamView(APIView):
+    """Server-Sent Events stream of payment status changes.
+    
+    Replaces polling PaymentStatusView: one database read when the stream
+    opens, then events pushed by webhook processing and the chain scanners.
+    Streams close once the payment is final or after
+    PAYMENT_STREAM_MAX_DURATION. Clients read it with a streaming fetch (the
+    JWT header rules out plain EventSource) and reconnect when it closes.
+    
+    Serve under ASGI (cryptonexus.asgi), where an open stream only waits on
+    the event loop. Under WSGI every open stream holds a worker thread, so
+    there it closes after PAYMENT_STREAM_SYNC_MAX_DURATION and the client's
+    reconnects degrade to long polling; use gthread or gevent workers rather
+    than the sync worker class if WSGI streams must be served at all.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, order_id):
+        # Subscribe before reading so no change between the two is missed
+        subscription = payment_events.subscribe(order_id)
+        try:
+            status_data = PaymentService().check_payment_status(order_id)
+        except Exception:
+            payment_events.unsubscribe(order_id, subscription)
+            raise
+        
+        if 'error' in status_data:
+            payment_events.unsubscribe(order_id, subscription)
+            return Response(status_data, status=status.HTTP_404_NOT_FOUND)
+        
+        if isinstance(request._request, ASGIRequest):
+            events = astream_payment_status(order_id, subscription, status_data)
+        else:
+            events = stream_payment_status(
+                order_id, subscription, status_data,
+                max_duration=settings.PAYMENT_STREAM_SYNC_MAX_DURATION
+            )
+        
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class EscrowActionView(APIView):
     """API for escrow actions (release, dispute)"""
     permission_classes = [IsAuthenticated]
@@ -240,14 +298,16 @@ class BTCPayWebhookView(APIView):
             
             logger.info(f"BTCPay webhook received and verified with signature: {signature}")
             
-            # Process webhook
+            # Persist and acknowledge; workers process the queue in the background
             webhook_data = json.loads(payload)
-            success = payment_service.process_payment_webhook('btcpay', webhook_data)
-            
-            if success:
+            delivery_id = webhook_data.get('deliveryId')
+            if delivery_id and ('btcpay', delivery_id) in processed_deliveries:
+                logger.info(f"BTCPay delivery {delivery_id} already processed, acknowledging")
                 return Response({'status': 'success'})
-            else:
-                return Response({'error': 'Processing failed'}, status=500)
+            
+            WebhookQueueService(payment_service).enqueue('btcpay', webhook_data)
+            
+            return Response({'status': 'success'})
                 
         except Exception as e:
             logger.error(f"BTCPay webhook error: {str(e)}")
@@ -276,6 +336,28 @@ class MoneroWebhookView(APIView):
             return Response({'error': 'Internal error'}, status=500)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BlockNotifyView(APIView):
+    """Block-notify hook: nodes report a new chain tip, e.g.
+    ``curl -X POST -H "X-Block-Notify-Token: ..." -d '{"height": N}' .../webhooks/block/XMR/``
+    """
+    authentication_classes = []
+    permission_classes = []
+    
+    def post(self, request, crypto_currency):
+        token = getattr(settings, 'BLOCK_NOTIFY_TOKEN', '')
+        if not token or not hmac.compare_digest(request.headers.get('X-Block-Notify-Token', ''), token):
+            return Response({'error': 'Invalid token'}, status=401)
+        
+        try:
+            height = int(request.data.get('height'))
+        except (TypeError, ValueError):
+            return Response({'error': 'height is required'}, status=400)
+        
+        track_confirmations.delay(crypto_currency.upper(), height)
+        return Response({'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+
+
 class SupportedCurrenciesView(APIView):
     """API for getting supported cryptocurrencies"""
     
@@ -301,36 +383,86 @@ class AdminEscrowView(APIView):
     """Admin API for escrow management"""
     permission_classes = [IsAuthenticated]
     
+    # Columns read for the listing; rows are built from values() so large
+    # exports never materialize model instances
+    LIST_FIELDS = (
+        'id', 'payment_address__order_id', 'buyer__username', 'vendor__username',
+        'escrow_amount', 'escrow_fee', 'status', 'created_at', 'auto_release_at', 'dispute_reason'
+    )
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+    EXPORT_CHUNK_SIZE = 2000
+    
     def get(self, request):
-        """Get all escrow payments with filtering"""
+        """List escrow payments, newest first, with keyset pagination.
+        
+        Filters: ``status``, ``auto_release_from``/``auto_release_to`` (ISO
+        datetimes). Pass the returned ``next_cursor`` as ``cursor`` for the
+        next page, or ``export=ndjson`` to stream every matching row.
+        ``total`` counts every matching escrow across pages; it is a planner
+        estimate for large results, as ``total_exact`` says.
+        """
         try:
-            escrow_status = request.query_params.get('status')
-            
-            escrows = EscrowPayment.objects.select_related(
-                'payment_address', 'buyer', 'vendor'
-            ).all()
+            escrows = EscrowPayment.objects.all()
             
+            escrow_status = request.query_params.get('status')
             if escrow_status:
                 escrows = escrows.filter(status=escrow_status)
             
-            escrow_data = []
-            for escrow in escrows:
-                escrow_data.append({
-                    'id': escrow.id,
-                    'order_id': escrow.payment_address.order_id,
-                    'buyer': escrow.buyer.username,
-                    'vendor': escrow.vendor.username,
-                    'escrow_amount': str(escrow.escrow_amount),
-                    'escrow_fee': str(escrow.escrow_fee),
-                    'status': escrow.status,
-                    'created_at': escrow.created_at.isoformat(),
-                    'auto_release_at': escrow.auto_release_at.isoformat() if escrow.auto_release_at else None,
-                    'dispute_reason': escrow.dispute_reason
-                })
+            for param, lookup in (('auto_release_from', 'auto_release_at__gte'), ('auto_release_to', 'auto_release_at__lte')):
+                value = request.query_params.get(param)
+                if value:
+                    moment = self._parse_datetime(value)
+                    if moment is None:
+                        return Response(
+                            {'error': f'{param} must be an ISO 8601 datetime'},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    escrows = escrows.filter(**{lookup: moment})
+            matching = escrows
+            
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                position = self._decode_cursor(cursor)
+                if position is None:
+                    return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+                created_at, escrow_id = position
+                escrows = escrows.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=escrow_id)
+                )
+            
+            rows = escrows.order_by('-created_at', '-id').values(*self.LIST_FIELDS)
+            
+            if request.query_params.get('export') == 'ndjson':
+                response = StreamingHttpResponse(
+                    (
+                        json.dumps(self._serialize_row(row)) + '\n'
+                        for row in rows.iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+                    ),
+                    content_type='application/x-ndjson'
+                )
+                response['Content-Disposition'] = 'attachment; filename="escrows.ndjson"'
+                return response
+            
+            try:
+                page_size = min(int(request.query_params.get('page_size', self.DEFAULT_PAGE_SIZE)), self.MAX_PAGE_SIZE)
+            except ValueError:
+                page_size = self.DEFAULT_PAGE_SIZE
+            page_size = max(page_size, 1)
+            
+            # One extra row tells whether another page exists
+            page = list(rows[:page_size + 1])
+            has_more = len(page) > page_size
+            page = page[:page_size]
+            total, total_exact = count_rows(matching)
             
             return Response({
-                'escrows': escrow_data,
-                'total': len(escrow_data)
+                'escrows': [self._serialize_row(row) for row in page],
+                'total': total,
+                'total_exact': total_exact,
+                'count': len(page),
+                'has_more': has_more,
+                'next_cursor': self._encode_cursor(page[-1]) if has_more else None
             })
             
         except Exception as e:
@@ -340,13 +472,54 @@ class AdminEscrowView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @staticmethod
+    def _serialize_row(row: dict) -> dict:
+        return {
+            'id': str(row['id']),
+            'order_id': row['payment_address__order_id'],
+            'buyer': row['buyer__username'],
+            'vendor': row['vendor__username'],
+            'escrow_amount': str(row['escrow_amount']),
+            'escrow_fee': str(row['escrow_fee']),
+            'status': row['status'],
+            'created_at': row['created_at'].isoformat(),
+            'auto_release_at': row['auto_release_at'].isoformat() if row['auto_release_at'] else None,
+            'dispute_reason': row['dispute_reason']
+        }
+    
+    @staticmethod
+    def _parse_datetime(value: str):
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            return None
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+    
+    @staticmethod
+    def _encode_cursor(row: dict) -> str:
+        position = json.dumps([row['created_at'].isoformat(), str(row['id'])])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+    
+    @classmethod
+    def _decode_cursor(cls, cursor: str):
+        try:
+            created_at, escrow_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at = cls._parse_datetime(created_at)
+            if created_at is None:
+                return None
+            return created_at, uuid.UUID(escrow_id)
+        except (ValueError, TypeError):
+            return None
+    
     def post(self, request, escrow_id):
         """Admin escrow actions"""
         try:
             action = request.data.get('action')
             admin_notes = request.data.get('admin_notes', '')
             
-            escrow = EscrowPayment.objects.get(id=escrow_id)
+            escrow = EscrowPayment.objects.select_related('payment_address').get(id=escrow_id)
             
             if action == 'release':
                 escrow.status = 'released'
@@ -354,6 +527,7 @@ class AdminEscrowView(APIView):
                 escrow.released_by = request.user
                 escrow.admin_notes = admin_notes
                 escrow.save()
+                PaymentService.publish_payment_status(escrow.payment_address)
                 
                 return Response({'message': 'Escrow released by admin'})
                 
@@ -363,6 +537,7 @@ class AdminEscrowView(APIView):
                 escrow.released_by = request.user
                 escrow.admin_notes = admin_notes
                 escrow.save()
+                PaymentService.publish_payment_status(escrow.payment_address)
                 
                 return Response({'message': 'Escrow refunded by admin'})
                 
@@ -386,36 +561,56 @@ class AdminEscrowView(APIView):
 
 
 class PaymentAnalyticsView(APIView):
-    """API for payment analytics"""
+    """API for payment analytics.
+    
+    Totals are live, one conditional aggregate per table. The time series comes
+    from the payment_daily_stats rollup, so its cost does not grow with payment
+    history. Accepts ``from``/``to`` (YYYY-MM-DD, default the last 30 days) and
+    ``granularity`` (day, week or month) for the series.
+    """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         try:
-            # Get payment statistics
-            total_payments = PaymentAddress.objects.count()
-            successful_payments = PaymentAddress.objects.filter(status='paid').count()
-            pending_payments = PaymentAddress.objects.filter(status='pending').count()
+            stats_service = PaymentStatsService()
             
-            # Get escrow statistics
-            total_escrows = EscrowPayment.objects.count()
-            active_escrows = EscrowPayment.objects.filter(status='funded').count()
-            disputed_escrows = EscrowPayment.objects.filter(status='disputed').count()
+            granularity = request.query_params.get('granularity', 'day')
+            if granularity not in stats_service.GRANULARITIES:
+                return Response(
+                    {'error': f"granularity must be one of {', '.join(stats_service.GRANULARITIES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Calculate success rate
-            success_rate = (successful_payments / total_payments * 100) if total_payments > 0 else 0
+            try:
+                date_to = parse_date(request.query_params.get('to', '')) or timezone.localdate()
+                date_from = parse_date(request.query_params.get('from', '')) or date_to - timedelta(days=30)
+            except ValueError:
+                return Response(
+                    {'error': 'from and to must be dates (YYYY-MM-DD)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if date_from > date_to:
+                return Response(
+                    {'error': 'from must not be after to'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Escrow figures in one conditional aggregate
+            escrow_totals = EscrowPayment.objects.aggregate(
+                total=Count('id'),
+                active=Count('id', filter=Q(status='funded')),
+                disputed=Count('id', filter=Q(status='disputed'))
+            )
             
             analytics_data = {
-                'payments': {
-                    'total': total_payments,
-                    'successful': successful_payments,
-                    'pending': pending_payments,
-                    'success_rate': round(success_rate, 2)
+                'payments': stats_service.get_summary(),
+                'escrows': escrow_totals,
+                'range': {
+                    'from': date_from.isoformat(),
+                    'to': date_to.isoformat(),
+                    'granularity': granularity
                 },
-                'escrows': {
-                    'total': total_escrows,
-                    'active': active_escrows,
-                    'disputed': disputed_escrows
-                }
+                'series': stats_service.get_series(date_from, date_to, granularity)
             }
             
             return Response(analytics_data)
@@ -425,4 +620,20 @@ class PaymentAnalyticsView(APIView):
             return Response(
                 {'error': 'Failed to fetch analytics'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
\ No newline at end of file
+            ) 
+
+
+class AddressPoolView(APIView):
+    """Admin API for deposit address pool metrics"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            return Response(AddressPoolService().get_metrics())
+            
+        except Exception as e:
+            logger.error(f"Address pool metrics error: {str(e)}")
+            return Response(
+                {'error': 'Failed to fetch address pool metrics'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,154 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+import logging
+
+from .models import Product, ProductFacetCount
+
+logger = logging.getLogger(__name__)
+
+FACETS = ('account_type', 'category', 'delivery_time', 'price')
+CACHE_KEY = 'product-facets:unfiltered'
+
+# Values match what the list filters take: category is filtered by name
+FACET_COLUMNS = {
+    'account_type': 'facet_account_type',
+    'category': 'facet_category',
+    'delivery_time': 'facet_delivery_time',
+    'price': 'facet_price',
+}
+
+
+def parse_facets(value: str) -> list:
+    """Facet names from a facets= parameter ('all', 'true' or a comma list)"""
+    if value.lower() in ('1', 'all', 'true'):
+        return list(FACETS)
+    
+    facets = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(facets) - set(FACETS)
+    if unknown:
+        raise ValueError(f"Unknown facets: {', '.join(sorted(unknown))}")
+    return facets
+
+
+def price_buckets() -> list:
+    """(label, lower, upper) per PRODUCT_FACET_PRICE_BUCKETS boundary; upper is None for the last"""
+    bounds = [Decimal(str(bound)) for bound in settings.PRODUCT_FACET_PRICE_BUCKETS]
+    lowers = [Decimal(0)] + bounds
+    uppers = bounds + [None]
+    return [
+        (f"{lower.normalize()}-{upper.normalize()}" if upper is not None else f"{lower.normalize()}+", lower, upper)
+        for lower, upper in zip(lowers, uppers)
+    ]
+
+
+def facet_counts(queryset, facets: list) -> dict:
+    """Counts per value of every requested facet over ``queryset``, in one GROUPING SETS query"""
+    if not facets:
+        return {}
+    
+    buckets = price_buckets()
+    price_bucket = Case(
+        *[When(price__lt=upper, then=Value(label)) for label, _, upper in buckets if upper is not None],
+        default=Value(buckets[-1][0]),
+        output_field=CharField()
+    )
+    listings = queryset.order_by().values(
+        facet_account_type=F('account_type'),
+        facet_category=F('category__name'),
+        facet_delivery_time=F('delivery_time'),
+        facet_price=price_bucket,
+    )
+    inner_sql, params = listings.query.sql_with_params()
+    
+    columns = [FACET_COLUMNS[facet] for facet in facets]
+    select = ', '.join(columns + [f"GROUPING({column})" for column in columns])
+    grouping_sets = ', '.join(f"({column})" for column in columns)
+    sql = f"SELECT {select}, COUNT(*) FROM ({inner_sql}) AS listings GROUP BY GROUPING SETS ({grouping_sets})"
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    
+    # Each row belongs to the one facet whose GROUPING() flag is 0
+    counts = {facet: [] for facet in facets}
+    for row in rows:
+        values, flags, count = row[:len(facets)], row[len(facets):-1], row[-1]
+        for facet, value, flag in zip(facets, values, flags):
+            if not flag:
+                counts[facet].append({'value': value, 'label': value, 'count': count})
+    
+    return _present(counts, buckets)
+
+
+def _present(counts: dict, buckets: list) -> dict:
+    """Choice labels, price buckets in price order and everything else by count"""
+    choice_labels = {
+        'account_type': dict(Product._meta.get_field('account_type').choices),
+        'delivery_time': dict(Product._meta.get_field('delivery_time').choices),
+    }
+    bucket_order = {label: position for position, (label, _, _) in enumerate(buckets)}
+    
+    for facet, entries in counts.items():
+        for entry in entries:
+            if facet in choice_labels:
+                entry['label'] = choice_labels[facet].get(entry['value'], entry['value'])
+        if facet == 'price':
+            entries.sort(key=lambda entry: bucket_order.get(entry['value'], len(bucket_order)))
+        else:
+            entries.sort(key=lambda entry: (-entry['count'], str(entry['label'])))
+    return counts
+
+
+def unfiltered_facet_counts(facets: list) -> dict:
+    """Facet counts over all listed products from the cache, then the precomputed table"""
+    try:
+        counts = cache.get(CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Product facet cache read failed: {str(e)}")
+        counts = None
+    
+    if counts is None:
+        rows = list(ProductFacetCount.objects.values('facet', 'value', 'label', 'count'))
+        if not rows:
+            # First request before the refresh job has run
+            return refresh_facet_table(facets=facets) if facets else {}
+        counts = {facet: [] for facet in FACETS}
+        for row in rows:
+            counts[row['facet']].append({'value': row['value'], 'label': row['label'], 'count': row['count']})
+        counts = _present(counts, price_buckets())
+        _cache_counts(counts)
+    
+    return {facet: counts.get(facet, []) for facet in facets}
+
+
+def refresh_facet_table(facets: list = None) -> dict:
+    """Recompute facet counts over all listed products and replace the precomputed table"""
+    listed = Product.objects.filter(status='approved', is_active=True, is_deleted=False)
+    counts = facet_counts(listed, list(FACETS))
+    
+    now = timezone.now()
+    with transaction.atomic():
+        ProductFacetCount.objects.all().delete()
+        ProductFacetCount.objects.bulk_create([
+            ProductFacetCount(
+                facet=facet, value=entry['value'] or '', label=entry['label'] or '',
+                count=entry['count'], refreshed_at=now
+            )
+            for facet, entries in counts.items()
+            for entry in entries
+        ])
+    _cache_counts(counts)
+    
+    logger.info(f"Refreshed product facet counts: {sum(len(entries) for entries in counts.values())} values")
+    return {facet: counts[facet] for facet in facets or FACETS}
+
+
+def _cache_counts(counts: dict):
+    try:
+        cache.set(CACHE_KEY, counts, timeout=settings.PRODUCT_FACETS_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Product facet cache write failed: {str(e)}")
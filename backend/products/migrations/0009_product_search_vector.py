@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Keep the text search configuration in step with products.search.SEARCH_CONFIG.
+# Websites are indexed both as a host token and split on dots/dashes so that
+# "zoom" finds "zoom.com".
+SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION vendor_products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.headline, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.website, '') || ' ' || translate(coalesce(NEW.website, ''), './-', '   ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.tags::text, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER vendor_products_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF headline, website, tags, description ON vendor_products
+    FOR EACH ROW EXECUTE PROCEDURE vendor_products_search_vector_update();
+
+UPDATE vendor_products SET headline = headline;
+"""
+
+DROP_SEARCH_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS vendor_products_search_vector_trigger ON vendor_products;
+DROP FUNCTION IF EXISTS vendor_products_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_fix_subcategories_missing_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER_SQL, DROP_SEARCH_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='vendor_products_search_gin'),
+        ),
+    ]
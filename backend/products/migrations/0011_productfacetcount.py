@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('facet', models.CharField(max_length=30)),
+                ('value', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'product_facet_counts',
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+    ]
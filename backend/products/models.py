@@ -1,4 +1,6 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from shared.models import BaseModel
@@ -155,6 +157,10 @@ class Product(BaseModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Weighted headline/website/tags/description vector, kept current by a
+    # database trigger (see migration 0009) so bulk writes stay in sync too
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'vendor_products'
         verbose_name_plural = 'Vendor Products'
@@ -165,6 +171,9 @@ class Product(BaseModel):
             models.Index(fields=['price']),
             models.Index(fields=['rating']),
             models.Index(fields=['created_at']),
+            GinIndex(fields=['search_vector'], name='vendor_products_search_gin'),
+            GinIndex(fields=['headline'], name='vendor_products_headline_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['website'], name='vendor_products_website_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -269,3 +278,20 @@ class ProductView(BaseModel):
     
     def __str__(self):
         return f"{self.user.username} viewed {self.product.headline}"
+
+
+class ProductFacetCount(models.Model):
+    """Precomputed facet counts over all listed products, for the unfiltered sidebar"""
+    id = models.BigAutoField(primary_key=True)
+    facet = models.CharField(max_length=30)  # account_type, category, delivery_time, price
+    value = models.CharField(max_length=100)
+    label = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'product_facet_counts'
+        unique_together = ['facet', 'value']
+    
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
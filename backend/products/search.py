@@ -0,0 +1,58 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+# Must match the configuration used by the search_vector trigger (migration 0009)
+SEARCH_CONFIG = 'english'
+
+SEARCH_MODES = ('fulltext', 'fuzzy')
+
+
+def _rank(expression):
+    """Ranks are real (float4); as double precision they survive a JSON round trip
+    in a pagination cursor and compare equal to the row they came from."""
+    return Cast(expression, FloatField())
+
+
+def full_text_search(queryset, query: str):
+    """Listings matching ``query`` on the GIN-indexed search vector, annotated with ts_rank as ``rank``"""
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=_rank(SearchRank(F('search_vector'), search_query))
+    )
+
+
+def fuzzy_search(queryset, query: str):
+    """Typo-tolerant matches on headline and website, annotated with their similarity as ``rank``.
+    
+    The % and <% operators are answered from the gin_trgm_ops indexes using the
+    thresholds set by set_trigram_threshold(). Full-text matches are kept as well,
+    so falling back from full-text search never drops its hits.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(headline__trigram_word_similar=query) |
+        Q(website__trigram_similar=query) |
+        Q(search_vector=search_query)
+    ).annotate(
+        rank=_rank(Greatest(
+            TrigramWordSimilarity(query, 'headline'),
+            TrigramSimilarity('website', query),
+            SearchRank(F('search_vector'), search_query)
+        ))
+    )
+
+
+def set_trigram_threshold(threshold: float):
+    """Set the pg_trgm thresholds used by % and <% for this connection.
+    
+    Session-level rather than SET LOCAL so it holds outside a transaction;
+    every fuzzy search sets it before querying.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, false), "
+            "set_config('pg_trgm.word_similarity_threshold', %s, false)",
+            [str(threshold), str(threshold)]
+        )
@@ -0,0 +1,10 @@
+from celery import shared_task
+
+from .facets import refresh_facet_table
+
+
+@shared_task
+def refresh_product_facets() -> dict:
+    """Recompute the precomputed facet counts behind the unfiltered product sidebar"""
+    counts = refresh_facet_table()
+    return {facet: len(entries) for facet, entries in counts.items()}
@@ -1,12 +1,20 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework import status
 from decimal import Decimal
 import json
+import unittest
 
-from .models import Product, ProductCategory, ProductSubCategory
+from shared.counts import count_rows
+
+from .facets import refresh_facet_table
+from .models import Product, ProductCategory, ProductFacetCount, ProductSubCategory
+from .views import list_products
 
 User = get_user_model()
 
@@ -327,4 +335,223 @@ class ProductValidationTest(APITestCase):
         }
         
         response = self.client.post(reverse('product-create'), data)
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) 
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+@override_settings(PRODUCT_SEARCH_FUZZY_FALLBACK_MIN=1)
+class ProductSearchTest(TestCase):
+    """Test ranked full-text search in list_products"""
+    
+    def setUp(self):
+        vendor = User.objects.create_user(username='searchvendor', password='testpass123', user_type='vendor')
+        category = ProductCategory.objects.create(name='Streaming', slug='streaming')
+        listings = [
+            ('Netflix premium account', 'netflix.com', ['uhd'], 'Four screens'),
+            ('Aged email account', 'gmail.com', ['netflix'], 'Comes with a Netflix trial'),
+            ('Zoom pro account', 'zoom.us', ['meetings'], 'Unlimited meetings'),
+        ]
+        for headline, website, tags, description in listings:
+            Product.objects.create(
+                vendor=vendor, category=category, headline=headline, website=website, tags=tags,
+                description=description, account_type='streaming', access_type='full_ownership',
+                price=Decimal('0.001'), delivery_time='instant_auto', status='approved'
+            )
+    
+    def search(self, query, **params):
+        request = APIRequestFactory().get('/products/', {'search': query, **params})
+        return [item['headline'] for item in list_products(request).data['data']]
+    
+    def test_results_are_ranked_by_field_weight(self):
+        """Test headline matches rank above tag and description matches"""
+        self.assertEqual(self.search('netflix'), ['Netflix premium account', 'Aged email account'])
+    
+    def test_search_vector_follows_updates(self):
+        """Test the trigger keeps the vector current on save and bulk update"""
+        Product.objects.filter(website='zoom.us').update(website='webex.com')
+        self.assertEqual(self.search('webex'), ['Zoom pro account'])
+        self.assertEqual(self.search('zoom'), ['Zoom pro account'])
+        self.assertEqual(self.search('spotify'), [])
+    
+    def test_typos_fall_back_to_trigram_matching(self):
+        """Test misspelled headlines and partial hostnames still match"""
+        request = APIRequestFactory().get('/products/', {'search': 'netflx'})
+        response = list_products(request)
+        
+        self.assertEqual(response.data['search_mode'], 'fuzzy')
+        self.assertEqual(response.data['data'][0]['headline'], 'Netflix premium account')
+        self.assertEqual(self.search('zoom.u', search_mode='fuzzy'), ['Zoom pro account'])
+        self.assertEqual(self.search('netflx', fuzzy_threshold='0.9'), [])
+    
+    def test_bad_search_parameters_are_rejected(self):
+        """Test an unknown search mode or a bad fuzzy threshold returns 400"""
+        for params in ({'search_mode': 'regex'}, {'fuzzy_threshold': 'abc'}, {'fuzzy_threshold': '1.5'}):
+            request = APIRequestFactory().get('/products/', {'search': 'netflix', **params})
+            self.assertEqual(list_products(request).status_code, 400)
+    
+    def test_relevance_cursors_keep_tied_ranks(self):
+        """Test paging by rank neither repeats nor skips rows at page edges"""
+        vendor = User.objects.get(username='searchvendor')
+        for index in range(3):
+            Product.objects.create(
+                vendor=vendor, category=ProductCategory.objects.get(slug='streaming'), headline=f"Netflix basic {index}",
+                website='netflix.com', description='Same rank', account_type='streaming', access_type='full_ownership',
+                price=Decimal('0.001'), delivery_time='instant_auto', status='approved'
+            )
+        params = {'search': 'netflix', 'page_size': 1}
+        headlines = []
+        while params:
+            response = list_products(APIRequestFactory().get('/products/', params))
+            headlines += [item['headline'] for item in response.data['data']]
+            cursor = response.data['pagination']['next_cursor']
+            params = {'search': 'netflix', 'page_size': 1, 'cursor': cursor} if cursor else None
+        
+        self.assertEqual(len(headlines), 5)
+        self.assertEqual(len(set(headlines)), 5)
+
+
+class ProductFacetTest(TestCase):
+    """Test facet counts returned by list_products"""
+    
+    def setUp(self):
+        cache.clear()
+        vendor = User.objects.create_user(username='facetvendor', password='testpass123', user_type='vendor')
+        streaming = ProductCategory.objects.create(name='Streaming', slug='streaming')
+        gaming = ProductCategory.objects.create(name='Gaming', slug='gaming')
+        listings = [
+            (streaming, 'streaming', '0.0002', 'instant_auto'),
+            (streaming, 'streaming', '0.002', 'instant_auto'),
+            (gaming, 'gaming', '0.002', 'manual_24h'),
+            (gaming, 'gaming', '0.2', 'instant_auto'),
+        ]
+        for index, (category, account_type, price, delivery_time) in enumerate(listings):
+            Product.objects.create(
+                vendor=vendor, category=category, headline=f"Facet listing {index}", website='example.com',
+                description='Facet fixture', account_type=account_type, access_type='full_ownership',
+                price=Decimal(price), delivery_time=delivery_time, status='approved'
+            )
+    
+    def facets(self, **params):
+        request = APIRequestFactory().get('/products/', params)
+        response = list_products(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data['facets']
+    
+    def test_unfiltered_counts_come_from_precomputed_table(self):
+        """Test the unfiltered sidebar reads the refreshed table, not the listings"""
+        ProductFacetCount.objects.create(
+            facet='account_type', value='gaming', label='Gaming', count=7, refreshed_at=timezone.now()
+        )
+        
+        facets = self.facets(facets='account_type')
+        
+        self.assertEqual(facets, {'account_type': [{'value': 'gaming', 'label': 'Gaming', 'count': 7}]})
+        self.assertIsNone(self.facets())
+    
+    def test_unknown_facet_is_rejected(self):
+        """Test an unknown facet name returns 400"""
+        request = APIRequestFactory().get('/products/', {'facets': 'colour'})
+        self.assertEqual(list_products(request).status_code, 400)
+    
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'GROUPING SETS needs PostgreSQL')
+    def test_filtered_counts_follow_filters(self):
+        """Test every facet is counted over the filtered listings"""
+        facets = self.facets(facets='all', category='Gaming')
+        
+        self.assertEqual(facets['category'], [{'value': 'Gaming', 'label': 'Gaming', 'count': 2}])
+        self.assertEqual([entry['count'] for entry in facets['delivery_time']], [1, 1])
+        self.assertEqual(
+            [(entry['value'], entry['count']) for entry in facets['price']], [('0.001-0.005', 1), ('0.05+', 1)]
+        )
+    
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'GROUPING SETS needs PostgreSQL')
+    def test_refresh_replaces_precomputed_table(self):
+        """Test a refresh rebuilds the table from the listings"""
+        refresh_facet_table()
+        
+        counts = dict(ProductFacetCount.objects.filter(facet='account_type').values_list('value', 'count'))
+        self.assertEqual(counts, {'streaming': 2, 'gaming': 2})
+
+
+class ProductPaginationTest(TestCase):
+    """Test keyset pagination of list_products"""
+    
+    def setUp(self):
+        cache.clear()
+        vendor = User.objects.create_user(username='pagevendor', password='testpass123', user_type='vendor')
+        category = ProductCategory.objects.create(name='Streaming', slug='streaming')
+        for index, price in enumerate(['0.003', '0.001', '0.002', '0.001', '0.004']):
+            Product.objects.create(
+                vendor=vendor, category=category, headline=f"Page listing {index}", website='example.com',
+                description='Pagination fixture', account_type='streaming', access_type='full_ownership',
+                price=Decimal(price), delivery_time='instant_auto', status='approved'
+            )
+    
+    def page(self, **params):
+        request = APIRequestFactory().get('/products/', {'page_size': 2, 'sort_by': 'price_low', **params})
+        response = list_products(request)
+        self.assertEqual(response.status_code, 200)
+        return [item['headline'] for item in response.data['data']], response.data['pagination']
+    
+    def test_cursors_walk_the_sort_order(self):
+        """Test next cursors cover every row once and prev cursors walk back"""
+        expected = list(Product.objects.order_by('price', 'id').values_list('headline', flat=True))
+        
+        seen, pagination = self.page()
+        self.assertFalse(pagination['has_previous'])
+        pages = [seen]
+        while pagination['next_cursor']:
+            headlines, pagination = self.page(cursor=pagination['next_cursor'])
+            pages.append(headlines)
+        self.assertEqual(sum(pages, []), expected)
+        
+        headlines, pagination = self.page(cursor=pagination['prev_cursor'])
+        self.assertEqual(headlines, pages[-2])
+        self.assertTrue(pagination['has_next'])
+    
+    def test_page_number_falls_back_to_offset(self):
+        """Test page= still works and hands out cursors that continue from there"""
+        headlines, pagination = self.page(page=2, total='exact')
+        self.assertEqual(pagination['page'], 2)
+        self.assertEqual((pagination['total_count'], pagination['total_count_exact']), (5, True))
+        
+        following, _ = self.page(cursor=pagination['next_cursor'])
+        self.assertEqual(following, [self.page(page=3)[0][0]])
+    
+    def test_cursor_from_another_sort_is_rejected(self):
+        """Test a cursor only works under the ordering that issued it"""
+        _, pagination = self.page()
+        request = APIRequestFactory().get('/products/', {'sort_by': 'rating', 'cursor': pagination['next_cursor']})
+        self.assertEqual(list_products(request).status_code, 400)
+        
+        request = APIRequestFactory().get('/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(list_products(request).status_code, 400)
+    
+    def test_bad_page_parameters_are_rejected(self):
+        """Test non-numeric page parameters return 400 and page_size is clamped"""
+        for params in ({'page': 'x'}, {'page_size': 'abc'}):
+            self.assertEqual(list_products(APIRequestFactory().get('/products/', params)).status_code, 400)
+        
+        self.assertEqual(self.page(page_size=0)[1]['page_size'], 1)
+        self.assertEqual(self.page(page_size=5000)[1]['page_size'], 100)
+    
+    @override_settings(LIST_COUNT_EXACT_LIMIT=10)
+    def test_totals_are_cached_per_filter_set(self):
+        """Test a total is counted once per filter set and reused until the TTL"""
+        listed = Product.objects.filter(status='approved')
+        self.assertEqual(count_rows(listed), (5, True))
+        
+        Product.objects.filter(headline='Page listing 0').update(status='pending')
+        with self.assertNumQueries(0):
+            self.assertEqual(count_rows(listed), (5, True))
+        self.assertEqual(count_rows(listed.filter(price__gt=Decimal('0.0015'))), (2, True))
+    
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'planner estimates need PostgreSQL')
+    @override_settings(LIST_COUNT_EXACT_LIMIT=2)
+    def test_large_totals_are_estimated(self):
+        """Test totals past the exact limit come from the planner and say so"""
+        _, pagination = self.page()
+        
+        self.assertFalse(pagination['total_count_exact'])
+        self.assertGreaterEqual(pagination['total_count'], 3)
+        self.assertEqual(self.page(total='exact')[1]['total_count'], 5)
@@ -6,8 +6,12 @@ from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Product, ProductCategory, ProductSubCategory, ProductView
+from .facets import facet_counts, parse_facets, unfiltered_facet_counts
+from .search import SEARCH_MODES, full_text_search, fuzzy_search, set_trigram_threshold
 from .serializers import ProductSerializer, ProductDetailSerializer, ProductCreateSerializer, ProductSubCategorySerializer, ProductCategorySerializer
+from shared.pagination import InvalidPage, paginate_request
 from users.models import User
+from payments.rates import exchange_rates
 import json
 import csv
 import io
@@ -52,30 +56,36 @@ def list_products(request):
     try:
         # Get query parameters
         search = request.GET.get('search', '')
+        search_mode = request.GET.get('search_mode', 'fulltext')
         category = request.GET.get('category', '')
         account_type = request.GET.get('account_type', '')
         min_price = request.GET.get('min_price', '')
         max_price = request.GET.get('max_price', '')
-        sort_by = request.GET.get('sort_by', 'created_at')
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
+        sort_by = request.GET.get('sort_by', 'relevance' if search else 'created_at')
+        try:
+            fuzzy_threshold = float(request.GET.get('fuzzy_threshold', settings.PRODUCT_SEARCH_FUZZY_THRESHOLD))
+        except (ValueError, TypeError):
+            fuzzy_threshold = None
+        
+        if search_mode not in SEARCH_MODES or fuzzy_threshold is None or not 0 < fuzzy_threshold <= 1:
+            return Response({
+                'success': False,
+                'message': f"search_mode must be one of {', '.join(SEARCH_MODES)} and fuzzy_threshold between 0 and 1"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            facets = parse_facets(request.GET.get('facets', ''))
+        except ValueError as e:
+            return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         # Start with approved products
         products = Product.objects.filter(
             status='approved',
             is_active=True,
             is_deleted=False
-        ).select_related('vendor', 'category', 'sub_category')
+        ).select_related('vendor', 'category', 'sub_category').defer('search_vector')
         
         # Apply filters
-        if search:
-            products = products.filter(
-                Q(headline__icontains=search) |
-                Q(description__icontains=search) |
-                Q(website__icontains=search) |
-                Q(tags__icontains=search)
-            )
-        
         if category:
             products = products.filter(category__name__icontains=category)
             
@@ -88,39 +98,63 @@ def list_products(request):
         if max_price:
             products = products.filter(price__lte=Decimal(max_price))
         
-        # Apply sorting
-        if sort_by == 'price_low':
-            products = products.order_by('price')
+        if search and search_mode == 'fulltext':
+            matches = full_text_search(products, search)
+            fallback_min = settings.PRODUCT_SEARCH_FUZZY_FALLBACK_MIN
+            if matches[:fallback_min].count() < fallback_min:
+                # Too few exact hits (typos, partial hostnames): widen to trigram matching
+                search_mode = 'fuzzy'
+            else:
+                products = matches
+        if search and search_mode == 'fuzzy':
+            set_trigram_threshold(fuzzy_threshold)
+            products = fuzzy_search(products, search)
+        
+        # Sidebar counts: precomputed for the full catalogue, one grouped query otherwise
+        if not facets:
+            facet_data = None
+        elif any([search, category, account_type, min_price, max_price]):
+            facet_data = facet_counts(products, facets)
+        else:
+            facet_data = unfiltered_facet_counts(facets)
+        
+        # Apply sorting; id last so every row has a unique keyset position
+        if sort_by == 'relevance' and search:
+            ordering = ('-rank', '-created_at', '-id')
+        elif sort_by == 'price_low':
+            ordering = ('price', 'id')
         elif sort_by == 'price_high':
-            products = products.order_by('-price')
+            ordering = ('-price', '-id')
         elif sort_by == 'rating':
-            products = products.order_by('-rating')
+            ordering = ('-rating', '-id')
         elif sort_by == 'views':
-            products = products.order_by('-views_count')
+            ordering = ('-views_count', '-id')
         else:  # created_at
-            products = products.order_by('-created_at')
+            ordering = ('-created_at', '-id')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ordering)
         
         # Serialize products
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
+        data = serializer.data
+        
+        # Fiat equivalents for the whole page from one rate lookup (prices are in BTC)
+        fiat_prices = exchange_rates.get_snapshot().convert_many([item['price'] for item in data], 'BTC', 'USD')
+        for item, price_usd in zip(data, fiat_prices):
+            item['price_usd'] = str(price_usd) if price_usd is not None else None
         
         return Response({
             'success': True,
             'message': 'Products retrieved successfully',
-            'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'data': data,
+            'search_mode': search_mode if search else None,
+            'facets': facet_data,
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error listing products: {str(e)}")
         return Response({
@@ -186,34 +220,25 @@ def track_product_view(request, product_id):
 def get_vendor_products(request):
     """Get products for the authenticated vendor"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             vendor=request.user,
             is_deleted=False
-        ).select_related('category', 'sub_category').order_by('-created_at')
+        ).select_related('category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'Vendor products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting vendor products: {str(e)}")
         return Response({
@@ -227,35 +252,26 @@ def get_vendor_products(request):
 def get_buyer_products(request):
     """Get products for buyer (approved products only)"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             status='approved',
             is_active=True,
             is_deleted=False
-        ).select_related('vendor', 'category', 'sub_category').order_by('-created_at')
+        ).select_related('vendor', 'category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'Buyer products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting buyer products: {str(e)}")
         return Response({
@@ -302,33 +318,24 @@ def create_product(request):
 def get_all_products(request):
     """Get all products for admin"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             is_deleted=False
-        ).select_related('vendor', 'category', 'sub_category').order_by('-created_at')
+        ).select_related('vendor', 'category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'All products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting all products: {str(e)}")
         return Response({
@@ -570,35 +577,26 @@ def export_products_csv(request):
 def buyer_listings(request):
     """Get products for buyer (approved products only)"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             status='approved',
             is_active=True,
             is_deleted=False
-        ).select_related('vendor', 'category', 'sub_category').order_by('-created_at')
+        ).select_related('vendor', 'category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'Buyer products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting buyer products: {str(e)}")
         return Response({
@@ -612,34 +610,25 @@ def buyer_listings(request):
 def vendor_products(request):
     """Get products for the authenticated vendor"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             vendor=request.user,
             is_deleted=False
-        ).select_related('category', 'sub_category').order_by('-created_at')
+        ).select_related('category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'Vendor products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting vendor products: {str(e)}")
         return Response({
@@ -1036,33 +1025,24 @@ def reveal_credentials(request, product_id):
 def admin_list_all_products(request):
     """Get all products for admin"""
     try:
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        
         products = Product.objects.filter(
             is_deleted=False
-        ).select_related('vendor', 'category', 'sub_category').order_by('-created_at')
+        ).select_related('vendor', 'category', 'sub_category')
         
-        # Pagination
-        total_count = products.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        products = products[start:end]
+        # Keyset pagination: deep pages cost the same as the first
+        result = paginate_request(request, products, ('-created_at', '-id'))
         
-        serializer = ProductSerializer(products, many=True, context={'request': request})
+        serializer = ProductSerializer(result.items, many=True, context={'request': request})
         
         return Response({
             'success': True,
             'message': 'All products retrieved successfully',
             'data': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size
-            }
+            'pagination': result.pagination()
         })
         
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting all products: {str(e)}")
         return Response({
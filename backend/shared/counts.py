@@ -0,0 +1,103 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'list-count'
+
+
+def count_rows(queryset, exact: bool = False) -> tuple:
+    """(rows, exact) for a listing total, cheapest first.
+    
+    Results of up to LIST_COUNT_EXACT_LIMIT rows are counted exactly with a
+    bounded COUNT over a LIMIT subquery. Larger ones get the planner's
+    estimate: pg_class.reltuples for a whole table, EXPLAIN for a filtered
+    set. Either way the answer is cached for LIST_COUNT_CACHE_TTL seconds
+    under a hash of the query, so paging through one listing counts once.
+    ``exact`` forces a full COUNT(*) for callers that need the real number,
+    as does a database without planner statistics.
+    """
+    queryset = queryset.order_by()
+    key = cache_key(queryset)
+    cached = _cache_get(key)
+    if cached is not None and (cached[1] or not exact):
+        return tuple(cached)
+    
+    result = None
+    if not exact:
+        limit = settings.LIST_COUNT_EXACT_LIMIT
+        bounded = queryset[:limit + 1].count()
+        if bounded <= limit:
+            result = bounded, True
+        else:
+            estimate = _estimate(queryset)
+            if estimate is not None:
+                # Never report fewer rows than we have just seen
+                result = max(estimate, bounded), False
+    if result is None:
+        result = queryset.count(), True
+    
+    _cache_set(key, result)
+    return result
+
+
+def cache_key(queryset) -> str:
+    """Cache key for the rows ``queryset`` selects: its model plus a hash of the filtered SQL"""
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    digest = hashlib.sha256(json.dumps([sql, [str(param) for param in params]]).encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{queryset.model._meta.label_lower}:{digest[:32]}"
+
+
+def _estimate(queryset):
+    if connection.vendor != 'postgresql':
+        return None
+    
+    try:
+        if not queryset.query.where:
+            rows = table_estimate(queryset.model._meta.db_table)
+            if rows is not None:
+                return rows
+        return plan_estimate(queryset)
+    except Exception as e:
+        logger.warning(f"Row estimate for {queryset.model._meta.label} failed, counting instead: {str(e)}")
+        return None
+
+
+def table_estimate(table: str):
+    """Row estimate from pg_class.reltuples; None before the table is first analyzed"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def plan_estimate(queryset) -> int:
+    """Planner row estimate for ``queryset`` from EXPLAIN"""
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _cache_get(key: str):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"List count cache read failed: {str(e)}")
+        return None
+
+
+def _cache_set(key: str, result: tuple):
+    try:
+        cache.set(key, list(result), timeout=settings.LIST_COUNT_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"List count cache write failed: {str(e)}")
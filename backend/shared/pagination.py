@@ -0,0 +1,199 @@
+import base64
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+from .counts import count_rows
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPage(ValueError):
+    """Pagination parameters that can't be used; list views answer 400"""
+
+
+class InvalidCursor(InvalidPage):
+    """Cursor that is malformed or was issued for a different sort order"""
+
+
+class CursorPage:
+    """One page of a keyset-paginated listing"""
+    
+    def __init__(self, items: list, page_size: int, page: int = None, next_cursor: str = None,
+                 prev_cursor: str = None, total_count: int = None, total_exact: bool = True):
+        self.items = items
+        self.page_size = page_size
+        self.page = page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total_count = total_count
+        self.total_exact = total_exact
+    
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+    
+    @property
+    def has_previous(self) -> bool:
+        return self.prev_cursor is not None
+    
+    def pagination(self) -> dict:
+        """The ``pagination`` block of a list response; ``page`` is None when paging by cursor"""
+        total_pages = None
+        if self.total_count is not None:
+            total_pages = (self.total_count + self.page_size - 1) // self.page_size
+        return {
+            'page': self.page,
+            'page_size': self.page_size,
+            'total_count': self.total_count,
+            'total_count_exact': self.total_exact,
+            'total_pages': total_pages,
+            'has_next': self.has_next,
+            'has_previous': self.has_previous,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+        }
+
+
+class KeysetPaginator:
+    """Cursor pagination on the active sort tuple.
+    
+    ``ordering`` is the queryset ordering, e.g. ('-price', '-id'); its last
+    field must be unique so every row has a distinct position. A page is the
+    rows strictly after (or before) the cursor's position in that order, so
+    it costs one index range scan however deep the client has paged, instead
+    of reading and discarding OFFSET rows.
+    
+    Cursors are opaque base64 JSON carrying the sort values of the edge row;
+    a cursor issued under one ordering is rejected under another. Sort
+    fields must be non-null model fields or annotations on the queryset.
+    """
+    
+    def __init__(self, ordering, page_size: int = DEFAULT_PAGE_SIZE, max_page_size: int = MAX_PAGE_SIZE):
+        self.ordering = tuple(ordering)
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.page_size = max(1, min(page_size, max_page_size))
+    
+    def paginate(self, queryset, cursor: str = None, page: int = None, exact_total: bool = False) -> CursorPage:
+        """Fetch one page after/before ``cursor``.
+        
+        Without a cursor, ``page`` falls back to OFFSET so existing page-number
+        links keep working; the cursors it returns continue by keyset from there.
+        """
+        if cursor:
+            values, backwards = self._decode(queryset.model, cursor)
+            rows = queryset.filter(self._after(values, backwards))
+            rows = rows.order_by(*(self._reversed() if backwards else self.ordering))
+            items = list(rows[:self.page_size + 1])
+            more = len(items) > self.page_size
+            items = items[:self.page_size]
+            if backwards:
+                items.reverse()
+            has_previous, has_next = (more, True) if backwards else (True, more)
+            page = offset = None
+        else:
+            page = max(page or 1, 1)
+            offset = (page - 1) * self.page_size
+            items = list(queryset.order_by(*self.ordering)[offset:offset + self.page_size + 1])
+            has_next = len(items) > self.page_size
+            items = items[:self.page_size]
+            has_previous = offset > 0
+        
+        if offset == 0 and not has_next:
+            # The whole result fits on the first page
+            total_count, total_exact = len(items), True
+        else:
+            total_count, total_exact = count_rows(queryset, exact=exact_total)
+        
+        return CursorPage(
+            items,
+            self.page_size,
+            page=page,
+            next_cursor=self._encode(items[-1], backwards=False) if items and has_next else None,
+            prev_cursor=self._encode(items[0], backwards=True) if items and has_previous else None,
+            total_count=total_count,
+            total_exact=total_exact
+        )
+    
+    def _reversed(self) -> list:
+        return [name if descending else f"-{name}" for name, descending in self.fields]
+    
+    def _after(self, values: list, backwards: bool) -> Q:
+        """Rows past ``values`` in sort order (or before them when paging backwards)"""
+        condition = Q()
+        for position, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f"{name}__{lookup}": values[position]})
+            for (earlier, _), value in zip(self.fields[:position], values):
+                step &= Q(**{earlier: value})
+            condition |= step
+        
+        # Redundant bound on the leading field so the planner can range-scan its index
+        name, descending = self.fields[0]
+        bound = 'lte' if descending != backwards else 'gte'
+        return Q(**{f"{name}__{bound}": values[0]}) & condition
+    
+    def _encode(self, item, backwards: bool) -> str:
+        values = [_to_json(getattr(item, name)) for name, _ in self.fields]
+        position = json.dumps({'o': list(self.ordering), 'v': values, 'b': backwards})
+        return base64.urlsafe_b64encode(position.encode()).decode()
+    
+    def _decode(self, model, cursor: str):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            ordering, values, backwards = position['o'], position['v'], position['b']
+        except (ValueError, TypeError, KeyError):
+            raise InvalidCursor("Invalid cursor")
+        
+        if tuple(ordering) != self.ordering or len(values) != len(self.fields):
+            raise InvalidCursor("Cursor does not match the current sort order")
+        
+        try:
+            return [_to_python(model, name, value) for (name, _), value in zip(self.fields, values)], bool(backwards)
+        except ValidationError:
+            raise InvalidCursor("Invalid cursor")
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _to_python(model, name: str, value):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Annotation such as a search rank; float annotations must be double
+        # precision so the JSON value compares equal to the row it came from
+        return value
+    if value is None:
+        raise ValidationError("Cursor sort values cannot be null")
+    return field.to_python(value)
+
+
+def paginate_request(request, queryset, ordering) -> CursorPage:
+    """Page of ``queryset`` for the cursor, page, page_size and total=exact query parameters"""
+    paginator = KeysetPaginator(ordering, page_size=_int_param(request, 'page_size', DEFAULT_PAGE_SIZE))
+    return paginator.paginate(
+        queryset,
+        cursor=request.GET.get('cursor'),
+        page=max(_int_param(request, 'page', 1), 1),
+        exact_total=request.GET.get('total') == 'exact'
+    )
+
+
+def _int_param(request, name: str, default: int) -> int:
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidPage(f"{name} must be an integer")
@@ -6,6 +6,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.utils import timezone
 
+from shared.pagination import InvalidPage, paginate_request
+
 from .models import User
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, 
@@ -221,8 +223,6 @@ def list_users(request):
     
     try:
         # Get query parameters
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
         search = request.GET.get('search', '')
         user_type = request.GET.get('user_type', '')
         
@@ -236,29 +236,15 @@ def list_users(request):
         if user_type:
             queryset = queryset.filter(user_type=user_type)
         
-        # Order by creation date
-        queryset = queryset.order_by('-date_joined')
-        
-        # Paginate results
-        total_count = queryset.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        paginated_data = queryset[start:end]
+        # Newest first, paginated by keyset on (date_joined, id)
+        result = paginate_request(request, queryset, ('-date_joined', '-id'))
         
         # Serialize data
-        serializer = UserSerializer(paginated_data, many=True)
+        serializer = UserSerializer(result.items, many=True)
         
         response_data = {
             'users': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size,
-                'has_next': end < total_count,
-                'has_previous': page > 1
-            }
+            'pagination': result.pagination()
         }
         
         return Response({
@@ -267,6 +253,11 @@ def list_users(request):
             'data': response_data
         })
         
+    except InvalidPage as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'success': False,
@@ -5,6 +5,8 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
+from shared.pagination import InvalidPage, paginate_request
+
 from .models import VendorApplication
 from .serializers import VendorApplicationSerializer
 
@@ -23,15 +25,13 @@ def list_applications(request):
     
     try:
         # Get query parameters
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
         status_filter = request.GET.get('status', '')
         
         # Build queryset
         queryset = VendorApplication.objects.all()
         
         # If no applications exist, create sample data for testing
-        if queryset.count() == 0:
+        if not queryset.exists():
             # Create sample vendor applications
             sample_applications = [
                 {
@@ -73,28 +73,26 @@ def list_applications(request):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
-        # Order by creation date
-        queryset = queryset.order_by('-created_at')
-        
-        # Paginate results
-        total_count = queryset.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        paginated_data = queryset[start:end]
+        # Newest first, paginated by keyset on (created_at, id)
+        result = paginate_request(request, queryset, ('-created_at', '-id'))
         
         # Serialize data
-        serializer = VendorApplicationSerializer(paginated_data, many=True, context={'request': request})
+        serializer = VendorApplicationSerializer(result.items, many=True, context={'request': request})
         
         response_data = {
             'results': serializer.data,
-            'count': total_count,
-            'next': f'?page={page + 1}' if end < total_count else None,
-            'previous': f'?page={page - 1}' if page > 1 else None
+            'count': result.total_count,
+            'count_exact': result.total_exact,
+            'next': f'?cursor={result.next_cursor}' if result.next_cursor else None,
+            'previous': f'?cursor={result.prev_cursor}' if result.prev_cursor else None
         }
         
         return Response(response_data)
         
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': str(e)
@@ -50,6 +50,7 @@ export interface Order {
   total_amount: string;
   crypto_currency: string;
   payment_address: string;
+  payment_provisioning: 'queued' | 'provisioning' | 'ready' | 'failed';
   payment_status: string;
   order_status: string;
   use_escrow: boolean;
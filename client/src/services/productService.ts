@@ -64,11 +64,15 @@ export interface ProductListResponse {
   message: string;
   data: Product[];
   pagination?: {
-    page: number;
+    page: number | null;
     page_size: number;
-    total: number;
+    total_count: number;
+    total_count_exact: boolean;
+    total_pages: number;
     has_next: boolean;
     has_previous: boolean;
+    next_cursor: string | null;
+    prev_cursor: string | null;
   };
 }
 
@@ -118,6 +122,7 @@ class ProductService {
     sort_by?: string;
     page?: number;
     page_size?: number;
+    cursor?: string;
   } = {}): Promise<ProductListResponse> {
     const searchParams = new URLSearchParams();
     